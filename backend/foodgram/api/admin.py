@@ -1,24 +1,21 @@
 from django.contrib import admin
 from django.contrib.auth import get_user_model
-from .models import Recipe, Ingredient, IngredientInRecipe, Favorite, ShoppingCart, Follow
+from .models import Recipe, Ingredient, IngredientInRecipe, Favorite, ShoppingCart, Follow, RecipeRanking, ShortLink, ImageBlob
 
 User = get_user_model()
 
 @admin.register(User)
 class UserAdmin(admin.ModelAdmin):
-    list_display = ('id', 'username', 'email', 'first_name', 'last_name')
+    list_display = ('id', 'username', 'email', 'first_name', 'last_name', 'recipes_count', 'subscribers_count')
     search_fields = ('username', 'email')
     list_filter = ('is_active', 'is_staff')
 
 @admin.register(Recipe)
 class RecipeAdmin(admin.ModelAdmin):
-    list_display = ('id', 'name', 'author', 'favorites_count')
+    list_display = ('id', 'name', 'author', 'favorites_count', 'in_carts_count')
     search_fields = ('name', 'author__username')
     list_filter = ('author',)
-
-    def favorites_count(self, obj):
-        return obj.favorite_set.count()
-    favorites_count.short_description = 'В избранном'
+    list_select_related = ('author',)
 
 @admin.register(Ingredient)
 class IngredientAdmin(admin.ModelAdmin):
@@ -40,3 +37,19 @@ class ShoppingCartAdmin(admin.ModelAdmin):
 @admin.register(Follow)
 class FollowAdmin(admin.ModelAdmin):
     list_display = ('id', 'user', 'author')
+
+@admin.register(RecipeRanking)
+class RecipeRankingAdmin(admin.ModelAdmin):
+    list_display = ('recipe', 'popular_score', 'trending_score')
+    list_select_related = ('recipe',)
+
+@admin.register(ShortLink)
+class ShortLinkAdmin(admin.ModelAdmin):
+    list_display = ('code', 'recipe', 'clicks')
+    list_select_related = ('recipe',)
+    search_fields = ('code',)
+
+@admin.register(ImageBlob)
+class ImageBlobAdmin(admin.ModelAdmin):
+    list_display = ('name', 'references')
+    search_fields = ('name',)
@@ -1,6 +1,18 @@
 from django.apps import AppConfig
+from django.db.models.signals import post_migrate
+
+from .search import restore_search_triggers
+
+
+def restore_search_index(sender, using, **kwargs):
+    # миграции, пересоздающие api_recipe в SQLite, теряют триггеры FTS
+    restore_search_triggers(using)
 
 
 class ApiConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'api'
+
+    def ready(self):
+        from . import signals  # noqa: F401
+        post_migrate.connect(restore_search_index, sender=self)
@@ -0,0 +1,77 @@
+import copy
+import hashlib
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from rest_framework import exceptions
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.authtoken.models import Token
+
+from .recipe_cache import LocalLRUCache
+
+# локальная копия живёт недолго: удаление токена в другом воркере
+# доходит до этого процесса не позже чем через AUTH_LOCAL_TIMEOUT
+AUTH_LOCAL_TIMEOUT = 10
+AUTH_LOCAL_SIZE = 10_000
+AUTH_SHARED_TIMEOUT = 5 * 60
+# отметки в кэше вместо пользователя -> сообщение об ошибке
+AUTH_FAILURES = {
+    'invalid': 'Invalid token.',
+    'inactive': 'User inactive or deleted.',
+}
+
+local_token_cache = LocalLRUCache(AUTH_LOCAL_SIZE, AUTH_LOCAL_TIMEOUT)
+
+
+def token_cache_key(key):
+    # сам токен в имени ключа кэша не хранится
+    return 'auth-token:' + hashlib.sha256(key.encode()).hexdigest()
+
+
+def invalidate_tokens(keys):
+    cache_keys = [token_cache_key(key) for key in keys]
+    for cache_key in cache_keys:
+        local_token_cache.delete(cache_key)
+    cache.delete_many(cache_keys)
+
+
+def invalidate_user_tokens(user_id):
+    invalidate_tokens(Token.objects.filter(user_id=user_id).values_list('key', flat=True))
+
+
+def fresh_user(user):
+    """Пользователь, перечитанный из БД. request.user — копия снимка из
+    кэша, и его сохранение записало бы устаревшие счётчики и имя аватара."""
+    return get_user_model().objects.get(pk=user.pk)
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    """TokenAuthentication, который хранит пользователя по токену в LRU
+    процесса и в общем кэше. Неверные токены кэшируются только в LRU
+    процесса: перебор случайных токенов не должен вытеснять общий кэш.
+    Записи сбрасываются сигналами при удалении токена и изменении
+    пользователя. Перед изменением пользователя его нужно перечитать
+    через fresh_user."""
+
+    def authenticate_credentials(self, key):
+        cache_key = token_cache_key(key)
+        user = local_token_cache.get(cache_key)
+        if user is None:
+            user = cache.get(cache_key)
+            if user is None:
+                user = self.load_user(key)
+                if not isinstance(user, str):
+                    cache.set(cache_key, user, AUTH_SHARED_TIMEOUT)
+            local_token_cache.set(cache_key, user)
+        if isinstance(user, str):
+            raise exceptions.AuthenticationFailed(AUTH_FAILURES[user])
+        # копия: view может менять request.user, а объект в кэше общий
+        return copy.deepcopy(user), key
+
+    def load_user(self, key):
+        token = Token.objects.select_related('user').filter(key=key).first()
+        if token is None:
+            return 'invalid'
+        if not token.user.is_active:
+            return 'inactive'
+        return token.user
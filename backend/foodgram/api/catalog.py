@@ -0,0 +1,124 @@
+from bisect import bisect_left
+from threading import Lock
+from time import monotonic, time_ns
+
+from django.core.cache import cache
+
+from .models import Ingredient
+
+INGREDIENT_SEARCH_LIMIT = 50
+INGREDIENT_SEARCH_MAX_LIMIT = 500
+
+CATALOG_VERSION_KEY = 'ingredient-catalog-version'
+CATALOG_VERSION_CHECK_INTERVAL = 1.0
+
+
+def get_catalog_version():
+    # если ключ вытеснен из кэша, новая версия заведомо не совпадёт
+    # ни с одним загруженным снимком
+    return cache.get_or_set(CATALOG_VERSION_KEY, time_ns, timeout=None)
+
+
+class CatalogSnapshot:
+    """Неизменяемый снимок справочника ингредиентов.
+
+    Строки отсортированы по названию в нижнем регистре, все названия
+    дополнительно склеены в одну строку для поиска подстроки через str.find.
+    """
+
+    def __init__(self, version, ingredients):
+        rows = sorted(
+            (name.lower(), pk, name, unit) for pk, name, unit in ingredients
+        )
+        self.version = version
+        self.rows = tuple(
+            {'id': pk, 'name': name, 'measurement_unit': unit}
+            for _, pk, name, unit in rows
+        )
+        self.keys = tuple(key for key, *_ in rows)
+        self.by_id = {row['id']: row for row in self.rows}
+        self.ids = frozenset(self.by_id)
+        self.haystack = '\n'.join(self.keys)
+        offsets = []
+        offset = 0
+        for key in self.keys:
+            offsets.append(offset)
+            offset += len(key) + 1
+        self.offsets = tuple(offsets)
+
+    def search(self, query, limit):
+        query = query.lower()
+        keys, rows = self.keys, self.rows
+        start = bisect_left(keys, query)
+        end = start
+        while end < len(keys) and end - start < limit and keys[end].startswith(query):
+            end += 1
+        result = list(rows[start:end])
+        if len(result) >= limit:
+            return result
+
+        position = self.haystack.find(query)
+        while position != -1:
+            i = bisect_left(self.offsets, position + 1) - 1
+            if not start <= i < end:
+                result.append(rows[i])
+                if len(result) >= limit:
+                    break
+            position = self.haystack.find(query, self.offsets[i] + len(keys[i]) + 1)
+        return result
+
+
+class IngredientCatalog:
+    """Справочник ингредиентов в памяти процесса.
+
+    Загружается один раз на воркер. Версия хранится в общем кэше и
+    увеличивается сигналами Ingredient, поэтому изменение справочника
+    в одном воркере сбрасывает снимки во всех остальных. Версия
+    перечитывается не чаще раза в CATALOG_VERSION_CHECK_INTERVAL секунд.
+    """
+
+    def __init__(self):
+        self._lock = Lock()
+        self._snapshot = None
+        self._checked_at = 0.0
+
+    def snapshot(self):
+        snapshot = self._snapshot
+        now = monotonic()
+        if snapshot is not None and now - self._checked_at < CATALOG_VERSION_CHECK_INTERVAL:
+            return snapshot
+        with self._lock:
+            version = get_catalog_version()
+            if self._snapshot is None or self._snapshot.version != version:
+                self._snapshot = CatalogSnapshot(
+                    version,
+                    Ingredient.objects.values_list('id', 'name', 'measurement_unit')
+                )
+            self._checked_at = now
+            return self._snapshot
+
+    @property
+    def version(self):
+        return self.snapshot().version
+
+    def all(self):
+        return list(self.snapshot().rows)
+
+    def get(self, pk):
+        return self.snapshot().by_id.get(pk)
+
+    def ids(self):
+        return self.snapshot().ids
+
+    def search(self, query, limit=INGREDIENT_SEARCH_LIMIT):
+        """Ингредиенты, чьё название содержит query: сначала совпадения
+        с начала названия, затем вхождения в середине, не больше limit."""
+        return self.snapshot().search(query, limit)
+
+    def invalidate(self):
+        cache.set(CATALOG_VERSION_KEY, time_ns(), timeout=None)
+        with self._lock:
+            self._snapshot = None
+
+
+ingredient_catalog = IngredientCatalog()
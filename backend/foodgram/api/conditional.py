@@ -0,0 +1,75 @@
+from hashlib import sha1
+
+from django.utils.cache import patch_vary_headers
+from django.utils.http import parse_etags, quote_etag
+from rest_framework import status
+from rest_framework.response import Response
+
+
+def make_etag(*parts, weak=False):
+    """ETag из версий, от которых зависит ответ. Слабый ETag ставится
+    спискам: их тело зависит ещё и от ссылок пагинации."""
+    etag = quote_etag(sha1(repr(parts).encode()).hexdigest())
+    return f'W/{etag}' if weak else etag
+
+
+def etag_matches(request, etag):
+    # If-None-Match сравнивается слабо: W/ не учитывается
+    header = request.headers.get('If-None-Match')
+    if not header:
+        return False
+    etags = parse_etags(header)
+    if etags == ['*']:
+        return True
+    return etag.removeprefix('W/') in {tag.removeprefix('W/') for tag in etags}
+
+
+def conditional_response(request, etag, build, personal=False):
+    """304 без тела, если у клиента актуальная версия, иначе ответ build().
+    personal — ответ зависит от пользователя, кэши должны учитывать токен."""
+    if etag_matches(request, etag):
+        response = Response(status=status.HTTP_304_NOT_MODIFIED)
+    else:
+        response = build()
+    response['ETag'] = etag
+    if personal:
+        patch_vary_headers(response, ['Authorization'])
+    return response
+
+
+def get_page_state(paginator):
+    """Всё, что кроме записей пагинатор кладёт в ответ."""
+    if paginator is None:
+        return None
+    return (
+        getattr(paginator, 'count', None),
+        paginator.get_next_link(),
+        paginator.get_previous_link(),
+    )
+
+
+class ConditionalListMixin:
+    """list() со слабым ETag: страница выбирается из БД, но если версии её
+    записей не изменились, сериализация не выполняется."""
+
+    def get_list_versions(self, objects):
+        raise NotImplementedError
+
+    def list(self, request, *args, **kwargs):
+        queryset = self.filter_queryset(self.get_queryset())
+        page = self.paginate_queryset(queryset)
+        objects = list(queryset) if page is None else page
+        etag = make_etag(
+            request.build_absolute_uri('/'),
+            get_page_state(self.paginator),
+            self.get_list_versions(objects),
+            weak=True
+        )
+
+        def build():
+            data = self.get_serializer(objects, many=True).data
+            if page is None:
+                return Response(data)
+            return self.get_paginated_response(data)
+
+        return conditional_response(request, etag, build, personal=True)
@@ -0,0 +1,68 @@
+from django.db import connection
+from django.db.models import Count, F, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+
+from .models import Favorite, Follow, Recipe, ShoppingCart, User
+
+# (модель со счётчиком, поле счётчика, связанная модель, FK на модель со счётчиком)
+COUNTERS = [
+    (Recipe, 'favorites_count', Favorite, 'recipe'),
+    (Recipe, 'in_carts_count', ShoppingCart, 'recipe'),
+    (User, 'recipes_count', Recipe, 'author'),
+    (User, 'subscribers_count', Follow, 'author'),
+]
+
+
+def change_counter(model, pk, field, delta):
+    """Атомарно меняет счётчик одним UPDATE без чтения строки."""
+    model.objects.filter(pk=pk).update(**{field: F(field) + delta})
+
+
+def actual_count(related_model, fk):
+    return Coalesce(
+        Subquery(
+            related_model.objects
+            .filter(**{fk: OuterRef('pk')})
+            .order_by()
+            .values(fk)
+            .annotate(total=Count('pk'))
+            .values('total')
+        ),
+        Value(0)
+    )
+
+
+def reconcile_counters():
+    """Пересчитывает расходящиеся счётчики. Возвращает число исправленных
+    строк для каждого счётчика."""
+    fixed = {}
+    for model, field, related_model, fk in COUNTERS:
+        drifted = (
+            model.objects
+            .annotate(actual=actual_count(related_model, fk))
+            .exclude(**{field: F('actual')})
+            .values_list('pk', flat=True)
+        )
+        fixed[f'{model.__name__}.{field}'] = model.objects.filter(
+            pk__in=list(drifted)
+        ).update(**{field: actual_count(related_model, fk)})
+    return fixed
+
+
+def change_counters(model, pks, field, delta):
+    """change_counter для многих строк сразу."""
+    model.objects.filter(pk__in=pks).update(**{field: F(field) + delta})
+
+
+def change_counter_returning(model, pk, field, delta):
+    """change_counter, сразу возвращающий изменённый объект
+    (UPDATE ... RETURNING), или None, если строки нет."""
+    meta = model._meta
+    quote = connection.ops.quote_name
+    column = quote(meta.get_field(field).column)
+    columns = ', '.join(quote(model_field.column) for model_field in meta.concrete_fields)
+    sql = (
+        f'UPDATE {quote(meta.db_table)} SET {column} = {column} + %s '
+        f'WHERE {quote(meta.pk.column)} = %s RETURNING {columns}'
+    )
+    return next(iter(model.objects.raw(sql, [delta, pk])), None)
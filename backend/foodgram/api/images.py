@@ -0,0 +1,222 @@
+import base64
+import binascii
+import io
+import logging
+import os
+import threading
+from functools import partial
+from tempfile import SpooledTemporaryFile
+
+from django.core.files import File
+from django.core.files.base import ContentFile
+from django.db import IntegrityError, connection, transaction
+from django.db.models import F
+from django.utils import timezone
+from PIL import Image, ImageOps
+
+from .models import ImageBlob, Recipe
+from .authentication import invalidate_user_tokens
+from .pools import create_process_pool
+from .recipe_cache import bump_recipe_versions
+from .storage import content_storage
+
+logger = logging.getLogger(__name__)
+
+# base64 декодируется кусками, кратными 4 символам
+BASE64_DECODE_CHUNK = 256 * 1024
+# до этого размера декодированное изображение держится в памяти
+IMAGE_SPOOL_MAX_SIZE = 2 * 1024 * 1024
+
+# вариант -> наибольшая сторона в пикселях, None — исходный размер
+IMAGE_VARIANTS = {
+    'thumbnail': 320,
+    'medium': 960,
+    'full': None,
+}
+WEBP_QUALITY = 80
+IMAGE_WORKERS = 2
+
+# поле изображения модели -> поле с путями готовых вариантов
+VARIANT_FIELDS = {
+    'image': 'image_variants',
+    'avatar': 'avatar_variants',
+}
+# аватары везде показываются маленькими
+FIELD_VARIANTS = {
+    'image': ('thumbnail', 'medium', 'full'),
+    'avatar': ('thumbnail',),
+}
+
+
+class InvalidImage(ValueError):
+    pass
+
+
+def decode_base64_image(data, name):
+    """Декодирует base64 кусками во временный файл, не создавая в памяти
+    копию изображения целиком."""
+    # переносы строк и пробелы допустимы в base64, но сдвинули бы границы
+    # кусков, поэтому убираются до нарезки
+    data = ''.join(data.split())
+    file = SpooledTemporaryFile(max_size=IMAGE_SPOOL_MAX_SIZE)
+    try:
+        for start in range(0, len(data), BASE64_DECODE_CHUNK):
+            file.write(base64.b64decode(data[start:start + BASE64_DECODE_CHUNK], validate=True))
+    except (binascii.Error, ValueError) as error:
+        file.close()
+        raise InvalidImage(str(error))
+    file.seek(0)
+    return File(file, name=name)
+
+
+def check_image(file):
+    """Проверка изображения целиком до сохранения: заголовок (формат,
+    размеры, защита от «бомб»), контрольные суммы и декодирование всех
+    пикселей. Обрезанный или повреждённый файл отклоняется в запросе,
+    а не падает потом при построении вариантов в пуле процессов."""
+    try:
+        with Image.open(file) as image:
+            image_format = image.format
+            # после verify() объект изображения использовать нельзя
+            image.verify()
+        file.seek(0)
+        with Image.open(file) as image:
+            image.load()
+    except (OSError, ValueError, SyntaxError, Image.DecompressionBombError) as error:
+        raise InvalidImage(str(error))
+    finally:
+        file.seek(0)
+    return image_format
+
+
+def variant_name(name, variant):
+    root, _ = os.path.splitext(name)
+    return f'{root}.{variant}.webp'
+
+
+def make_image_variants(name, variants=tuple(IMAGE_VARIANTS)):
+    """Уменьшенные копии изображения в WebP. Выполняется в отдельном
+    процессе и работает только с файловым хранилищем, без БД."""
+    with content_storage.open(name) as source, Image.open(source) as image:
+        image = ImageOps.exif_transpose(image)
+        image = image.convert('RGBA' if image.mode in ('RGBA', 'LA', 'P') else 'RGB')
+        built = {'source': name}
+        for variant in variants:
+            target = variant_name(name, variant)
+            # один файл может быть у нескольких рецептов: варианты уже есть
+            if content_storage.exists(target):
+                built[variant] = target
+                continue
+            size = IMAGE_VARIANTS[variant]
+            resized = image.copy()
+            if size is not None:
+                resized.thumbnail((size, size), Image.Resampling.LANCZOS)
+            buffer = io.BytesIO()
+            resized.save(buffer, 'WEBP', quality=WEBP_QUALITY)
+            built[variant] = content_storage.save_derived(target, ContentFile(buffer.getvalue()))
+    return built
+
+
+_image_pool = None
+_image_pool_lock = threading.Lock()
+
+
+def get_image_pool():
+    global _image_pool
+    with _image_pool_lock:
+        if _image_pool is None:
+            _image_pool = create_process_pool(IMAGE_WORKERS)
+        return _image_pool
+
+
+def get_variant_url(file, variant):
+    """Путь к варианту изображения, если он готов и сделан из текущего
+    файла, иначе к исходному файлу."""
+    variants = getattr(file.instance, VARIANT_FIELDS.get(file.field.name, ''), None) or {}
+    if variant is not None and variants.get('source') == file.name and variant in variants:
+        return file.storage.url(variants[variant])
+    return file.url
+
+
+def needs_variants(instance, field):
+    file = getattr(instance, field)
+    variants = getattr(instance, VARIANT_FIELDS[field])
+    return bool(file) and variants.get('source') != file.name
+
+
+def schedule_image_variants(instance, field):
+    """После коммита ставит построение вариантов в пул процессов."""
+    model, pk, name = type(instance), instance.pk, getattr(instance, field).name
+    transaction.on_commit(lambda: get_image_pool().submit(
+        make_image_variants, name, FIELD_VARIANTS[field]
+    ).add_done_callback(
+        partial(_store_variants, model, pk, field, name, threading.get_ident())
+    ))
+
+
+def store_variants(model, pk, field, name, variants):
+    # файл могли заменить, пока строились варианты
+    updated = model.objects.filter(pk=pk, **{field: name}).update(**{
+        VARIANT_FIELDS[field]: variants, 'updated_at': timezone.now()
+    })
+    if not updated:
+        return
+    if model is Recipe:
+        bump_recipe_versions([pk])
+        return
+    bump_recipe_versions(Recipe.objects.filter(author_id=pk).values_list('id', flat=True))
+    invalidate_user_tokens(pk)
+
+
+def _store_variants(model, pk, field, name, scheduled_in, future):
+    try:
+        variants = future.result()
+    except Exception:
+        logger.exception('Image variants for %s failed', name)
+        return
+    try:
+        store_variants(model, pk, field, name, variants)
+    finally:
+        # колбэк выполняется в служебном потоке пула, его соединение
+        # никто, кроме нас, не закроет
+        if threading.get_ident() != scheduled_in:
+            connection.close()
+
+
+def acquire_blob(name):
+    """Добавляет ссылку на файл. Счётчик увеличивается одним UPDATE,
+    строка создаётся, только если её нет: между чтением и UPDATE её мог
+    удалить release_blob, и ссылка бы потерялась."""
+    while not ImageBlob.objects.filter(name=name).update(references=F('references') + 1):
+        try:
+            with transaction.atomic():
+                ImageBlob.objects.create(name=name, references=1)
+            return
+        except IntegrityError:
+            # строку одновременно создал другой запрос, повторяем UPDATE
+            continue
+
+
+def release_blob(name):
+    """Снимает ссылку на файл; последний освобождённый файл удаляется
+    вместе с вариантами после коммита."""
+    with transaction.atomic():
+        blob = ImageBlob.objects.select_for_update().filter(name=name).first()
+        if blob is None:
+            return
+        if blob.references > 1:
+            ImageBlob.objects.filter(name=name).update(references=F('references') - 1)
+            return
+        blob.delete()
+
+    transaction.on_commit(lambda: delete_unused_blob_files(name))
+
+
+def delete_unused_blob_files(name):
+    """Удаляет файл и его варианты, если на него не осталось ссылок."""
+    # файл могли загрузить снова, пока транзакция не закоммитилась
+    if ImageBlob.objects.filter(name=name).exists():
+        return
+    content_storage.delete(name)
+    for variant in IMAGE_VARIANTS:
+        content_storage.delete(variant_name(name, variant))
@@ -0,0 +1,171 @@
+from array import array
+from bisect import bisect_left
+from collections import Counter
+from heapq import nsmallest
+from threading import Lock
+from time import monotonic
+
+from django.core.cache import cache
+
+from .models import IngredientInRecipe
+
+INDEX_SEQUENCE_KEY = 'recipe-ingredient-index-sequence'
+INDEX_DELTA_KEY = 'recipe-ingredient-index-delta:{}'
+INDEX_DELTA_TIMEOUT = 60 * 60
+INDEX_VERSION_CHECK_INTERVAL = 1.0
+# отставший дальше этого воркер перестраивает индекс целиком
+INDEX_MAX_DELTAS = 1_000
+# изменения одного рецепта из разных воркеров могут попасть в журнал
+# не в порядке коммитов; полная перестройка раз в INDEX_MAX_AGE
+# ограничивает время, пока индекс видит устаревший состав рецепта
+INDEX_MAX_AGE = 5 * 60
+
+COOK_SEARCH_LIMIT = 20
+COOK_SEARCH_MAX_LIMIT = 100
+
+
+def get_index_sequence():
+    return cache.get_or_set(INDEX_SEQUENCE_KEY, 0, timeout=None)
+
+
+def next_index_sequence():
+    cache.add(INDEX_SEQUENCE_KEY, 0, timeout=None)
+    try:
+        return cache.incr(INDEX_SEQUENCE_KEY)
+    except ValueError:
+        # ключ удалили между add и incr
+        cache.add(INDEX_SEQUENCE_KEY, 0, timeout=None)
+        return cache.incr(INDEX_SEQUENCE_KEY)
+
+
+class RecipeIngredientIndex:
+    """Обратный индекс ингредиент -> отсортированный массив id рецептов.
+
+    Держится в памяти процесса. Каждое изменение рецепта получает номер
+    в общем кэше и записывается в журнал как новый состав рецепта (None —
+    рецепт удалён). Воркеры применяют пропущенные записи журнала к своему
+    индексу и перестраивают его из БД, только если часть записей уже
+    вытеснена или журнал сброшен через invalidate.
+    """
+
+    def __init__(self):
+        self._lock = Lock()
+        self._sequence = None
+        self._checked_at = 0.0
+        self._loaded_at = 0.0
+        self._postings = {}
+        self._sizes = {}
+
+    def _load(self, sequence):
+        postings = {}
+        sizes = Counter()
+        rows = (
+            IngredientInRecipe.objects
+            .order_by('ingredient_id', 'recipe_id')
+            .values_list('ingredient_id', 'recipe_id')
+            .iterator(chunk_size=10_000)
+        )
+        for ingredient_id, recipe_id in rows:
+            recipe_ids = postings.get(ingredient_id)
+            if recipe_ids is None:
+                recipe_ids = postings[ingredient_id] = array('q')
+            recipe_ids.append(recipe_id)
+            sizes[recipe_id] += 1
+        self._postings = postings
+        self._sizes = dict(sizes)
+        self._sequence = sequence
+        self._loaded_at = monotonic()
+
+    def _replay(self, sequence):
+        """Применяет записи журнала после своего номера до sequence.
+        False, если их уже не восстановить и нужна перестройка."""
+        if not 0 <= sequence - self._sequence <= INDEX_MAX_DELTAS:
+            return False
+        keys = [INDEX_DELTA_KEY.format(number) for number in range(self._sequence + 1, sequence + 1)]
+        deltas = cache.get_many(keys)
+        if len(deltas) != len(keys):
+            return False
+        for key in keys:
+            recipe_id, ingredient_ids = deltas[key]
+            self._set(recipe_id, ingredient_ids)
+        self._sequence = sequence
+        return True
+
+    def _ensure_fresh(self):
+        now = monotonic()
+        if self._sequence is not None and now - self._checked_at < INDEX_VERSION_CHECK_INTERVAL:
+            return
+        # номер читается до загрузки: изменения, попавшие в БД во время
+        # загрузки, потом применятся повторно, это безопасно
+        sequence = get_index_sequence()
+        if (
+            self._sequence is None
+            or now - self._loaded_at > INDEX_MAX_AGE
+            or not self._replay(sequence)
+        ):
+            self._load(sequence)
+        self._checked_at = now
+
+    def rank(self, ingredient_ids, limit=COOK_SEARCH_LIMIT):
+        """Рецепты по доле их ингредиентов, имеющихся в ingredient_ids:
+        список (recipe_id, совпало, всего) по убыванию покрытия."""
+        with self._lock:
+            self._ensure_fresh()
+            matched = Counter()
+            for ingredient_id in set(ingredient_ids):
+                matched.update(self._postings.get(ingredient_id, ()))
+            sizes = self._sizes
+            ranked = nsmallest(
+                limit, matched.items(),
+                key=lambda item: (-item[1] / sizes[item[0]], -item[1], -item[0])
+            )
+            return [
+                (recipe_id, count, sizes[recipe_id])
+                for recipe_id, count in ranked
+            ]
+
+    def _remove(self, recipe_id):
+        for recipe_ids in self._postings.values():
+            position = bisect_left(recipe_ids, recipe_id)
+            if position < len(recipe_ids) and recipe_ids[position] == recipe_id:
+                del recipe_ids[position]
+        self._sizes.pop(recipe_id, None)
+
+    def _set(self, recipe_id, ingredient_ids):
+        self._remove(recipe_id)
+        if ingredient_ids is None:
+            return
+        for ingredient_id in ingredient_ids:
+            recipe_ids = self._postings.setdefault(ingredient_id, array('q'))
+            recipe_ids.insert(bisect_left(recipe_ids, recipe_id), recipe_id)
+        self._sizes[recipe_id] = len(ingredient_ids)
+
+    def _publish(self, recipe_id, ingredient_ids):
+        """Записывает изменение в журнал и сразу применяет его к своему
+        индексу, если тот не отстал; иначе оно догонится при проверке."""
+        if ingredient_ids is not None:
+            ingredient_ids = list(ingredient_ids)
+        sequence = next_index_sequence()
+        cache.set(INDEX_DELTA_KEY.format(sequence), (recipe_id, ingredient_ids), INDEX_DELTA_TIMEOUT)
+        with self._lock:
+            if self._sequence == sequence - 1:
+                self._set(recipe_id, ingredient_ids)
+                self._sequence = sequence
+            else:
+                self._checked_at = 0.0
+
+    def set_recipe(self, recipe_id, ingredient_ids):
+        self._publish(recipe_id, ingredient_ids)
+
+    def remove_recipe(self, recipe_id):
+        self._publish(recipe_id, None)
+
+    def invalidate(self):
+        """Сбрасывает индекс во всех воркерах: номер без записи в журнале
+        не восстановить, и каждый воркер перестроит индекс из БД."""
+        next_index_sequence()
+        with self._lock:
+            self._sequence = None
+
+
+recipe_ingredient_index = RecipeIngredientIndex()
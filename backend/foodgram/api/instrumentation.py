@@ -0,0 +1,383 @@
+import bisect
+import copy
+import logging
+import os
+import re
+from contextvars import ContextVar
+from threading import Lock
+from time import monotonic, perf_counter
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection
+from rest_framework.serializers import BaseSerializer
+
+from .recipe_cache import LocalLRUCache
+
+logger = logging.getLogger(__name__)
+
+REQUEST_TIMING_DEFAULTS = {
+    'ENABLED': True,
+    'SLOW_REQUEST_MS': 500,
+    'SLOW_QUERY_COUNT': 50,
+    # столько одинаковых запросов за один HTTP-запрос — признак N+1
+    'REPEATED_QUERY_COUNT': 10,
+}
+# переключатель в общем кэше, воркеры перечитывают его раз в столько секунд
+REQUEST_TIMING_ENABLED_KEY = 'request-timing:enabled'
+REQUEST_TIMING_FLAG_TIMEOUT = 5
+
+# верхние границы корзин гистограмм; последняя корзина — всё, что больше
+DURATION_BUCKETS_MS = (5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100)
+
+# воркер выкладывает свою статистику в общий кэш не чаще, чем раз в столько
+# секунд; слот воркера освобождается, если он молчит REQUEST_STATS_TIMEOUT
+REQUEST_STATS_PUBLISH_INTERVAL = 10.0
+REQUEST_STATS_TIMEOUT = 60 * 60
+REQUEST_STATS_MAX_WORKERS = 32
+
+UNMATCHED_ROUTE = '<unmatched>'
+
+# SQL-запрос -> отпечаток: значения и списки IN заменены на ?
+SQL_FINGERPRINT_RULES = (
+    (re.compile(r"'(?:[^']|'')*'"), '?'),
+    (re.compile(r'\b\d+(?:\.\d+)?\b'), '?'),
+    (re.compile(r'%s'), '?'),
+    (re.compile(r'\(\s*\?(?:\s*,\s*\?)*\s*\)'), '(...)'),
+    (re.compile(r'\s+'), ' '),
+)
+
+current_timing = ContextVar('request_timing', default=None)
+timing_flag_cache = LocalLRUCache(1, REQUEST_TIMING_FLAG_TIMEOUT)
+
+
+def get_timing_settings():
+    return {**REQUEST_TIMING_DEFAULTS, **getattr(settings, 'REQUEST_TIMING', {})}
+
+
+def timing_enabled():
+    enabled = timing_flag_cache.get(REQUEST_TIMING_ENABLED_KEY)
+    if enabled is None:
+        enabled = cache.get(REQUEST_TIMING_ENABLED_KEY)
+        if enabled is None:
+            enabled = get_timing_settings()['ENABLED']
+        timing_flag_cache.set(REQUEST_TIMING_ENABLED_KEY, enabled)
+    return enabled
+
+
+def set_timing_enabled(enabled):
+    """Включает или выключает инструментацию во всех воркерах."""
+    cache.set(REQUEST_TIMING_ENABLED_KEY, enabled, timeout=None)
+    timing_flag_cache.clear()
+
+
+def sql_fingerprint(sql):
+    for pattern, replacement in SQL_FINGERPRINT_RULES:
+        sql = pattern.sub(replacement, sql)
+    return sql.strip()
+
+
+class RequestTiming:
+    """Замеры одного HTTP-запроса: SQL, сериализация и рендеринг."""
+
+    def __init__(self):
+        self.started = perf_counter()
+        self.total = 0.0
+        self.db_time = 0.0
+        self.serializer_time = 0.0
+        self.render_time = 0.0
+        self.serializing = False
+        # текст запроса -> [число выполнений, время]; Django подставляет
+        # параметры отдельно, так что повторы обычно совпадают дословно
+        self.statements = {}
+
+    @property
+    def query_count(self):
+        return sum(count for count, _ in self.statements.values())
+
+    def record_query(self, execute, sql, params, many, context):
+        started = perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            elapsed = perf_counter() - started
+            self.db_time += elapsed
+            stat = self.statements.setdefault(sql, [0, 0.0])
+            stat[0] += 1
+            stat[1] += elapsed
+
+    def finish(self):
+        self.total = perf_counter() - self.started
+
+    def worst_repeated_query(self):
+        """Самый частый повторяющийся запрос: (отпечаток, число, время) или None."""
+        fingerprints = {}
+        for sql, (count, elapsed) in self.statements.items():
+            stat = fingerprints.setdefault(sql_fingerprint(sql), [0, 0.0])
+            stat[0] += count
+            stat[1] += elapsed
+        if not fingerprints:
+            return None
+        fingerprint, (count, elapsed) = max(
+            fingerprints.items(), key=lambda item: (item[1][0], item[1][1])
+        )
+        if count < 2:
+            return None
+        return fingerprint, count, elapsed
+
+    def server_timing(self, streaming=False):
+        # заголовок уходит до тела: запросы, выполненные при отдаче
+        # потокового ответа, в него не попадают, только в статистику
+        queries = f'{self.query_count} queries' + (' before streaming' if streaming else '')
+        return ', '.join((
+            f'db;dur={self.db_time * 1000:.1f};desc="{queries}"',
+            f'serializer;dur={self.serializer_time * 1000:.1f}',
+            f'render;dur={self.render_time * 1000:.1f}',
+            f'total;dur={self.total * 1000:.1f}',
+        ))
+
+
+def _timed_serializer_data(data):
+    def timed_data(self):
+        timing = current_timing.get()
+        # вложенные сериализаторы уже учтены во внешнем
+        if timing is None or timing.serializing:
+            return data(self)
+        timing.serializing = True
+        started = perf_counter()
+        try:
+            return data(self)
+        finally:
+            timing.serializer_time += perf_counter() - started
+            timing.serializing = False
+    timed_data.original = data
+    return timed_data
+
+
+def install_serializer_timing():
+    """Засекает BaseSerializer.data: через него проходят все сериализаторы,
+    так что views менять не нужно."""
+    if not hasattr(BaseSerializer.data.fget, 'original'):
+        BaseSerializer.data = property(_timed_serializer_data(BaseSerializer.data.fget))
+
+
+def empty_route_stats():
+    return {
+        'count': 0,
+        'total_ms': 0.0,
+        'db_ms': 0.0,
+        'serializer_ms': 0.0,
+        'render_ms': 0.0,
+        'queries': 0,
+        'max_queries': 0,
+        'duration_histogram': [0] * (len(DURATION_BUCKETS_MS) + 1),
+        'queries_histogram': [0] * (len(QUERY_COUNT_BUCKETS) + 1),
+    }
+
+
+def add_route_stats(target, stats):
+    for field in ('count', 'total_ms', 'db_ms', 'serializer_ms', 'render_ms', 'queries'):
+        target[field] += stats[field]
+    target['max_queries'] = max(target['max_queries'], stats['max_queries'])
+    for field in ('duration_histogram', 'queries_histogram'):
+        target[field] = [a + b for a, b in zip(target[field], stats[field])]
+
+
+def stats_slot_key(slot):
+    return f'request-stats:slot:{slot}'
+
+
+def stats_key(slot):
+    return f'request-stats:{slot}'
+
+
+class RequestStats:
+    """Гистограммы времени и числа SQL-запросов по маршрутам в памяти
+    воркера. Накопленные с запуска значения периодически выкладываются
+    в общий кэш под слотом воркера, откуда их собирает collect()."""
+
+    def __init__(self, publish_interval=REQUEST_STATS_PUBLISH_INTERVAL):
+        self.publish_interval = publish_interval
+        self._lock = Lock()
+        self._routes = {}
+        self._published_at = monotonic()
+        self._slot = None
+
+    def add(self, route, timing):
+        queries = timing.query_count
+        total_ms = timing.total * 1000
+        with self._lock:
+            stats = self._routes.get(route)
+            if stats is None:
+                stats = self._routes[route] = empty_route_stats()
+            stats['count'] += 1
+            stats['total_ms'] += total_ms
+            stats['db_ms'] += timing.db_time * 1000
+            stats['serializer_ms'] += timing.serializer_time * 1000
+            stats['render_ms'] += timing.render_time * 1000
+            stats['queries'] += queries
+            stats['max_queries'] = max(stats['max_queries'], queries)
+            stats['duration_histogram'][bisect.bisect_left(DURATION_BUCKETS_MS, total_ms)] += 1
+            stats['queries_histogram'][bisect.bisect_left(QUERY_COUNT_BUCKETS, queries)] += 1
+            if monotonic() - self._published_at < self.publish_interval:
+                return
+        self.publish()
+
+    def publish(self):
+        with self._lock:
+            routes = copy.deepcopy(self._routes)
+            self._published_at = monotonic()
+        slot = self.get_slot()
+        if slot is None:
+            logger.warning('No free request stats slot for worker %s', os.getpid())
+            return
+        cache.set(stats_key(slot), routes, REQUEST_STATS_TIMEOUT)
+
+    def get_slot(self):
+        # cache.add атомарен, поэтому два воркера не займут один слот
+        pid = os.getpid()
+        if self._slot is not None and cache.get(stats_slot_key(self._slot)) == pid:
+            cache.touch(stats_slot_key(self._slot), REQUEST_STATS_TIMEOUT)
+            return self._slot
+        for slot in range(REQUEST_STATS_MAX_WORKERS):
+            if cache.add(stats_slot_key(slot), pid, REQUEST_STATS_TIMEOUT):
+                self._slot = slot
+                return slot
+        return None
+
+    def collect(self):
+        """Статистика всех воркеров, сложенная по маршрутам."""
+        self.publish()
+        published = cache.get_many(
+            [stats_key(slot) for slot in range(REQUEST_STATS_MAX_WORKERS)]
+        )
+        routes = {}
+        for worker_routes in published.values():
+            for route, stats in worker_routes.items():
+                add_route_stats(routes.setdefault(route, empty_route_stats()), stats)
+        return len(published), routes
+
+
+request_stats = RequestStats()
+
+
+def histogram_labels(buckets, unit=''):
+    return [f'<={bound}{unit}' for bound in buckets] + [f'>{buckets[-1]}{unit}']
+
+
+def format_request_stats(routes):
+    """Статистика по маршрутам для ответа API, самые затратные первыми."""
+    duration_labels = histogram_labels(DURATION_BUCKETS_MS, 'ms')
+    queries_labels = histogram_labels(QUERY_COUNT_BUCKETS)
+    result = []
+    for route, stats in sorted(routes.items(), key=lambda item: -item[1]['total_ms']):
+        method, _, path = route.partition(' ')
+        count = stats['count']
+        result.append({
+            'method': method,
+            'route': path,
+            'count': count,
+            'avg_ms': round(stats['total_ms'] / count, 2),
+            'avg_db_ms': round(stats['db_ms'] / count, 2),
+            'avg_serializer_ms': round(stats['serializer_ms'] / count, 2),
+            'avg_render_ms': round(stats['render_ms'] / count, 2),
+            'avg_queries': round(stats['queries'] / count, 2),
+            'max_queries': stats['max_queries'],
+            'duration_histogram': dict(zip(duration_labels, stats['duration_histogram'])),
+            'queries_histogram': dict(zip(queries_labels, stats['queries_histogram'])),
+        })
+    return result
+
+
+def request_route(request):
+    match = request.resolver_match
+    if match is None:
+        return f'{request.method} {UNMATCHED_ROUTE}'
+    # у маршрутов роутера DRF (re_path) в конце остаётся якорь $
+    return f'{request.method} /{match.route.removesuffix("$")}'
+
+
+class RequestTimingMiddleware:
+    """Считает SQL-запросы и время БД, сериализации и рендеринга,
+    отдаёт их в заголовке Server-Timing, пишет в журнал медленные запросы
+    и копит статистику по маршрутам. Должен стоять первым в MIDDLEWARE,
+    чтобы рендеринг ответа выполнялся сразу после него."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        install_serializer_timing()
+
+    def __call__(self, request):
+        if not timing_enabled():
+            return self.get_response(request)
+        timing = RequestTiming()
+        token = current_timing.set(timing)
+        try:
+            with connection.execute_wrapper(timing.record_query):
+                response = self.get_response(request)
+        finally:
+            current_timing.reset(token)
+        route = request_route(request)
+        streaming = response.streaming and not getattr(response, 'is_async', False)
+        response['Server-Timing'] = timing.server_timing(streaming=streaming)
+        if streaming:
+            # тело строится при отдаче, статистика пишется после неё
+            response.streaming_content = self.timed_stream(response.streaming_content, route, timing)
+            return response
+        self.record(route, timing)
+        return response
+
+    def timed_stream(self, content, route, timing):
+        """Отдаёт тело потокового ответа, считая запросы, выполненные
+        при построении каждой порции. Обёртка ставится на каждую порцию
+        отдельно: между ними соединение может использоваться другим кодом
+        того же потока."""
+        iterator = iter(content)
+        try:
+            while True:
+                token = current_timing.set(timing)
+                try:
+                    with connection.execute_wrapper(timing.record_query):
+                        chunk = next(iterator, None)
+                finally:
+                    current_timing.reset(token)
+                if chunk is None:
+                    return
+                yield chunk
+        finally:
+            self.record(route, timing)
+
+    def record(self, route, timing):
+        timing.finish()
+        request_stats.add(route, timing)
+        self.log_slow_request(route, timing)
+
+    def process_template_response(self, request, response):
+        # вызывается последним перед response.render()
+        timing = current_timing.get()
+        if timing is not None:
+            started = perf_counter()
+
+            def finish_render(response):
+                timing.render_time += perf_counter() - started
+
+            response.add_post_render_callback(finish_render)
+        return response
+
+    def log_slow_request(self, route, timing):
+        limits = get_timing_settings()
+        # отпечатки считаются только для подозрительных запросов: повторы
+        # N+1 почти всегда совпадают и без нормализации
+        most_repeated = max((count for count, _ in timing.statements.values()), default=0)
+        if (timing.total * 1000 < limits['SLOW_REQUEST_MS']
+                and timing.query_count < limits['SLOW_QUERY_COUNT']
+                and most_repeated < limits['REPEATED_QUERY_COUNT']):
+            return
+        repeated = timing.worst_repeated_query()
+        message = 'Slow request %s: %.1f ms, %d queries, %.1f ms in DB'
+        args = [route, timing.total * 1000, timing.query_count, timing.db_time * 1000]
+        if repeated is not None:
+            message += '; most repeated query (%d times, %.1f ms): %s'
+            args += [repeated[1], repeated[2] * 1000, repeated[0]]
+        logger.warning(message, *args)
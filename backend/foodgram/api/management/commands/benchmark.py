@@ -0,0 +1,388 @@
+import json
+import platform
+import random
+import re
+import subprocess
+from collections import Counter
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from pathlib import Path
+from urllib.parse import quote
+from time import perf_counter
+
+import django
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.db.models import Exists, OuterRef
+from django.test import Client
+from rest_framework.authtoken.models import Token
+
+from api.counters import reconcile_counters
+from api.models import Favorite, Follow, Ingredient, Recipe, RecipeRanking, ShoppingCart, User
+from api.recipe_cache import bump_recipe_versions
+from api.shopping_list import bump_cart_version
+
+DEFAULT_REQUESTS = 2_000
+DEFAULT_WARMUP = 200
+DEFAULT_CONCURRENCY = 4
+DEFAULT_CLIENTS = 50
+DEFAULT_OUTPUT_DIR = Path(settings.BASE_DIR) / 'benchmarks'
+TEST_CLIENT_HOST = 'localhost'
+PERCENTILES = (50, 95, 99)
+
+# сценарий -> (вес, нужен ли токен); вес — доля в смеси запросов
+SCENARIOS = {
+    'recipe_list': (20, False),
+    'recipe_list_popular': (5, False),
+    'recipe_list_favorited': (4, True),
+    'recipe_search': (4, False),
+    'recipe_detail': (20, False),
+    'recipe_detail_auth': (10, True),
+    'recipe_short_link': (2, False),
+    'recipes_by_ingredients': (3, False),
+    'ingredient_search': (10, False),
+    'ingredient_detail': (3, False),
+    'user_list': (2, False),
+    'user_detail': (4, True),
+    'user_me': (5, True),
+    'subscriptions': (4, True),
+    'favorite_toggle': (2, True),
+    'shopping_cart_toggle': (1, True),
+    'shopping_cart_download': (1, True),
+}
+
+# модели, которые меняют сценарии favorite_toggle и shopping_cart_toggle
+TOGGLED_MODELS = (Favorite, ShoppingCart)
+
+SEARCH_TERMS = ('суп', 'салат', 'пирог', 'каша')
+SERVER_TIMING_QUERIES = re.compile(r'db;[^,]*desc="(\d+) queries"')
+
+
+def percentile(sorted_values, percent):
+    """Перцентиль методом ближайшего ранга."""
+    if not sorted_values:
+        return None
+    rank = max(1, -(-percent * len(sorted_values) // 100))
+    return round(sorted_values[rank - 1], 3)
+
+
+def summarize(samples, duration=None):
+    latencies = sorted(latency for latency, _, _ in samples)
+    queries = [count for _, count, _ in samples if count is not None]
+    summary = {
+        'requests': len(samples),
+        'errors': sum(status >= 500 for _, _, status in samples),
+        'statuses': dict(sorted(Counter(str(status) for _, _, status in samples).items())),
+        'mean_ms': round(sum(latencies) / len(latencies), 3) if latencies else None,
+        **{f'p{percent}_ms': percentile(latencies, percent) for percent in PERCENTILES},
+        'queries_per_request': round(sum(queries) / len(queries), 2) if queries else None,
+    }
+    if duration:
+        summary['duration_s'] = round(duration, 3)
+        summary['throughput_rps'] = round(len(samples) / duration, 1)
+    return summary
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', 'HEAD'], capture_output=True, text=True,
+            cwd=settings.BASE_DIR, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+class Dataset:
+    """id, из которых сценарии собирают адреса запросов."""
+
+    def __init__(self, clients):
+        self.recipe_ids = list(Recipe.objects.values_list('id', flat=True))
+        self.user_ids = list(User.objects.filter(is_active=True).values_list('id', flat=True))
+        self.ingredient_ids = list(Ingredient.objects.values_list('id', flat=True))
+        if not (self.recipe_ids and self.user_ids and self.ingredient_ids):
+            raise CommandError('Нет данных для запросов, сначала выполните generate_data')
+        self.ingredient_prefixes = sorted({
+            name[:2] for name in Ingredient.objects.values_list('name', flat=True)
+        })
+        # пользователи, от имени которых идут запросы: те, у кого есть
+        # избранное, корзина и подписки, если такие есть
+        client_ids = list(
+            User.objects.filter(
+                Exists(Favorite.objects.filter(user=OuterRef('pk'))),
+                Exists(ShoppingCart.objects.filter(user=OuterRef('pk'))),
+                Exists(Follow.objects.filter(user=OuterRef('pk'))),
+                is_active=True,
+            ).order_by('id').values_list('id', flat=True)[:clients]
+        ) or self.user_ids[:clients]
+        self.client_ids = client_ids
+        Token.objects.bulk_create(
+            [Token(user_id=user_id, key=Token.generate_key()) for user_id in client_ids],
+            ignore_conflicts=True
+        )
+        self.tokens = list(Token.objects.filter(user_id__in=client_ids).values_list('key', flat=True))
+
+
+class ToggleSnapshot:
+    """Избранное и корзины клиентов бенчмарка и рейтинги рецептов до
+    прогона. Переключатели меняют их, restore возвращает всё как было,
+    чтобы повторный прогон шёл по тем же данным."""
+
+    def __init__(self, user_ids):
+        self.user_ids = user_ids
+        self.relations = {model: self.read_relations(model) for model in TOGGLED_MODELS}
+        self.rankings = self.read_rankings()
+
+    def read_relations(self, model):
+        return set(model.objects.filter(user_id__in=self.user_ids).values_list('user_id', 'recipe_id'))
+
+    def read_rankings(self):
+        return {
+            recipe_id: (popular_score, trending_score)
+            for recipe_id, popular_score, trending_score in RecipeRanking.objects.values_list(
+                'recipe_id', 'popular_score', 'trending_score'
+            ).iterator()
+        }
+
+    def restore(self):
+        """Возвращает сохранённое состояние, результат — число рецептов,
+        которые пришлось поправить."""
+        recipe_ids = set()
+        for model, saved in self.relations.items():
+            current = self.read_relations(model)
+            for user_id, recipe_id in current - saved:
+                model.objects.filter(user_id=user_id, recipe_id=recipe_id).delete()
+            model.objects.bulk_create(
+                [model(user_id=user_id, recipe_id=recipe_id) for user_id, recipe_id in saved - current],
+                ignore_conflicts=True
+            )
+            recipe_ids.update(recipe_id for _, recipe_id in saved ^ current)
+        changed = [
+            recipe_id for recipe_id, scores in self.read_rankings().items()
+            if self.rankings.get(recipe_id, scores) != scores
+        ]
+        RecipeRanking.objects.bulk_update(
+            [
+                RecipeRanking(
+                    recipe_id=recipe_id,
+                    popular_score=self.rankings[recipe_id][0],
+                    trending_score=self.rankings[recipe_id][1],
+                )
+                for recipe_id in changed
+            ],
+            ['popular_score', 'trending_score'], batch_size=1000
+        )
+        recipe_ids.update(changed)
+        # счётчики избранного и корзин снова совпадают с восстановленными строками
+        reconcile_counters()
+        bump_recipe_versions(recipe_ids)
+        bump_cart_version(self.user_ids)
+        return len(recipe_ids)
+
+
+def build_request(rng, scenario, data):
+    """(метод, путь) для сценария."""
+    recipe_id = rng.choice(data.recipe_ids)
+    if scenario == 'recipe_list':
+        return 'GET', f'/api/recipes/?limit=6&offset={rng.randrange(0, 60, 6)}'
+    if scenario == 'recipe_list_popular':
+        return 'GET', f"/api/recipes/?limit=6&ordering={rng.choice(('popular', 'trending'))}"
+    if scenario == 'recipe_list_favorited':
+        return 'GET', '/api/recipes/?limit=6&is_favorited=1'
+    if scenario == 'recipe_search':
+        return 'GET', f"/api/recipes/?limit=6&search={quote(rng.choice(SEARCH_TERMS))}"
+    if scenario in ('recipe_detail', 'recipe_detail_auth'):
+        return 'GET', f'/api/recipes/{recipe_id}/'
+    if scenario == 'recipe_short_link':
+        return 'GET', f'/api/recipes/{recipe_id}/get-link/'
+    if scenario == 'recipes_by_ingredients':
+        ids = ','.join(map(str, rng.sample(data.ingredient_ids, min(4, len(data.ingredient_ids)))))
+        return 'GET', f'/api/recipes/by_ingredients/?ingredients={ids}&limit=6'
+    if scenario == 'ingredient_search':
+        return 'GET', f'/api/ingredients/?name={quote(rng.choice(data.ingredient_prefixes))}'
+    if scenario == 'ingredient_detail':
+        return 'GET', f'/api/ingredients/{rng.choice(data.ingredient_ids)}/'
+    if scenario == 'user_list':
+        return 'GET', '/api/users/?limit=6'
+    if scenario == 'user_detail':
+        return 'GET', f'/api/users/{rng.choice(data.user_ids)}/'
+    if scenario == 'user_me':
+        return 'GET', '/api/users/me/'
+    if scenario == 'subscriptions':
+        return 'GET', '/api/users/subscriptions/?limit=6&recipes_limit=3'
+    if scenario == 'favorite_toggle':
+        return rng.choice(('POST', 'DELETE')), f'/api/recipes/{recipe_id}/favorite/'
+    if scenario == 'shopping_cart_toggle':
+        return rng.choice(('POST', 'DELETE')), f'/api/recipes/{recipe_id}/shopping_cart/'
+    if scenario == 'shopping_cart_download':
+        return 'GET', '/api/recipes/download_shopping_cart/?file_format=txt'
+    raise ValueError(scenario)
+
+
+def parse_queries(server_timing):
+    match = SERVER_TIMING_QUERIES.search(server_timing or '')
+    return int(match.group(1)) if match else None
+
+
+class TestClientTransport:
+    """Запросы в том же процессе через django.test.Client."""
+
+    concurrency = 1
+
+    def __init__(self):
+        self.client = Client(HTTP_HOST=TEST_CLIENT_HOST)
+
+    def __call__(self, method, path, token):
+        headers = {'Authorization': f'Token {token}'} if token else {}
+        started = perf_counter()
+        response = self.client.generic(method, path, headers=headers)
+        # потоковые ответы (список покупок) тоже читаются до конца
+        if response.streaming:
+            b''.join(response.streaming_content)
+        elapsed = (perf_counter() - started) * 1000
+        return elapsed, parse_queries(response.get('Server-Timing')), response.status_code
+
+
+class HttpTransport:
+    """Запросы к запущенному серверу по HTTP."""
+
+    def __init__(self, base_url, concurrency):
+        self.base_url = base_url.rstrip('/')
+        self.concurrency = concurrency
+
+    def __call__(self, method, path, token):
+        request = urllib.request.Request(self.base_url + path, method=method)
+        if token:
+            request.add_header('Authorization', f'Token {token}')
+        started = perf_counter()
+        try:
+            with urllib.request.urlopen(request) as response:
+                response.read()
+                status, server_timing = response.status, response.headers.get('Server-Timing')
+        except urllib.error.HTTPError as error:
+            error.read()
+            status, server_timing = error.code, error.headers.get('Server-Timing')
+        elapsed = (perf_counter() - started) * 1000
+        return elapsed, parse_queries(server_timing), status
+
+
+class Command(BaseCommand):
+    help = (
+        'Нагрузочный тест: воспроизводимая взвешенная смесь запросов к API. '
+        'Считает p50/p95/p99 задержки, SQL-запросы на запрос (по Server-Timing) '
+        'и пропускную способность, результат сохраняет в JSON для сравнения коммитов.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--requests', type=int, default=DEFAULT_REQUESTS,
+            help=f'Число замеряемых запросов (по умолчанию {DEFAULT_REQUESTS})'
+        )
+        parser.add_argument(
+            '--warmup', type=int, default=DEFAULT_WARMUP,
+            help=f'Число запросов для прогрева кэшей (по умолчанию {DEFAULT_WARMUP})'
+        )
+        parser.add_argument('--seed', type=int, default=0, help='Зерно генератора случайных чисел')
+        parser.add_argument(
+            '--url',
+            help='Адрес запущенного сервера, например http://localhost:8000; '
+                 'без него запросы идут через django.test.Client'
+        )
+        parser.add_argument(
+            '--concurrency', type=int, default=DEFAULT_CONCURRENCY,
+            help='Число параллельных соединений при --url'
+        )
+        parser.add_argument(
+            '--clients', type=int, default=DEFAULT_CLIENTS,
+            help='Число пользователей, от имени которых идут запросы'
+        )
+        parser.add_argument('--output', help='Файл для результата в JSON')
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        data = Dataset(options['clients'])
+        if options['url']:
+            transport = HttpTransport(options['url'], options['concurrency'])
+        else:
+            transport = TestClientTransport()
+
+        scenarios = list(SCENARIOS)
+        weights = [weight for weight, _ in SCENARIOS.values()]
+        plan = []
+        for _ in range(options['warmup'] + options['requests']):
+            scenario = rng.choices(scenarios, weights)[0]
+            method, path = build_request(rng, scenario, data)
+            token = rng.choice(data.tokens) if SCENARIOS[scenario][1] else None
+            plan.append((scenario, method, path, token))
+
+        def run(item):
+            scenario, method, path, token = item
+            return scenario, transport(method, path, token)
+
+        snapshot = ToggleSnapshot(data.client_ids)
+        try:
+            with ThreadPoolExecutor(transport.concurrency) as executor:
+                list(executor.map(run, plan[:options['warmup']]))
+                started = perf_counter()
+                results = list(executor.map(run, plan[options['warmup']:]))
+                duration = perf_counter() - started
+        finally:
+            restored = snapshot.restore()
+        self.stdout.write(f'Избранное, корзины и рейтинги восстановлены у {restored} рецептов')
+
+        report = self.build_report(options, data, transport, results, duration)
+        output = Path(options['output'] or DEFAULT_OUTPUT_DIR / (
+            f"{datetime.now(timezone.utc):%Y%m%dT%H%M%SZ}-{(report['commit'] or 'unknown')[:12]}.json"
+        ))
+        output.parent.mkdir(parents=True, exist_ok=True)
+        output.write_text(json.dumps(report, ensure_ascii=False, indent=2), encoding='utf-8')
+
+        total = report['total']
+        self.stdout.write(f"{'сценарий':<24}{'запросы':>9}{'p50':>9}{'p95':>9}{'p99':>9}{'SQL':>7}")
+        for scenario, summary in report['scenarios'].items():
+            self.stdout.write(
+                f"{scenario:<24}{summary['requests']:>9}{summary['p50_ms']:>9.1f}"
+                f"{summary['p95_ms']:>9.1f}{summary['p99_ms']:>9.1f}"
+                f"{summary['queries_per_request'] if summary['queries_per_request'] is not None else '-':>7}"
+            )
+        self.stdout.write(self.style.SUCCESS(
+            f"{total['requests']} запросов за {total['duration_s']} с, "
+            f"{total['throughput_rps']} запросов/с, p95 {total['p95_ms']:.1f} мс, "
+            f"ошибок {total['errors']}. Результат: {output}"
+        ))
+
+    def build_report(self, options, data, transport, results, duration):
+        by_scenario = {}
+        for scenario, sample in results:
+            by_scenario.setdefault(scenario, []).append(sample)
+        return {
+            'commit': git_commit(),
+            'started_at': datetime.now(timezone.utc).isoformat(),
+            'mode': 'http' if options['url'] else 'test_client',
+            'url': options['url'],
+            'concurrency': transport.concurrency,
+            'seed': options['seed'],
+            'warmup': options['warmup'],
+            'environment': {
+                'python': platform.python_version(),
+                'django': django.get_version(),
+                'database': connection.vendor,
+            },
+            'dataset': {
+                'users': len(data.user_ids),
+                'recipes': len(data.recipe_ids),
+                'ingredients': len(data.ingredient_ids),
+                'favorites': Favorite.objects.count(),
+                'shopping_carts': ShoppingCart.objects.count(),
+                'follows': Follow.objects.count(),
+            },
+            'weights': {scenario: weight for scenario, (weight, _) in SCENARIOS.items()},
+            'total': summarize([sample for _, sample in results], duration),
+            'scenarios': {
+                scenario: summarize(samples)
+                for scenario, samples in sorted(by_scenario.items())
+            },
+        }
@@ -0,0 +1,32 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+
+from api.images import FIELD_VARIANTS, VARIANT_FIELDS, get_image_pool, make_image_variants, needs_variants, store_variants
+from api.models import Recipe
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = 'Строит уменьшенные копии фото рецептов и аватаров, у которых их ещё нет.'
+
+    def handle(self, *args, **options):
+        pool = get_image_pool()
+        for model, field in ((Recipe, 'image'), (User, 'avatar')):
+            objects = model.objects.only('pk', field, VARIANT_FIELDS[field]).iterator()
+            futures = [
+                (obj.pk, getattr(obj, field).name,
+                 pool.submit(make_image_variants, getattr(obj, field).name, FIELD_VARIANTS[field]))
+                for obj in objects if needs_variants(obj, field)
+            ]
+            built = 0
+            for pk, name, future in futures:
+                try:
+                    variants = future.result()
+                except Exception as error:
+                    self.stderr.write(f'{name}: {error}')
+                    continue
+                store_variants(model, pk, field, name, variants)
+                built += 1
+            self.stdout.write(f'{model._meta.verbose_name_plural}: {built} из {len(futures)}')
+        self.stdout.write(self.style.SUCCESS('Варианты изображений построены'))
@@ -0,0 +1,292 @@
+import io
+import random
+from bisect import bisect_left
+from collections import Counter
+from itertools import accumulate
+from pathlib import Path
+
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+from django.core.files.base import ContentFile
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import F
+from PIL import Image
+
+from api.catalog import ingredient_catalog
+from api.counters import reconcile_counters
+from api.images import make_image_variants
+from api.ingredient_index import recipe_ingredient_index
+from api.models import (
+    Favorite, Follow, ImageBlob, Ingredient, IngredientInRecipe, Recipe,
+    RecipeRanking, ShoppingCart, User
+)
+from api.ranking import (
+    FAVORITE_WEIGHT, NEW_RECIPE_WEIGHT, POPULAR_HALF_LIFE, SHOPPING_CART_WEIGHT,
+    TRENDING_HALF_LIFE, log_score
+)
+from api.storage import content_storage
+
+DEFAULT_INGREDIENTS_FILE = Path(settings.BASE_DIR).parent.parent / 'data' / 'ingredients.csv'
+DEFAULT_BATCH_SIZE = 5_000
+DEFAULT_PASSWORD = 'benchmark-password'
+# показатель закона Ципфа: чем больше, тем сильнее популярность
+# сосредоточена в первых рецептах и авторах
+DEFAULT_ZIPF_EXPONENT = 1.1
+
+RECIPE_INGREDIENTS = (3, 12)
+RECIPE_COOKING_TIME = (5, 180)
+INGREDIENT_AMOUNT = (1, 1000)
+RECIPE_TEXT_SENTENCES = (2, 8)
+PLACEHOLDER_IMAGE_SIZE = (1200, 800)
+
+RECIPE_DISHES = (
+    'Суп', 'Салат', 'Пирог', 'Рагу', 'Омлет', 'Запеканка', 'Каша', 'Паста',
+    'Плов', 'Котлеты', 'Блины', 'Оладьи', 'Соус', 'Торт', 'Жаркое',
+)
+RECIPE_STYLES = (
+    'по-домашнему', 'по-деревенски', 'быстрый', 'праздничный', 'лёгкий',
+    'острый', 'сытный', 'летний', 'зимний', 'бабушкин',
+)
+RECIPE_STEPS = (
+    'Нарежьте ингредиенты небольшими кусочками.',
+    'Разогрейте сковороду с маслом на среднем огне.',
+    'Смешайте всё в глубокой миске.',
+    'Доведите до кипения и убавьте огонь.',
+    'Выпекайте в разогретой духовке до золотистой корочки.',
+    'Посолите и поперчите по вкусу.',
+    'Дайте блюду настояться несколько минут.',
+    'Подавайте горячим, украсив зеленью.',
+)
+FIRST_NAMES = ('Анна', 'Иван', 'Мария', 'Пётр', 'Ольга', 'Сергей', 'Елена', 'Дмитрий')
+LAST_NAMES = ('Иванов', 'Петров', 'Смирнов', 'Кузнецов', 'Попов', 'Соколов', 'Лебедев')
+
+
+class ZipfSampler:
+    """Выбор индексов 0..n-1 с вероятностью, обратной рангу в степени s."""
+
+    def __init__(self, rng, n, exponent):
+        self.rng = rng
+        self.cum_weights = list(accumulate(1 / rank ** exponent for rank in range(1, n + 1)))
+
+    def choice(self):
+        return bisect_left(self.cum_weights, self.rng.random() * self.cum_weights[-1])
+
+    def sample(self, k, exclude=None):
+        """k различных индексов, кроме exclude."""
+        k = min(k, len(self.cum_weights) - (exclude is not None))
+        chosen = set()
+        while len(chosen) < k:
+            index = self.choice()
+            if index != exclude:
+                chosen.add(index)
+        return chosen
+
+
+def bulk_insert(model, objects, batch_size):
+    batch = []
+    for obj in objects:
+        batch.append(obj)
+        if len(batch) >= batch_size:
+            model.objects.bulk_create(batch, ignore_conflicts=True)
+            batch = []
+    if batch:
+        model.objects.bulk_create(batch, ignore_conflicts=True)
+
+
+class Command(BaseCommand):
+    help = (
+        'Создаёт воспроизводимый набор данных для нагрузочных тестов: '
+        'справочник ингредиентов, пользователей, рецепты, избранное, корзины '
+        'и подписки с распределением популярности по закону Ципфа.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=1_000, help='Число пользователей')
+        parser.add_argument('--recipes', type=int, default=5_000, help='Число рецептов')
+        parser.add_argument(
+            '--favorites', type=int, default=20,
+            help='Среднее число рецептов в избранном у пользователя'
+        )
+        parser.add_argument(
+            '--carts', type=int, default=5,
+            help='Среднее число рецептов в корзине у пользователя'
+        )
+        parser.add_argument(
+            '--follows', type=int, default=10,
+            help='Среднее число подписок у пользователя'
+        )
+        parser.add_argument(
+            '--zipf', type=float, default=DEFAULT_ZIPF_EXPONENT,
+            help=f'Показатель закона Ципфа (по умолчанию {DEFAULT_ZIPF_EXPONENT})'
+        )
+        parser.add_argument('--seed', type=int, default=0, help='Зерно генератора случайных чисел')
+        parser.add_argument(
+            '--prefix', default='bench',
+            help='Префикс имён и почты создаваемых пользователей'
+        )
+        parser.add_argument(
+            '--ingredients-file', default=str(DEFAULT_INGREDIENTS_FILE),
+            help='Справочник ингредиентов для load_ingredients'
+        )
+        parser.add_argument(
+            '--batch-size', type=int, default=DEFAULT_BATCH_SIZE,
+            help=f'Размер пачки для вставки (по умолчанию {DEFAULT_BATCH_SIZE})'
+        )
+
+    def handle(self, *args, **options):
+        if User.objects.filter(username__startswith=f"{options['prefix']}-").exists():
+            raise CommandError(
+                f"Пользователи с префиксом {options['prefix']} уже есть, укажите другой --prefix"
+            )
+        rng = random.Random(options['seed'])
+        self.batch_size = options['batch_size']
+        self.zipf = options['zipf']
+
+        call_command('load_ingredients', options['ingredients_file'], stdout=self.stdout)
+        ingredient_ids = sorted(Ingredient.objects.values_list('id', flat=True))
+        if not ingredient_ids:
+            raise CommandError('Справочник ингредиентов пуст')
+
+        with transaction.atomic():
+            user_ids = self.create_users(rng, options['users'], options['prefix'])
+            recipe_ids = self.create_recipes(rng, user_ids, ingredient_ids, options['recipes'])
+            favorites = self.create_relations(rng, Favorite, user_ids, recipe_ids, options['favorites'])
+            carts = self.create_relations(rng, ShoppingCart, user_ids, recipe_ids, options['carts'])
+            self.create_follows(rng, user_ids, options['follows'])
+            self.create_rankings(recipe_ids, favorites, carts)
+            reconcile_counters()
+        ingredient_catalog.invalidate()
+        # bulk_create не вызывает сигналы, индекс рецептов по ингредиентам
+        # перестраивается целиком
+        recipe_ingredient_index.invalidate()
+        self.stdout.write(self.style.SUCCESS(
+            f'Готово: {len(user_ids)} пользователей, {len(recipe_ids)} рецептов, '
+            f'{sum(favorites.values())} в избранном, {sum(carts.values())} в корзинах'
+        ))
+
+    def create_users(self, rng, count, prefix):
+        # хеш пароля дорогой, у всех пользователей он одинаковый
+        password = make_password(DEFAULT_PASSWORD)
+        users = User.objects.bulk_create(
+            [
+                User(
+                    username=f'{prefix}-{number}',
+                    email=f'{prefix}-{number}@example.com',
+                    first_name=rng.choice(FIRST_NAMES),
+                    last_name=rng.choice(LAST_NAMES),
+                    password=password,
+                )
+                for number in range(count)
+            ],
+            batch_size=self.batch_size
+        )
+        self.stdout.write(f'Пользователей: {len(users)}')
+        return [user.id for user in users]
+
+    def create_image(self):
+        """Одно общее изображение для всех рецептов, уже с вариантами."""
+        buffer = io.BytesIO()
+        Image.new('RGB', PLACEHOLDER_IMAGE_SIZE, (200, 120, 60)).save(buffer, 'JPEG')
+        name = content_storage.save('recipes/images/placeholder.jpeg', ContentFile(buffer.getvalue()))
+        return name, make_image_variants(name)
+
+    def create_recipes(self, rng, user_ids, ingredient_ids, count):
+        image, variants = self.create_image()
+        authors = ZipfSampler(rng, len(user_ids), self.zipf)
+        recipes = Recipe.objects.bulk_create(
+            [
+                Recipe(
+                    author_id=user_ids[authors.choice()],
+                    name=f'{rng.choice(RECIPE_DISHES)} {rng.choice(RECIPE_STYLES)} №{number}',
+                    text=' '.join(rng.choices(RECIPE_STEPS, k=rng.randint(*RECIPE_TEXT_SENTENCES))),
+                    cooking_time=rng.randint(*RECIPE_COOKING_TIME),
+                    image=image,
+                    image_variants=variants,
+                )
+                for number in range(count)
+            ],
+            batch_size=self.batch_size
+        )
+        recipe_ids = [recipe.id for recipe in recipes]
+        # bulk_create не вызывает сигналы, ссылки на файл считаются здесь
+        ImageBlob.objects.get_or_create(name=image, defaults={'references': 0})
+        ImageBlob.objects.filter(name=image).update(references=F('references') + len(recipe_ids))
+        bulk_insert(
+            IngredientInRecipe,
+            (
+                IngredientInRecipe(
+                    recipe_id=recipe_id, ingredient_id=ingredient_id,
+                    amount=rng.randint(*INGREDIENT_AMOUNT)
+                )
+                for recipe_id in recipe_ids
+                for ingredient_id in rng.sample(
+                    ingredient_ids, min(rng.randint(*RECIPE_INGREDIENTS), len(ingredient_ids))
+                )
+            ),
+            self.batch_size
+        )
+        self.stdout.write(f'Рецептов: {len(recipe_ids)}')
+        return recipe_ids
+
+    def create_relations(self, rng, model, user_ids, recipe_ids, average):
+        """Избранное или корзины: популярность рецептов по Ципфу, число
+        рецептов у пользователя — экспоненциальное со средним average.
+        Возвращает число пользователей для каждого рецепта."""
+        # ранги популярности не совпадают с порядком создания рецептов
+        ranked = rng.sample(recipe_ids, len(recipe_ids))
+        sampler = ZipfSampler(rng, len(ranked), self.zipf)
+        counts = dict.fromkeys(recipe_ids, 0)
+
+        def relations():
+            for user_id in user_ids:
+                for index in sampler.sample(round(rng.expovariate(1 / average)) if average else 0):
+                    counts[ranked[index]] += 1
+                    yield model(user_id=user_id, recipe_id=ranked[index])
+
+        bulk_insert(model, relations(), self.batch_size)
+        self.stdout.write(f'{model._meta.verbose_name}: {sum(counts.values())}')
+        return counts
+
+    def create_follows(self, rng, user_ids, average):
+        # на самых плодовитых авторов подписываются чаще
+        recipes_by_author = Counter(
+            Recipe.objects.filter(author_id__in=user_ids).values_list('author_id', flat=True)
+        )
+        authors = sorted(user_ids, key=lambda user_id: -recipes_by_author[user_id])
+        position = {author_id: index for index, author_id in enumerate(authors)}
+        sampler = ZipfSampler(rng, len(authors), self.zipf)
+        created = 0
+
+        def follows():
+            nonlocal created
+            for user_id in user_ids:
+                k = round(rng.expovariate(1 / average)) if average else 0
+                for index in sampler.sample(k, exclude=position[user_id]):
+                    created += 1
+                    yield Follow(user_id=user_id, author_id=authors[index])
+
+        bulk_insert(Follow, follows(), self.batch_size)
+        self.stdout.write(f'Подписок: {created}')
+
+    def create_rankings(self, recipe_ids, favorites, carts):
+        # все события считаются случившимися сейчас
+        RecipeRanking.objects.bulk_create(
+            [
+                RecipeRanking(
+                    recipe_id=recipe_id,
+                    popular_score=log_score(
+                        NEW_RECIPE_WEIGHT + FAVORITE_WEIGHT * favorites[recipe_id],
+                        POPULAR_HALF_LIFE
+                    ),
+                    trending_score=log_score(
+                        NEW_RECIPE_WEIGHT + FAVORITE_WEIGHT * favorites[recipe_id]
+                        + SHOPPING_CART_WEIGHT * carts[recipe_id],
+                        TRENDING_HALF_LIFE
+                    ),
+                )
+                for recipe_id in recipe_ids
+            ],
+            batch_size=self.batch_size, ignore_conflicts=True
+        )
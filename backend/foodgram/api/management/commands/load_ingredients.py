@@ -0,0 +1,153 @@
+import csv
+import io
+import json
+from itertools import islice
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+
+from api.catalog import ingredient_catalog
+from api.models import Ingredient
+
+DEFAULT_BATCH_SIZE = 5_000
+JSON_READ_CHUNK = 64 * 1024
+
+
+def iter_csv(file):
+    for line_number, row in enumerate(csv.reader(file), start=1):
+        if not row:
+            continue
+        if len(row) != 2:
+            raise CommandError(f'Строка {line_number}: ожидалось 2 колонки, получено {len(row)}')
+        yield row[0], row[1]
+
+
+def iter_json_array(file):
+    """Объекты JSON-массива по одному, без чтения файла целиком."""
+    decoder = json.JSONDecoder()
+    buffer = ''
+    started = False
+    while True:
+        buffer = buffer.lstrip()
+        if not started:
+            if buffer.startswith('['):
+                buffer = buffer[1:]
+                started = True
+                continue
+            if buffer:
+                raise CommandError('Ожидался JSON-массив')
+        elif buffer.startswith(','):
+            buffer = buffer[1:]
+            continue
+        elif buffer.startswith(']'):
+            return
+        elif buffer:
+            try:
+                item, end = decoder.raw_decode(buffer)
+            except json.JSONDecodeError:
+                pass
+            else:
+                yield item
+                buffer = buffer[end:]
+                continue
+        chunk = file.read(JSON_READ_CHUNK)
+        if not chunk:
+            raise CommandError('Неожиданный конец JSON-файла')
+        buffer += chunk
+
+
+def iter_json(file):
+    for item in iter_json_array(file):
+        # поддерживаются и data/ingredients.json, и фикстуры Django
+        fields = item.get('fields', item)
+        yield fields['name'], fields['measurement_unit']
+
+
+READERS = {
+    '.csv': iter_csv,
+    '.json': iter_json,
+}
+
+
+def batched(iterable, size):
+    iterator = iter(iterable)
+    while batch := list(islice(iterator, size)):
+        yield batch
+
+
+class Command(BaseCommand):
+    help = (
+        'Загружает ингредиенты из CSV (name,measurement_unit) или JSON. '
+        'Повторный запуск не создаёт дублей.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('paths', nargs='+', help='Файлы .csv или .json')
+        parser.add_argument(
+            '--batch-size', type=int, default=DEFAULT_BATCH_SIZE,
+            help=f'Размер пачки для вставки (по умолчанию {DEFAULT_BATCH_SIZE})'
+        )
+        parser.add_argument(
+            '--no-copy', action='store_true',
+            help='Не использовать COPY даже на PostgreSQL'
+        )
+
+    def handle(self, *args, **options):
+        use_copy = connection.vendor == 'postgresql' and not options['no_copy']
+        insert = self.insert_copy if use_copy else self.insert_bulk
+        seen = set()
+        read = created = 0
+
+        for path in map(Path, options['paths']):
+            reader = READERS.get(path.suffix.lower())
+            if reader is None:
+                raise CommandError(f'Неподдерживаемый формат файла: {path}')
+            with path.open(encoding='utf-8', newline='') as file:
+                for batch in batched(reader(file), options['batch_size']):
+                    read += len(batch)
+                    rows = []
+                    for name, measurement_unit in batch:
+                        key = (name.strip(), measurement_unit.strip())
+                        if key[0] and key not in seen:
+                            seen.add(key)
+                            rows.append(key)
+                    created += insert(rows)
+                    self.stdout.write(
+                        f'{path.name}: прочитано {read}, уникальных {len(seen)}, добавлено {created}'
+                    )
+
+        ingredient_catalog.invalidate()
+        self.stdout.write(self.style.SUCCESS(
+            f'Готово: прочитано {read}, добавлено {created} ингредиентов'
+        ))
+
+    def insert_bulk(self, rows):
+        before = Ingredient.objects.count()
+        Ingredient.objects.bulk_create(
+            [Ingredient(name=name, measurement_unit=unit) for name, unit in rows],
+            ignore_conflicts=True
+        )
+        return Ingredient.objects.count() - before
+
+    @transaction.atomic
+    def insert_copy(self, rows):
+        buffer = io.StringIO()
+        csv.writer(buffer).writerows(rows)
+        buffer.seek(0)
+        table = Ingredient._meta.db_table
+        with connection.cursor() as cursor:
+            cursor.execute(
+                'CREATE TEMP TABLE ingredient_import '
+                '(name varchar(128), measurement_unit varchar(64)) ON COMMIT DROP'
+            )
+            cursor.copy_expert(
+                'COPY ingredient_import (name, measurement_unit) FROM STDIN WITH CSV',
+                buffer
+            )
+            cursor.execute(
+                f'INSERT INTO {table} (name, measurement_unit) '
+                'SELECT name, measurement_unit FROM ingredient_import '
+                'ON CONFLICT (name, measurement_unit) DO NOTHING'
+            )
+            return cursor.rowcount
@@ -0,0 +1,52 @@
+# Generated by Django 5.2.1 on 2026-10-17 03:58
+
+from django.db import migrations, models
+
+
+# Индексы для поиска по UPPER(name): btree для istartswith и триграммный GIN
+# для icontains. Выражение совпадает с тем, что генерирует Django для
+# регистронезависимых lookup'ов в PostgreSQL.
+POSTGRES_SEARCH_INDEXES = [
+    'CREATE EXTENSION IF NOT EXISTS pg_trgm',
+    'CREATE INDEX IF NOT EXISTS ingredient_name_upper_prefix_idx '
+    'ON api_ingredient (UPPER("name"::text) text_pattern_ops)',
+    'CREATE INDEX IF NOT EXISTS ingredient_name_upper_trgm_idx '
+    'ON api_ingredient USING gin (UPPER("name"::text) gin_trgm_ops)',
+]
+
+DROP_POSTGRES_SEARCH_INDEXES = [
+    'DROP INDEX IF EXISTS ingredient_name_upper_trgm_idx',
+    'DROP INDEX IF EXISTS ingredient_name_upper_prefix_idx',
+]
+
+
+def create_postgres_search_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    for statement in POSTGRES_SEARCH_INDEXES:
+        schema_editor.execute(statement)
+
+
+def drop_postgres_search_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    for statement in DROP_POSTGRES_SEARCH_INDEXES:
+        schema_editor.execute(statement)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0002_alter_user_username'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='ingredient',
+            index=models.Index(fields=['name'], name='ingredient_name_idx'),
+        ),
+        migrations.RunPython(
+            create_postgres_search_indexes,
+            drop_postgres_search_indexes,
+        ),
+    ]
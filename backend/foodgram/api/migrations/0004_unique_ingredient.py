@@ -0,0 +1,59 @@
+# Generated by Django 5.2.1 on 2026-10-17 04:04
+
+from django.db import migrations, models
+from django.db.models import Count, Min
+
+# максимум валидатора IngredientInRecipe.amount
+MAX_AMOUNT = 32000
+
+
+def merge_duplicate_ingredients(apps, schema_editor):
+    """Оставляет по одному ингредиенту на пару (name, measurement_unit),
+    перенося на него строки рецептов с удаляемых дублей. Если в рецепте
+    уже есть оставляемый ингредиент, количества складываются."""
+    Ingredient = apps.get_model('api', 'Ingredient')
+    IngredientInRecipe = apps.get_model('api', 'IngredientInRecipe')
+    duplicates = (
+        Ingredient.objects
+        .values('name', 'measurement_unit')
+        .annotate(keep_id=Min('id'), total=Count('id'))
+        .filter(total__gt=1)
+    )
+    for group in duplicates:
+        keep_id = group['keep_id']
+        duplicate_ids = list(
+            Ingredient.objects
+            .filter(name=group['name'], measurement_unit=group['measurement_unit'])
+            .exclude(id=keep_id)
+            .values_list('id', flat=True)
+        )
+        for row in IngredientInRecipe.objects.filter(ingredient_id__in=duplicate_ids).order_by('id'):
+            kept = IngredientInRecipe.objects.filter(
+                recipe_id=row.recipe_id, ingredient_id=keep_id
+            ).order_by('id').first()
+            if kept is None:
+                row.ingredient_id = keep_id
+                row.save(update_fields=['ingredient'])
+            else:
+                kept.amount = min(kept.amount + row.amount, MAX_AMOUNT)
+                kept.save(update_fields=['amount'])
+                row.delete()
+        Ingredient.objects.filter(id__in=duplicate_ids).delete()
+
+
+class Migration(migrations.Migration):
+    # данные и ограничение в разных транзакциях: PostgreSQL не даёт менять
+    # таблицу, пока не отработали отложенные проверки после изменения строк
+    atomic = False
+
+    dependencies = [
+        ('api', '0003_ingredient_name_search_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(merge_duplicate_ingredients, migrations.RunPython.noop, atomic=True),
+        migrations.AddConstraint(
+            model_name='ingredient',
+            constraint=models.UniqueConstraint(fields=('name', 'measurement_unit'), name='unique_ingredient'),
+        ),
+    ]
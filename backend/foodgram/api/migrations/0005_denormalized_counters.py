@@ -0,0 +1,57 @@
+# Generated by Django 5.2.1 on 2026-10-17 04:06
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+
+
+def fill_counters(apps, schema_editor):
+    Recipe = apps.get_model('api', 'Recipe')
+    User = apps.get_model('api', 'User')
+
+    def count(model_name, fk):
+        model = apps.get_model('api', model_name)
+        return Coalesce(Subquery(
+            model.objects.filter(**{fk: OuterRef('pk')}).order_by()
+            .values(fk).annotate(total=Count('pk')).values('total')
+        ), Value(0))
+
+    Recipe.objects.update(
+        favorites_count=count('Favorite', 'recipe'),
+        in_carts_count=count('ShoppingCart', 'recipe'),
+    )
+    User.objects.update(
+        recipes_count=count('Recipe', 'author'),
+        subscribers_count=count('Follow', 'author'),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0004_unique_ingredient'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='favorites_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='В избранном'),
+        ),
+        migrations.AddField(
+            model_name='recipe',
+            name='in_carts_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='В корзинах'),
+        ),
+        migrations.AddField(
+            model_name='user',
+            name='recipes_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Количество рецептов'),
+        ),
+        migrations.AddField(
+            model_name='user',
+            name='subscribers_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Количество подписчиков'),
+        ),
+        migrations.RunPython(fill_counters, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,54 @@
+# Generated by Django 5.2.1 on 2026-10-17 04:07
+
+import math
+import time
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+# значения из api/ranking.py на момент миграции
+RANKING_EPOCH = 1735689600.0
+POPULAR_HALF_LIFE = 7 * 24 * 60 * 60
+TRENDING_HALF_LIFE = 24 * 60 * 60
+
+
+def fill_rankings(apps, schema_editor):
+    """Заводит рейтинги для существующих рецептов: событиями считаются
+    публикация и текущие счётчики избранного и корзин."""
+    Recipe = apps.get_model('api', 'Recipe')
+    RecipeRanking = apps.get_model('api', 'RecipeRanking')
+    now = time.time() - RANKING_EPOCH
+    rankings = []
+    for recipe_id, favorites, in_carts in Recipe.objects.values_list(
+        'id', 'favorites_count', 'in_carts_count'
+    ).iterator():
+        rankings.append(RecipeRanking(
+            recipe_id=recipe_id,
+            popular_score=math.log(1 + favorites) + now * math.log(2) / POPULAR_HALF_LIFE,
+            trending_score=math.log(1 + favorites + 0.5 * in_carts) + now * math.log(2) / TRENDING_HALF_LIFE,
+        ))
+    RecipeRanking.objects.bulk_create(rankings, batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0005_denormalized_counters'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RecipeRanking',
+            fields=[
+                ('recipe', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='ranking', serialize=False, to='api.recipe', verbose_name='Рецепт')),
+                ('popular_score', models.FloatField(verbose_name='Популярность за неделю')),
+                ('trending_score', models.FloatField(verbose_name='Тренд')),
+            ],
+            options={
+                'verbose_name': 'Рейтинг рецепта',
+                'verbose_name_plural': 'Рейтинги рецептов',
+                'indexes': [models.Index(fields=['-popular_score'], name='ranking_popular_idx'), models.Index(fields=['-trending_score'], name='ranking_trending_idx')],
+            },
+        ),
+        migrations.RunPython(fill_rankings, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,24 @@
+# Generated by Django 5.2.1 on 2026-10-17 04:08
+
+from django.db import migrations
+
+from api.search import create_search_index, drop_search_index
+
+
+def create_index(apps, schema_editor):
+    create_search_index(schema_editor)
+
+
+def drop_index(apps, schema_editor):
+    drop_search_index(schema_editor)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0006_recipe_ranking'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_index, drop_index),
+    ]
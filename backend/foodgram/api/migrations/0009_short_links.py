@@ -0,0 +1,27 @@
+# Generated by Django 5.2.1 on 2026-10-17 04:15
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0008_updated_at'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ShortLink',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('code', models.CharField(max_length=16, unique=True, verbose_name='Код')),
+                ('clicks', models.PositiveBigIntegerField(default=0, editable=False, verbose_name='Переходы')),
+                ('recipe', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='short_link', to='api.recipe', verbose_name='Рецепт')),
+            ],
+            options={
+                'verbose_name': 'Короткая ссылка',
+                'verbose_name_plural': 'Короткие ссылки',
+            },
+        ),
+    ]
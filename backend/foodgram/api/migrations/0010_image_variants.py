@@ -0,0 +1,23 @@
+# Generated by Django 5.2.1 on 2026-10-17 04:17
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0009_short_links'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='image_variants',
+            field=models.JSONField(default=dict, editable=False, verbose_name='Варианты фото'),
+        ),
+        migrations.AddField(
+            model_name='user',
+            name='avatar_variants',
+            field=models.JSONField(default=dict, editable=False, verbose_name='Варианты аватара'),
+        ),
+    ]
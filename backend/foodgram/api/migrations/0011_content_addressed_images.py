@@ -0,0 +1,54 @@
+# Generated by Django 5.2.1 on 2026-10-17 04:19
+
+from collections import Counter
+
+import api.storage
+from django.db import migrations, models
+
+
+def count_references(apps, schema_editor):
+    # уже загруженные файлы остаются под старыми именами, но тоже
+    # учитываются, чтобы их можно было удалить по счётчику
+    Recipe = apps.get_model('api', 'Recipe')
+    User = apps.get_model('api', 'User')
+    ImageBlob = apps.get_model('api', 'ImageBlob')
+    references = Counter(Recipe.objects.exclude(image='').values_list('image', flat=True))
+    references.update(
+        User.objects.exclude(avatar='').exclude(avatar=None).values_list('avatar', flat=True)
+    )
+    ImageBlob.objects.bulk_create(
+        [ImageBlob(name=name, references=count) for name, count in references.items()],
+        batch_size=1000
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0010_image_variants'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ImageBlob',
+            fields=[
+                ('name', models.CharField(max_length=255, primary_key=True, serialize=False, verbose_name='Файл')),
+                ('references', models.PositiveIntegerField(default=0, verbose_name='Ссылки')),
+            ],
+            options={
+                'verbose_name': 'Файл изображения',
+                'verbose_name_plural': 'Файлы изображений',
+            },
+        ),
+        migrations.AlterField(
+            model_name='recipe',
+            name='image',
+            field=models.ImageField(storage=api.storage.ContentAddressedStorage(), upload_to='recipes/images/', verbose_name='Фото блюда'),
+        ),
+        migrations.AlterField(
+            model_name='user',
+            name='avatar',
+            field=models.ImageField(blank=True, null=True, storage=api.storage.ContentAddressedStorage(), upload_to='users/'),
+        ),
+        migrations.RunPython(count_references, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,147 @@
+# Generated by Django 5.2.1 on 2026-10-17 04:39
+
+import django.contrib.auth.validators
+import django.core.validators
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    """Meta-опции и verbose_name полей, изменённые в models.py без
+    миграции. Схему БД почти не меняет."""
+
+    dependencies = [
+        ('api', '0011_content_addressed_images'),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name='favorite',
+            options={'ordering': ['-id'], 'verbose_name': 'Избранное', 'verbose_name_plural': 'Избранные'},
+        ),
+        migrations.AlterModelOptions(
+            name='follow',
+            options={'ordering': ['-id'], 'verbose_name': 'Подписка', 'verbose_name_plural': 'Подписки'},
+        ),
+        migrations.AlterModelOptions(
+            name='ingredient',
+            options={'ordering': ['name'], 'verbose_name': 'Ингредиент', 'verbose_name_plural': 'Ингредиенты'},
+        ),
+        migrations.AlterModelOptions(
+            name='ingredientinrecipe',
+            options={'ordering': ['ingredient__name'], 'verbose_name': 'Ингредиент в рецепте', 'verbose_name_plural': 'Ингредиенты в рецептах'},
+        ),
+        migrations.AlterModelOptions(
+            name='recipe',
+            options={'ordering': ['-id'], 'verbose_name': 'Рецепт', 'verbose_name_plural': 'Рецепты'},
+        ),
+        migrations.AlterModelOptions(
+            name='shoppingcart',
+            options={'ordering': ['-id'], 'verbose_name': 'Корзина покупок', 'verbose_name_plural': 'Корзины покупок'},
+        ),
+        migrations.AlterModelOptions(
+            name='user',
+            options={'ordering': ['username'], 'verbose_name': 'Пользователь', 'verbose_name_plural': 'Пользователи'},
+        ),
+        migrations.AlterField(
+            model_name='favorite',
+            name='recipe',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='favorited_by', to='api.recipe', verbose_name='Рецепт'),
+        ),
+        migrations.AlterField(
+            model_name='favorite',
+            name='user',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='favorites', to=settings.AUTH_USER_MODEL, verbose_name='Пользователь'),
+        ),
+        migrations.AlterField(
+            model_name='follow',
+            name='author',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='subscribers', to=settings.AUTH_USER_MODEL, verbose_name='Автор'),
+        ),
+        migrations.AlterField(
+            model_name='follow',
+            name='user',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='subscriptions', to=settings.AUTH_USER_MODEL, verbose_name='Подписчик'),
+        ),
+        migrations.AlterField(
+            model_name='ingredient',
+            name='measurement_unit',
+            field=models.CharField(max_length=64, verbose_name='Единица измерения'),
+        ),
+        migrations.AlterField(
+            model_name='ingredient',
+            name='name',
+            field=models.CharField(max_length=128, verbose_name='Название ингредиента'),
+        ),
+        migrations.AlterField(
+            model_name='ingredientinrecipe',
+            name='amount',
+            field=models.PositiveSmallIntegerField(validators=[django.core.validators.MinValueValidator(1, message='Количество ингредиента не может быть меньше 1'), django.core.validators.MaxValueValidator(32000, message='Количество ингредиента не может превышать 32000')], verbose_name='Количество'),
+        ),
+        migrations.AlterField(
+            model_name='ingredientinrecipe',
+            name='ingredient',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='api.ingredient', verbose_name='Ингредиент'),
+        ),
+        migrations.AlterField(
+            model_name='ingredientinrecipe',
+            name='recipe',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='ingredient_amounts', to='api.recipe', verbose_name='Рецепт'),
+        ),
+        migrations.AlterField(
+            model_name='recipe',
+            name='author',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='recipes', to=settings.AUTH_USER_MODEL, verbose_name='Автор рецепта'),
+        ),
+        migrations.AlterField(
+            model_name='recipe',
+            name='cooking_time',
+            field=models.PositiveSmallIntegerField(validators=[django.core.validators.MinValueValidator(1), django.core.validators.MaxValueValidator(32000)], verbose_name='Время приготовления'),
+        ),
+        migrations.AlterField(
+            model_name='recipe',
+            name='ingredients',
+            field=models.ManyToManyField(through='api.IngredientInRecipe', to='api.ingredient', verbose_name='Ингредиенты'),
+        ),
+        migrations.AlterField(
+            model_name='recipe',
+            name='name',
+            field=models.CharField(max_length=256, verbose_name='Название рецепта'),
+        ),
+        migrations.AlterField(
+            model_name='recipe',
+            name='text',
+            field=models.TextField(verbose_name='Описание рецепта'),
+        ),
+        migrations.AlterField(
+            model_name='shoppingcart',
+            name='recipe',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='in_shopping_carts', to='api.recipe', verbose_name='Рецепт'),
+        ),
+        migrations.AlterField(
+            model_name='shoppingcart',
+            name='user',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='shopping_carts', to=settings.AUTH_USER_MODEL, verbose_name='Пользователь'),
+        ),
+        migrations.AlterField(
+            model_name='user',
+            name='email',
+            field=models.EmailField(max_length=254, unique=True, verbose_name='Электронная почта'),
+        ),
+        migrations.AlterField(
+            model_name='user',
+            name='first_name',
+            field=models.CharField(max_length=150, verbose_name='Имя'),
+        ),
+        migrations.AlterField(
+            model_name='user',
+            name='last_name',
+            field=models.CharField(max_length=150, verbose_name='Фамилия'),
+        ),
+        migrations.AlterField(
+            model_name='user',
+            name='username',
+            field=models.CharField(max_length=150, unique=True, validators=[django.contrib.auth.validators.UnicodeUsernameValidator()], verbose_name='Логин'),
+        ),
+    ]
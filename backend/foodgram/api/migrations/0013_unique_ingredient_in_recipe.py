@@ -0,0 +1,42 @@
+from django.db import migrations, models
+from django.db.models import Count, Min, Sum
+
+# максимум валидатора IngredientInRecipe.amount
+MAX_AMOUNT = 32000
+
+
+def merge_duplicate_ingredients(apps, schema_editor):
+    """Повторы ингредиента в рецепте сливаются в одну строку с суммой
+    количеств, иначе ограничение уникальности не создастся."""
+    IngredientInRecipe = apps.get_model('api', 'IngredientInRecipe')
+    duplicates = (
+        IngredientInRecipe.objects
+        .values('recipe_id', 'ingredient_id')
+        .annotate(rows=Count('id'), keep_id=Min('id'), total=Sum('amount'))
+        .filter(rows__gt=1)
+    )
+    for duplicate in duplicates.iterator():
+        IngredientInRecipe.objects.filter(pk=duplicate['keep_id']).update(
+            amount=min(duplicate['total'], MAX_AMOUNT)
+        )
+        IngredientInRecipe.objects.filter(
+            recipe_id=duplicate['recipe_id'], ingredient_id=duplicate['ingredient_id']
+        ).exclude(pk=duplicate['keep_id']).delete()
+
+
+class Migration(migrations.Migration):
+    # данные и ограничение в разных транзакциях: PostgreSQL не даёт менять
+    # таблицу, пока не отработали отложенные проверки после изменения строк
+    atomic = False
+
+    dependencies = [
+        ('api', '0012_sync_model_state'),
+    ]
+
+    operations = [
+        migrations.RunPython(merge_duplicate_ingredients, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='ingredientinrecipe',
+            constraint=models.UniqueConstraint(fields=('recipe', 'ingredient'), name='unique_ingredient_in_recipe'),
+        ),
+    ]
@@ -0,0 +1,40 @@
+# Generated by Django 5.2.1 on 2026-10-17 11:40
+
+import math
+import time
+
+from django.db import migrations
+
+# значения из api/ranking.py на момент миграции
+RANKING_EPOCH = 1735689600.0
+POPULAR_HALF_LIFE = 7 * 24 * 60 * 60
+TRENDING_HALF_LIFE = 24 * 60 * 60
+
+
+def fill_missing_rankings(apps, schema_editor):
+    """Рейтинги для рецептов, созданных не через API (админка, массовая
+    загрузка) до того, как их стал заводить сигнал post_save."""
+    Recipe = apps.get_model('api', 'Recipe')
+    RecipeRanking = apps.get_model('api', 'RecipeRanking')
+    now = time.time() - RANKING_EPOCH
+    rankings = []
+    for recipe_id, favorites, in_carts in Recipe.objects.filter(ranking__isnull=True).values_list(
+        'id', 'favorites_count', 'in_carts_count'
+    ).iterator():
+        rankings.append(RecipeRanking(
+            recipe_id=recipe_id,
+            popular_score=math.log(1 + favorites) + now * math.log(2) / POPULAR_HALF_LIFE,
+            trending_score=math.log(1 + favorites + 0.5 * in_carts) + now * math.log(2) / TRENDING_HALF_LIFE,
+        ))
+    RecipeRanking.objects.bulk_create(rankings, batch_size=1000, ignore_conflicts=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0013_unique_ingredient_in_recipe'),
+    ]
+
+    operations = [
+        migrations.RunPython(fill_missing_rankings, migrations.RunPython.noop),
+    ]
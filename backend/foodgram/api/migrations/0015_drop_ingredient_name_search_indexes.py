@@ -0,0 +1,54 @@
+# Generated by Django 5.2.1 on 2026-10-17 18:20
+
+from django.db import migrations, models
+
+
+# Поиск ингредиентов API идёт по справочнику в памяти процесса, индексы
+# из 0003 больше не используются ни одним запросом. Порядок по name и
+# поиск строки по имени обслуживает индекс ограничения unique_ingredient.
+DROP_POSTGRES_SEARCH_INDEXES = [
+    'DROP INDEX IF EXISTS ingredient_name_upper_trgm_idx',
+    'DROP INDEX IF EXISTS ingredient_name_upper_prefix_idx',
+]
+
+# расширение pg_trgm не удаляется: его могут использовать другие базы
+# данных кластера и ручные запросы
+POSTGRES_SEARCH_INDEXES = [
+    'CREATE EXTENSION IF NOT EXISTS pg_trgm',
+    'CREATE INDEX IF NOT EXISTS ingredient_name_upper_prefix_idx '
+    'ON api_ingredient (UPPER("name"::text) text_pattern_ops)',
+    'CREATE INDEX IF NOT EXISTS ingredient_name_upper_trgm_idx '
+    'ON api_ingredient USING gin (UPPER("name"::text) gin_trgm_ops)',
+]
+
+
+def drop_postgres_search_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    for statement in DROP_POSTGRES_SEARCH_INDEXES:
+        schema_editor.execute(statement)
+
+
+def create_postgres_search_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    for statement in POSTGRES_SEARCH_INDEXES:
+        schema_editor.execute(statement)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0014_fill_missing_rankings'),
+    ]
+
+    operations = [
+        migrations.RunPython(
+            drop_postgres_search_indexes,
+            create_postgres_search_indexes,
+        ),
+        migrations.RemoveIndex(
+            model_name='ingredient',
+            name='ingredient_name_idx',
+        ),
+    ]
@@ -3,6 +3,8 @@ from django.contrib.auth.validators import UnicodeUsernameValidator
 from django.core.validators import MinValueValidator, MaxValueValidator
 from django.db import models
 
+from .storage import content_storage
+
 
 USERNAME_MAX_LENGTH = 150
 
@@ -24,7 +26,11 @@ class User(AbstractUser):
     email = models.EmailField(max_length=254, unique=True, verbose_name='Электронная почта')
     first_name = models.CharField(max_length=USERNAME_MAX_LENGTH, verbose_name='Имя')
     last_name = models.CharField(max_length=USERNAME_MAX_LENGTH, verbose_name='Фамилия')
-    avatar = models.ImageField(upload_to='users/', null=True, blank=True) 
+    avatar = models.ImageField(upload_to='users/', storage=content_storage, null=True, blank=True) 
+    avatar_variants = models.JSONField(default=dict, editable=False, verbose_name='Варианты аватара')
+    recipes_count = models.PositiveIntegerField(default=0, editable=False, verbose_name='Количество рецептов')
+    subscribers_count = models.PositiveIntegerField(default=0, editable=False, verbose_name='Количество подписчиков')
+    updated_at = models.DateTimeField(auto_now=True, verbose_name='Изменён')
 
     groups = models.ManyToManyField(
         'auth.Group',
@@ -58,6 +64,12 @@ class Ingredient(models.Model):
         ordering = ['name']
         verbose_name = 'Ингредиент'
         verbose_name_plural = 'Ингредиенты'
+        constraints = [
+            models.UniqueConstraint(
+                fields=['name', 'measurement_unit'],
+                name='unique_ingredient'
+            )
+        ]
 
     def __str__(self):
         return self.name
@@ -66,7 +78,8 @@ class Ingredient(models.Model):
 class Recipe(models.Model):
     author = models.ForeignKey(User, on_delete=models.CASCADE, related_name='recipes', verbose_name='Автор рецепта')
     name = models.CharField(max_length=256, verbose_name='Название рецепта')
-    image = models.ImageField(upload_to='recipes/images/', verbose_name='Фото блюда')
+    image = models.ImageField(upload_to='recipes/images/', storage=content_storage, verbose_name='Фото блюда')
+    image_variants = models.JSONField(default=dict, editable=False, verbose_name='Варианты фото')
     text = models.TextField(verbose_name='Описание рецепта')
     ingredients = models.ManyToManyField(Ingredient, through='IngredientInRecipe', verbose_name='Ингредиенты')
     cooking_time = models.PositiveSmallIntegerField(
@@ -76,6 +89,9 @@ class Recipe(models.Model):
         ],
         verbose_name='Время приготовления'
     )
+    favorites_count = models.PositiveIntegerField(default=0, editable=False, verbose_name='В избранном')
+    in_carts_count = models.PositiveIntegerField(default=0, editable=False, verbose_name='В корзинах')
+    updated_at = models.DateTimeField(auto_now=True, verbose_name='Изменён')
 
     class Meta:
         ordering = ['-id']
@@ -86,6 +102,62 @@ class Recipe(models.Model):
         return self.name
 
 
+class RecipeRanking(models.Model):
+    """Рейтинги рецепта с затуханием по времени.
+
+    Хранится логарифм суммы весов событий, умноженных на
+    2 ** ((t - эпоха) / период полураспада): порядок по такому значению
+    совпадает с порядком по затухающему рейтингу в любой момент времени,
+    поэтому пересчитывать старые строки не нужно.
+    """
+    recipe = models.OneToOneField(
+        Recipe, on_delete=models.CASCADE, primary_key=True,
+        related_name='ranking', verbose_name='Рецепт'
+    )
+    popular_score = models.FloatField(verbose_name='Популярность за неделю')
+    trending_score = models.FloatField(verbose_name='Тренд')
+
+    class Meta:
+        verbose_name = 'Рейтинг рецепта'
+        verbose_name_plural = 'Рейтинги рецептов'
+        indexes = [
+            models.Index(fields=['-popular_score'], name='ranking_popular_idx'),
+            models.Index(fields=['-trending_score'], name='ranking_trending_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.recipe}: {self.popular_score:.2f} / {self.trending_score:.2f}'
+
+
+class ImageBlob(models.Model):
+    """Число ссылок на файл в хранилище по содержимому: один файл может
+    быть фото нескольких рецептов и аватаром."""
+    name = models.CharField(max_length=255, primary_key=True, verbose_name='Файл')
+    references = models.PositiveIntegerField(default=0, verbose_name='Ссылки')
+
+    class Meta:
+        verbose_name = 'Файл изображения'
+        verbose_name_plural = 'Файлы изображений'
+
+    def __str__(self):
+        return f'{self.name} ({self.references})'
+
+
+class ShortLink(models.Model):
+    recipe = models.OneToOneField(
+        Recipe, on_delete=models.CASCADE, related_name='short_link', verbose_name='Рецепт'
+    )
+    code = models.CharField(max_length=16, unique=True, verbose_name='Код')
+    clicks = models.PositiveBigIntegerField(default=0, editable=False, verbose_name='Переходы')
+
+    class Meta:
+        verbose_name = 'Короткая ссылка'
+        verbose_name_plural = 'Короткие ссылки'
+
+    def __str__(self):
+        return f'{self.code} -> {self.recipe}'
+
+
 class IngredientInRecipe(models.Model):
     recipe = models.ForeignKey(Recipe, on_delete=models.CASCADE, verbose_name='Рецепт', related_name='ingredient_amounts')
     ingredient = models.ForeignKey(Ingredient, on_delete=models.CASCADE, verbose_name='Ингредиент')
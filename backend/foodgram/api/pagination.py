@@ -0,0 +1,89 @@
+from collections import OrderedDict
+
+from rest_framework.pagination import CursorPagination, LimitOffsetPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+FEED_MAX_PAGE_SIZE = 100
+
+
+class KeysetPagination(CursorPagination):
+    page_size_query_param = 'limit'
+    max_page_size = FEED_MAX_PAGE_SIZE
+
+
+class FeedPagination(LimitOffsetPagination):
+    """LimitOffset-пагинация с двумя режимами для бесконечной ленты.
+
+    ?pagination=cursor (или переданный cursor) включает keyset-пагинацию
+    по cursor_ordering: страница стоит одинаково на любой глубине и не
+    сдвигается при добавлении новых записей, COUNT(*) не выполняется.
+    ?count=false оставляет limit/offset, но тоже не считает общее число
+    записей: наличие следующей страницы определяется по лишней строке.
+    View может переопределить порядок курсора атрибутом cursor_ordering;
+    к нему добавляется -id, чтобы записи с равным значением (одинаковый
+    рейтинг или ранг поиска) шли в одном и том же порядке и не
+    повторялись и не терялись на соседних страницах.
+    """
+    cursor_ordering = '-id'
+
+    def __init__(self):
+        self.keyset = None
+
+    def paginate_queryset(self, queryset, request, view=None):
+        params = request.query_params
+        if params.get('pagination') == 'cursor' or 'cursor' in params:
+            self.keyset = KeysetPagination()
+            self.keyset.ordering = self.get_cursor_ordering(view)
+            return self.keyset.paginate_queryset(queryset, request, view)
+        if params.get('count') == 'false':
+            return self.paginate_without_count(queryset, request)
+        return super().paginate_queryset(queryset, request, view)
+
+    def get_cursor_ordering(self, view):
+        ordering = getattr(view, 'cursor_ordering', self.cursor_ordering)
+        if ordering == '-id':
+            return (ordering,)
+        return (ordering, '-id')
+
+    def paginate_without_count(self, queryset, request):
+        self.request = request
+        self.limit = self.get_limit(request)
+        self.offset = self.get_offset(request)
+        self.count = None
+        if self.limit is None:
+            return None
+        page = list(queryset[self.offset:self.offset + self.limit + 1])
+        self.has_next = len(page) > self.limit
+        return page[:self.limit]
+
+    def get_paginated_response(self, data):
+        if self.keyset is not None:
+            return self.keyset.get_paginated_response(data)
+        if self.count is not None:
+            return super().get_paginated_response(data)
+        return Response(OrderedDict([
+            ('next', self.get_next_link()),
+            ('previous', self.get_previous_link()),
+            ('results', data),
+        ]))
+
+    def get_next_link(self):
+        if self.keyset is not None:
+            return self.keyset.get_next_link()
+        if self.count is not None:
+            return super().get_next_link()
+        if not self.has_next:
+            return None
+        url = self.request.build_absolute_uri()
+        url = replace_query_param(url, self.limit_query_param, self.limit)
+        return replace_query_param(url, self.offset_query_param, self.offset + self.limit)
+
+    def get_previous_link(self):
+        if self.keyset is not None:
+            return self.keyset.get_previous_link()
+        return super().get_previous_link()
+
+
+class SubscriptionsPagination(FeedPagination):
+    cursor_ordering = '-follow_id'
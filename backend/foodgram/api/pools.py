@@ -0,0 +1,20 @@
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+import django
+
+
+def create_process_pool(max_workers):
+    """Пул процессов для CPU-тяжёлой работы из воркера gunicorn.
+
+    Воркер уже держит потоки (пулы, буферы счётчиков), и fork из него может
+    унести в дочерний процесс захваченную блокировку. Поэтому процессы
+    порождаются через forkserver: чистый сервер запускается один раз,
+    а каждый дочерний процесс сам настраивает Django. Задачи должны быть
+    функциями верхнего уровня с сериализуемыми аргументами.
+    """
+    return ProcessPoolExecutor(
+        max_workers=max_workers,
+        mp_context=multiprocessing.get_context('forkserver'),
+        initializer=django.setup,
+    )
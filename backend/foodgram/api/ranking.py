@@ -0,0 +1,99 @@
+import math
+from datetime import datetime, timezone
+
+from django.db.models import F, FloatField, Value
+from django.db.models.functions import Abs, Exp, Greatest, Ln
+from django.utils import timezone as django_timezone
+
+from .models import RecipeRanking
+
+RANKING_EPOCH = datetime(2025, 1, 1, tzinfo=timezone.utc).timestamp()
+POPULAR_HALF_LIFE = 7 * 24 * 60 * 60
+TRENDING_HALF_LIFE = 24 * 60 * 60
+
+NEW_RECIPE_WEIGHT = 1.0
+FAVORITE_WEIGHT = 1.0
+SHOPPING_CART_WEIGHT = 0.5
+
+# событие -> (вес для popular_score, вес для trending_score)
+EVENT_WEIGHTS = {
+    'new': (NEW_RECIPE_WEIGHT, NEW_RECIPE_WEIGHT),
+    'favorite': (FAVORITE_WEIGHT, FAVORITE_WEIGHT),
+    'shopping_cart': (0.0, SHOPPING_CART_WEIGHT),
+}
+
+# нижняя граница доли рейтинга, остающейся после отмены события:
+# логарифм не уходит в -inf, если отменяется почти весь рейтинг
+MIN_REMAINING_SHARE = 1e-9
+
+RANKING_ORDERINGS = {
+    'popular': 'popular_score',
+    'trending': 'trending_score',
+}
+
+
+def log_score(weight, half_life, now=None):
+    """Логарифм веса события, приведённого к эпохе рейтинга."""
+    if now is None:
+        now = django_timezone.now().timestamp()
+    return math.log(weight) + (now - RANKING_EPOCH) * math.log(2) / half_life
+
+
+def log_add(field, value):
+    """ln(exp(field) + exp(value)) без переполнения, вычисляется в БД."""
+    value = Value(value, output_field=FloatField())
+    return Greatest(F(field), value) + Ln(1 + Exp(-Abs(F(field) - value)))
+
+
+def log_subtract(field, value):
+    """ln(exp(field) - exp(value)), вычисляется в БД. Если вычитается
+    больше, чем есть, остаётся MIN_REMAINING_SHARE от рейтинга."""
+    value = Value(value, output_field=FloatField())
+    return F(field) + Ln(Greatest(
+        1 - Exp(value - F(field)), Value(MIN_REMAINING_SHARE, output_field=FloatField())
+    ))
+
+
+def event_scores(event, now=None):
+    popular_weight, trending_weight = EVENT_WEIGHTS[event]
+    return {
+        'popular_score': log_score(popular_weight, POPULAR_HALF_LIFE, now) if popular_weight else None,
+        'trending_score': log_score(trending_weight, TRENDING_HALF_LIFE, now),
+    }
+
+
+def create_ranking(recipe):
+    RecipeRanking.objects.create(recipe=recipe, **event_scores('new'))
+
+
+def record_engagement(recipe_ids, event):
+    """Добавляет событие к рейтингам рецептов одним UPDATE."""
+    scores = event_scores(event)
+    RecipeRanking.objects.filter(recipe_id__in=recipe_ids).update(**{
+        field: log_add(field, value)
+        for field, value in scores.items() if value is not None
+    })
+
+
+def revoke_engagement(recipe_ids, event):
+    """Отмена события (рецепт убран из избранного или корзины) — такое же
+    событие с обратным знаком. Вес считается на текущий момент и не меньше
+    веса исходного события, поэтому добавление и удаление по кругу
+    рейтинг не накручивают."""
+    scores = event_scores(event)
+    RecipeRanking.objects.filter(recipe_id__in=recipe_ids).update(**{
+        field: log_subtract(field, value)
+        for field, value in scores.items() if value is not None
+    })
+
+
+def order_by_ranking(queryset, ordering):
+    """Рецепты по убыванию рейтинга. Значение доступно как rank_score,
+    чтобы по нему могла строиться и keyset-пагинация."""
+    field = RANKING_ORDERINGS[ordering]
+    return (
+        queryset
+        .filter(ranking__isnull=False)
+        .annotate(rank_score=F(f'ranking__{field}'))
+        .order_by('-rank_score', '-id')
+    )
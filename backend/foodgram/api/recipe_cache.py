@@ -0,0 +1,114 @@
+from collections import OrderedDict
+from threading import Lock
+from time import monotonic, time_ns
+
+from django.core.cache import cache
+
+from .catalog import CATALOG_VERSION_KEY, get_catalog_version
+
+RECIPE_CACHE_TIMEOUT = 5 * 60
+# версия рецепта живёт ограниченное время: вытесненная или истёкшая версия
+# создаётся заново и только сбрасывает кэш, устаревших данных не бывает
+RECIPE_VERSION_TIMEOUT = 24 * 60 * 60
+# версия удалённого рецепта: по ней отвечаем 404, не заглядывая в БД
+RECIPE_DELETED = 'deleted'
+RECIPE_CACHE_LOCAL_SIZE = 1024
+
+
+class LocalLRUCache:
+    """Ограниченный по числу записей LRU-кэш процесса со временем жизни."""
+
+    def __init__(self, max_size, timeout):
+        self.max_size = max_size
+        self.timeout = timeout
+        self._lock = Lock()
+        self._data = OrderedDict()
+
+    def get(self, key):
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return None
+            expires_at, value = item
+            if expires_at < monotonic():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._data[key] = (monotonic() + self.timeout, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_size:
+                self._data.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+
+local_recipe_cache = LocalLRUCache(RECIPE_CACHE_LOCAL_SIZE, RECIPE_CACHE_TIMEOUT)
+
+
+def recipe_version_key(recipe_id):
+    return f'recipe-version:{recipe_id}'
+
+
+def bump_recipe_versions(recipe_ids):
+    """Сбрасывает закэшированное представление рецептов во всех воркерах."""
+    version = time_ns()
+    cache.set_many(
+        {recipe_version_key(recipe_id): version for recipe_id in recipe_ids},
+        RECIPE_VERSION_TIMEOUT
+    )
+
+
+def mark_recipe_deleted(recipe_id):
+    cache.set(recipe_version_key(recipe_id), RECIPE_DELETED, RECIPE_VERSION_TIMEOUT)
+
+
+def get_recipe_versions(recipe_id, exists):
+    """Версия рецепта и версия справочника ингредиентов одним запросом
+    к общему кэшу или None, если рецепта нет. exists() проверяет рецепт
+    в БД и вызывается, только если версии ещё нет: ключи заводятся лишь
+    для существующих рецептов, а не для любого запрошенного id."""
+    version_key = recipe_version_key(recipe_id)
+    versions = cache.get_many([version_key, CATALOG_VERSION_KEY])
+    recipe_version = versions.get(version_key)
+    if recipe_version == RECIPE_DELETED:
+        return None
+    if recipe_version is None:
+        if not exists():
+            return None
+        recipe_version = cache.get_or_set(version_key, time_ns, RECIPE_VERSION_TIMEOUT)
+    catalog_version = versions.get(CATALOG_VERSION_KEY) or get_catalog_version()
+    return recipe_version, catalog_version
+
+
+def get_cached_recipe(recipe_id, base_url, build, versions):
+    """Не зависящая от пользователя часть RecipeSerializer для рецепта.
+
+    Ключ состоит из версии рецепта и версии справочника ингредиентов,
+    так что локальная копия никогда не бывает устаревшей. base_url входит
+    в ключ, потому что ссылка на изображение абсолютная. build()
+    вызывается при промахе и возвращает None, если рецепта нет.
+    """
+    recipe_version, catalog_version = versions
+    key = f'recipe-detail:{recipe_id}:{recipe_version}:{catalog_version}:{base_url}'
+
+    data = local_recipe_cache.get(key)
+    if data is not None:
+        return data
+    data = cache.get(key)
+    if data is None:
+        data = build()
+        if data is None:
+            return None
+        cache.set(key, data, RECIPE_CACHE_TIMEOUT)
+    local_recipe_cache.set(key, data)
+    return data
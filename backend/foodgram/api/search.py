@@ -0,0 +1,148 @@
+from django.db import connection, connections, transaction
+from django.db.models import BooleanField, FloatField, Q, Value
+from django.db.models.expressions import RawSQL
+
+SEARCH_CONFIG = 'russian'
+SQLITE_FTS_TABLE = 'api_recipe_fts'
+# веса названия и описания рецепта в ранжировании
+NAME_WEIGHT = 10.0
+TEXT_WEIGHT = 1.0
+
+# Индекс в PostgreSQL: вычисляемая колонка tsvector, её обновляет сама БД
+POSTGRES_SEARCH_SQL = [
+    f"""
+    ALTER TABLE api_recipe ADD COLUMN IF NOT EXISTS search_vector tsvector
+    GENERATED ALWAYS AS (
+        setweight(to_tsvector('{SEARCH_CONFIG}', coalesce(name, '')), 'A')
+        || setweight(to_tsvector('{SEARCH_CONFIG}', coalesce(text, '')), 'B')
+    ) STORED
+    """,
+    'CREATE INDEX IF NOT EXISTS recipe_search_vector_idx '
+    'ON api_recipe USING gin (search_vector)',
+]
+DROP_POSTGRES_SEARCH_SQL = [
+    'DROP INDEX IF EXISTS recipe_search_vector_idx',
+    'ALTER TABLE api_recipe DROP COLUMN IF EXISTS search_vector',
+]
+
+# Индекс в SQLite: внешняя FTS5-таблица поверх api_recipe и триггеры.
+# Django пересоздаёт таблицу при части изменений схемы в SQLite, вместе
+# с ней пропадают триггеры, их восстанавливает restore_search_triggers
+# после каждого migrate.
+SQLITE_SEARCH_TRIGGERS_SQL = [
+    f"""
+    CREATE TRIGGER IF NOT EXISTS {SQLITE_FTS_TABLE}_ai AFTER INSERT ON api_recipe BEGIN
+        INSERT INTO {SQLITE_FTS_TABLE}(rowid, name, text) VALUES (new.id, new.name, new.text);
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS {SQLITE_FTS_TABLE}_ad AFTER DELETE ON api_recipe BEGIN
+        INSERT INTO {SQLITE_FTS_TABLE}({SQLITE_FTS_TABLE}, rowid, name, text)
+        VALUES ('delete', old.id, old.name, old.text);
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS {SQLITE_FTS_TABLE}_au
+    AFTER UPDATE OF name, text ON api_recipe BEGIN
+        INSERT INTO {SQLITE_FTS_TABLE}({SQLITE_FTS_TABLE}, rowid, name, text)
+        VALUES ('delete', old.id, old.name, old.text);
+        INSERT INTO {SQLITE_FTS_TABLE}(rowid, name, text) VALUES (new.id, new.name, new.text);
+    END
+    """,
+]
+DROP_SQLITE_SEARCH_TRIGGERS_SQL = [
+    f'DROP TRIGGER IF EXISTS {SQLITE_FTS_TABLE}_au',
+    f'DROP TRIGGER IF EXISTS {SQLITE_FTS_TABLE}_ad',
+    f'DROP TRIGGER IF EXISTS {SQLITE_FTS_TABLE}_ai',
+]
+SQLITE_SEARCH_SQL = [
+    f"""
+    CREATE VIRTUAL TABLE IF NOT EXISTS {SQLITE_FTS_TABLE} USING fts5(
+        name, text, content='api_recipe', content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2'
+    )
+    """,
+    *SQLITE_SEARCH_TRIGGERS_SQL,
+    f"INSERT INTO {SQLITE_FTS_TABLE}({SQLITE_FTS_TABLE}) VALUES ('rebuild')",
+]
+DROP_SQLITE_SEARCH_SQL = [
+    *DROP_SQLITE_SEARCH_TRIGGERS_SQL,
+    f'DROP TABLE IF EXISTS {SQLITE_FTS_TABLE}',
+]
+
+CREATE_SEARCH_INDEX = {
+    'postgresql': POSTGRES_SEARCH_SQL,
+    'sqlite': SQLITE_SEARCH_SQL,
+}
+DROP_SEARCH_INDEX = {
+    'postgresql': DROP_POSTGRES_SEARCH_SQL,
+    'sqlite': DROP_SQLITE_SEARCH_SQL,
+}
+
+
+def create_search_index(schema_editor):
+    for statement in CREATE_SEARCH_INDEX.get(schema_editor.connection.vendor, []):
+        schema_editor.execute(statement)
+
+
+def drop_search_index(schema_editor):
+    for statement in DROP_SEARCH_INDEX.get(schema_editor.connection.vendor, []):
+        schema_editor.execute(statement)
+
+
+def restore_search_triggers(using):
+    """Пересоздаёт триггеры FTS5, если индекс уже заведён миграцией.
+    Старые триггеры удаляются, так что изменённое определение доходит
+    и до существующих баз."""
+    connection = connections[using]
+    if connection.vendor != 'sqlite':
+        return
+    with transaction.atomic(using=using), connection.cursor() as cursor:
+        if SQLITE_FTS_TABLE not in connection.introspection.table_names(cursor):
+            return
+        for statement in DROP_SQLITE_SEARCH_TRIGGERS_SQL + SQLITE_SEARCH_TRIGGERS_SQL:
+            cursor.execute(statement)
+
+
+def fts5_query(query):
+    """Слова запроса как строки FTS5: пользовательский ввод не разбирается
+    как синтаксис MATCH, все слова должны встретиться в рецепте."""
+    words = query.split()
+    return ' '.join('"{}"'.format(word.replace('"', '""')) for word in words)
+
+
+def search_recipes(queryset, query):
+    """Рецепты, подходящие под поисковый запрос, с релевантностью
+    в search_rank (больше — лучше), отсортированные по ней."""
+    vendor = connection.vendor
+    if vendor == 'postgresql':
+        tsquery = f"websearch_to_tsquery('{SEARCH_CONFIG}', %s)"
+        queryset = queryset.filter(
+            RawSQL(f'api_recipe.search_vector @@ {tsquery}', [query], output_field=BooleanField())
+        ).annotate(
+            search_rank=RawSQL(
+                f'ts_rank_cd(api_recipe.search_vector, {tsquery})',
+                [query], output_field=FloatField()
+            )
+        )
+    elif vendor == 'sqlite':
+        match = fts5_query(query)
+        if not match:
+            return queryset.none()
+        queryset = queryset.filter(
+            id__in=RawSQL(
+                f'SELECT rowid FROM {SQLITE_FTS_TABLE} WHERE {SQLITE_FTS_TABLE} MATCH %s',
+                [match]
+            )
+        ).annotate(
+            search_rank=RawSQL(
+                f'SELECT -bm25({SQLITE_FTS_TABLE}, %s, %s) FROM {SQLITE_FTS_TABLE} '
+                f'WHERE {SQLITE_FTS_TABLE} MATCH %s AND rowid = api_recipe.id',
+                [NAME_WEIGHT, TEXT_WEIGHT, match], output_field=FloatField()
+            )
+        )
+    else:
+        queryset = queryset.filter(
+            Q(name__icontains=query) | Q(text__icontains=query)
+        ).annotate(search_rank=Value(0.0, output_field=FloatField()))
+    return queryset.order_by('-search_rank', '-id')
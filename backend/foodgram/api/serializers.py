@@ -1,9 +1,14 @@
 from rest_framework import serializers
 from djoser.serializers import UserCreateSerializer as BaseUserCreateSerializer, UserSerializer as BaseUserSerializer
 from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.models import Prefetch, prefetch_related_objects
 from .models import Recipe, Ingredient, IngredientInRecipe, Favorite, ShoppingCart, Follow
-import base64
-from django.core.files.base import ContentFile
+from .catalog import ingredient_catalog
+from .shopping_list import bump_recipe_carts_version
+from .counters import change_counter
+from .ingredient_index import recipe_ingredient_index
+from .images import InvalidImage, check_image, decode_base64_image, get_variant_url
 
 User = get_user_model()
 
@@ -13,19 +18,46 @@ MAX_INGREDIENT_AMOUNT = 32_000
 MIN_COOKING_TIME = 1
 MAX_COOKING_TIME = 32_000
 
+MAX_BATCH_RECIPES = 100
+
 
 class Base64ImageField(serializers.ImageField):
+    """Изображение из data URI или файла. В запросе файл проверяется
+    целиком, уменьшенные копии строятся в фоне; variant выбирает,
+    какую из них отдавать."""
+
+    def __init__(self, *args, variant=None, **kwargs):
+        self.variant = variant
+        super().__init__(*args, **kwargs)
+
     def to_internal_value(self, data):
-        if isinstance(data, str) and data.startswith('data:image'):
-            format, imgstr = data.split(';base64,')
-            ext = format.split('/')[-1]
-            data = ContentFile(base64.b64decode(imgstr), name=f'temp.{ext}')
-        return super().to_internal_value(data)
-    
+        try:
+            if isinstance(data, str) and data.startswith('data:image'):
+                format, imgstr = data.split(';base64,')
+                ext = format.split('/')[-1]
+                data = decode_base64_image(imgstr, f'temp.{ext}')
+            file = serializers.FileField.to_internal_value(self, data)
+            check_image(file)
+        except (InvalidImage, ValueError):
+            self.fail('invalid_image')
+        return file
+
+    def get_variant(self):
+        return self.variant
+
     def to_representation(self, value):
         if not value:
             return ""
-        return super().to_representation(value)
+        url = get_variant_url(value, self.get_variant())
+        request = self.context.get('request')
+        return request.build_absolute_uri(url) if request is not None else url
+
+
+class RecipeImageField(Base64ImageField):
+    """Размер фото рецепта задаёт view через контекст recipe_image_variant."""
+
+    def get_variant(self):
+        return self.context.get('recipe_image_variant', self.variant)
 
 
 class CustomUserCreateSerializer(BaseUserCreateSerializer):
@@ -35,6 +67,7 @@ class CustomUserCreateSerializer(BaseUserCreateSerializer):
 
 
 class CustomUserSerializer(BaseUserSerializer):
+    avatar = Base64ImageField(variant='thumbnail', required=False, allow_null=True)
     is_subscribed = serializers.SerializerMethodField()
 
     class Meta(BaseUserSerializer.Meta):
@@ -42,10 +75,12 @@ class CustomUserSerializer(BaseUserSerializer):
         fields = ('id', 'email', 'username', 'first_name', 'last_name', 'avatar', 'is_subscribed')
 
     def get_is_subscribed(self, obj):
+        if hasattr(obj, 'is_subscribed'):
+            return obj.is_subscribed
         try:
             request = self.context.get('request')
             if request and hasattr(request, 'user') and request.user.is_authenticated:
-                return obj.subscriptions.filter(user=request.user).exists()
+                return obj.subscribers.filter(user=request.user).exists()
         except Exception:
             pass
         return False
@@ -84,7 +119,7 @@ class RecipeSerializer(serializers.ModelSerializer):
     ingredients = IngredientInRecipeSerializer(many=True, source='ingredient_amounts')
     is_favorited = serializers.SerializerMethodField()
     is_in_shopping_cart = serializers.SerializerMethodField()
-    image = Base64ImageField()
+    image = RecipeImageField(variant='full')
 
     class Meta:
         model = Recipe
@@ -99,17 +134,27 @@ class RecipeSerializer(serializers.ModelSerializer):
             'cooking_time']
 
     def get_is_favorited(self, obj):
+        if hasattr(obj, 'is_favorited'):
+            return obj.is_favorited
         request = self.context.get('request')
         if not request or not request.user.is_authenticated:
             return False
         return obj.favorited_by.filter(user=request.user).exists()
 
     def get_is_in_shopping_cart(self, obj):
+        if hasattr(obj, 'is_in_shopping_cart'):
+            return obj.is_in_shopping_cart
         request = self.context.get('request')
         if not request or not request.user.is_authenticated:
             return False
         return obj.in_shopping_carts.filter(user=request.user).exists()
 
+    def to_representation(self, instance):
+        # флаг подписки на автора приходит аннотацией рецепта из ленты
+        if hasattr(instance, 'is_author_subscribed'):
+            instance.author.is_subscribed = instance.is_author_subscribed
+        return super().to_representation(instance)
+
 
 class RecipeCreateSerializer(serializers.ModelSerializer):
     ingredients = IngredientInRecipeCreateSerializer(many=True, write_only=True, required=True)
@@ -141,21 +186,21 @@ class RecipeCreateSerializer(serializers.ModelSerializer):
         if not value:
             raise serializers.ValidationError("Поле ingredients не может быть пустым.")
 
+        ids = [ingredient_data['id'] for ingredient_data in value]
+        missing_ids = set(ids) - ingredient_catalog.ids()
         seen_ids = set()
-        for ingredient_data in value:
-            ingredient_id = ingredient_data.get("id")
-            amount = ingredient_data.get("amount")
-
-            if not Ingredient.objects.filter(id=ingredient_id).exists():
-                raise serializers.ValidationError(
-                    f"Ингредиент с id={ingredient_id} не существует."
-                )
-
-            if ingredient_id in seen_ids:
-                raise serializers.ValidationError(
-                    f"Ингредиент с id={ingredient_id} указан несколько раз."
-                )
+        errors = []
+        for ingredient_id in ids:
+            if ingredient_id in missing_ids:
+                errors.append({'id': [f"Ингредиент с id={ingredient_id} не существует."]})
+            elif ingredient_id in seen_ids:
+                errors.append({'id': [f"Ингредиент с id={ingredient_id} указан несколько раз."]})
+            else:
+                errors.append({})
             seen_ids.add(ingredient_id)
+
+        if missing_ids or len(seen_ids) < len(ids):
+            raise serializers.ValidationError(errors)
         return value
     
     def create_ingredients(self, recipe, ingredients_data):
@@ -169,32 +214,95 @@ class RecipeCreateSerializer(serializers.ModelSerializer):
         ]
         IngredientInRecipe.objects.bulk_create(ingredients)
 
+    @transaction.atomic
     def create(self, validated_data):
         ingredients_data = validated_data.pop('ingredients')
         recipe = Recipe.objects.create(author=self.context['request'].user, **validated_data)
         self.create_ingredients(recipe, ingredients_data)
+        change_counter(User, recipe.author_id, 'recipes_count', 1)
+        self.index_ingredients(recipe, ingredients_data)
         return recipe
 
+    def update_ingredients(self, recipe, ingredients_data):
+        """Приводит строки рецепта к ingredients_data, трогая только
+        изменившиеся: одно обновление количеств, одна вставка новых
+        строк и одно удаление лишних."""
+        stored = {
+            item.ingredient_id: item
+            for item in IngredientInRecipe.objects.filter(recipe=recipe)
+        }
+        submitted = {item['id']: item['amount'] for item in ingredients_data}
+
+        changed = []
+        for ingredient_id, amount in submitted.items():
+            item = stored.get(ingredient_id)
+            if item is not None and item.amount != amount:
+                item.amount = amount
+                changed.append(item)
+        added = [
+            {'id': ingredient_id, 'amount': amount}
+            for ingredient_id, amount in submitted.items()
+            if ingredient_id not in stored
+        ]
+        removed = [
+            item.id for ingredient_id, item in stored.items()
+            if ingredient_id not in submitted
+        ]
+
+        if removed or changed or added:
+            bump_recipe_carts_version(recipe)
+        if removed:
+            IngredientInRecipe.objects.filter(id__in=removed).delete()
+        if changed:
+            IngredientInRecipe.objects.bulk_update(changed, ['amount'])
+        if added:
+            self.create_ingredients(recipe, added)
+
+    @transaction.atomic
     def update(self, instance, validated_data):
         ingredients_data = validated_data.pop('ingredients', None)
         instance = super().update(instance, validated_data)
         if ingredients_data:
-            instance.ingredients.clear()
-            self.create_ingredients(instance, ingredients_data)
+            self.update_ingredients(instance, ingredients_data)
+            self.index_ingredients(instance, ingredients_data)
         return instance
 
+    def index_ingredients(self, recipe, ingredients_data):
+        ingredient_ids = [item['id'] for item in ingredients_data]
+        transaction.on_commit(
+            lambda: recipe_ingredient_index.set_recipe(recipe.id, ingredient_ids)
+        )
+
     def to_representation(self, instance):
+        # сбрасываем кэш связей: после update в нём могут быть старые строки
+        instance._prefetched_objects_cache = {}
+        prefetch_related_objects(
+            [instance],
+            Prefetch(
+                'ingredient_amounts',
+                queryset=IngredientInRecipe.objects.select_related('ingredient')
+            )
+        )
         return RecipeSerializer(instance, context=self.context).data
 
 
 class RecipeMinifiedSerializer(serializers.ModelSerializer):
-    image = Base64ImageField()
+    image = Base64ImageField(variant='thumbnail')
 
     class Meta:
         model = Recipe
         fields = ['id', 'name', 'image', 'cooking_time']
 
 
+class RecipeCoverageSerializer(RecipeMinifiedSerializer):
+    matched = serializers.IntegerField(read_only=True)
+    total = serializers.IntegerField(read_only=True)
+    coverage = serializers.FloatField(read_only=True)
+
+    class Meta(RecipeMinifiedSerializer.Meta):
+        fields = RecipeMinifiedSerializer.Meta.fields + ['matched', 'total', 'coverage']
+
+
 class UserWithRecipesSerializer(CustomUserSerializer):
     recipes = serializers.SerializerMethodField()
     recipes_count = serializers.SerializerMethodField()
@@ -203,6 +311,10 @@ class UserWithRecipesSerializer(CustomUserSerializer):
         fields = CustomUserSerializer.Meta.fields + ('recipes', 'recipes_count')
 
     def get_recipes(self, obj):
+        if hasattr(obj, 'limited_recipes'):
+            return RecipeMinifiedSerializer(
+                obj.limited_recipes, many=True, context=self.context
+            ).data
         request = self.context.get('request')
         recipes_limit = request.query_params.get('recipes_limit')
         recipes = obj.recipes.all()
@@ -211,7 +323,15 @@ class UserWithRecipesSerializer(CustomUserSerializer):
         return RecipeMinifiedSerializer(recipes, many=True, context=self.context).data
 
     def get_recipes_count(self, obj):
-        return obj.recipes.count()
+        return obj.recipes_count
+
+
+class RecipeIdsSerializer(serializers.Serializer):
+    ids = serializers.ListField(
+        child=serializers.IntegerField(min_value=1),
+        allow_empty=False,
+        max_length=MAX_BATCH_RECIPES
+    )
 
 
 class SetAvatarSerializer(serializers.ModelSerializer):
@@ -219,4 +339,10 @@ class SetAvatarSerializer(serializers.ModelSerializer):
 
     class Meta:
         model = User
-        fields = ['avatar']
\ No newline at end of file
+        fields = ['avatar']
+
+    def update(self, instance, validated_data):
+        # остальные поля пользователя меняются в других запросах
+        instance.avatar = validated_data['avatar']
+        instance.save(update_fields=['avatar', 'updated_at'])
+        return instance
@@ -0,0 +1,346 @@
+import csv
+import io
+import json
+import logging
+import os
+import re
+import tempfile
+from functools import partial
+from pathlib import Path
+from tempfile import SpooledTemporaryFile
+from threading import Lock
+from time import time, time_ns
+from uuid import uuid4
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Sum
+from reportlab.lib.pagesizes import A4
+from reportlab.pdfgen import canvas
+
+from .catalog import get_catalog_version
+from .models import IngredientInRecipe, ShoppingCart
+from .pools import create_process_pool
+
+logger = logging.getLogger(__name__)
+
+SHOPPING_LIST_TITLE = 'Список покупок'
+SHOPPING_LIST_FILENAME = 'shopping_list'
+SHOPPING_LIST_CONTENT_TYPES = {
+    'pdf': 'application/pdf',
+    'txt': 'text/plain; charset=utf-8',
+    'csv': 'text/csv; charset=utf-8',
+}
+SHOPPING_LIST_CSV_HEADER = ('Ингредиент', 'Количество', 'Единица измерения')
+SHOPPING_LIST_ITERATOR_CHUNK = 500
+
+SHOPPING_LIST_CACHE_TIMEOUT = 60 * 60 * 24
+SHOPPING_LIST_CACHE_MAX_ITEMS = 5_000
+SHOPPING_LIST_CACHE_MAX_BYTES = 2 * 1024 * 1024
+
+SHOPPING_LIST_JOB_TIMEOUT = 60 * 60
+SHOPPING_LIST_JOB_SWEEP_INTERVAL = 60
+JOB_ID_PATTERN = re.compile(r'[0-9a-f]{32}')
+SHOPPING_LIST_RENDER_WORKERS = 2
+
+JOB_PENDING = 'pending'
+JOB_DONE = 'done'
+JOB_FAILED = 'failed'
+
+PDF_TITLE_X = 100
+PDF_TITLE_Y = 750
+PDF_ITEM_START_Y = 700
+PDF_ITEM_OFFSET = 20
+PDF_PAGE_SIZE = A4
+PDF_LEFT_MARGIN = 100
+PDF_BOTTOM_MARGIN = 50
+# до этого размера PDF собирается в памяти, дальше во временном файле
+PDF_SPOOL_MAX_SIZE = 1024 * 1024
+PDF_STREAM_CHUNK = 64 * 1024
+
+
+def cart_version_key(user_id):
+    return f'shopping-cart-version:{user_id}'
+
+
+def get_cart_version(user_id):
+    return cache.get_or_set(cart_version_key(user_id), time_ns, timeout=None)
+
+
+def bump_cart_version(user_ids):
+    """Сбрасывает закэшированные списки покупок пользователей."""
+    version = time_ns()
+    cache.set_many(
+        {cart_version_key(user_id): version for user_id in user_ids},
+        timeout=None
+    )
+
+
+def bump_recipe_carts_version(recipe):
+    """Сбрасывает списки покупок всех, у кого рецепт лежит в корзине.
+    Пользователи выбираются сразу, пока корзины не удалены вместе с
+    рецептом, а версия меняется после коммита: иначе параллельное
+    скачивание прочитает старые строки и закэширует их под новой версией."""
+    user_ids = list(ShoppingCart.objects.filter(recipe=recipe).values_list('user_id', flat=True))
+    transaction.on_commit(lambda: bump_cart_version(user_ids))
+
+
+def get_shopping_list(user):
+    """Суммарное количество каждого ингредиента по рецептам в корзине."""
+    return (
+        IngredientInRecipe.objects
+        .filter(recipe__in_shopping_carts__user=user)
+        .values(
+            'ingredient__name',
+            'ingredient__measurement_unit'
+        )
+        .annotate(total_amount=Sum('amount'))
+        .order_by('ingredient__name')
+    )
+
+
+def format_item(item):
+    return f"{item['ingredient__name']}: {item['total_amount']} {item['ingredient__measurement_unit']}"
+
+
+def iter_txt(items):
+    yield f'{SHOPPING_LIST_TITLE}\n\n'
+    for item in items:
+        yield f'{format_item(item)}\n'
+
+
+class _EchoBuffer:
+    """Псевдо-файл для csv.writer: возвращает строку вместо записи."""
+
+    def write(self, value):
+        return value
+
+
+def iter_csv(items):
+    writer = csv.writer(_EchoBuffer())
+    yield writer.writerow(SHOPPING_LIST_CSV_HEADER)
+    for item in items:
+        yield writer.writerow((
+            item['ingredient__name'],
+            item['total_amount'],
+            item['ingredient__measurement_unit'],
+        ))
+
+
+def render_pdf(items, file):
+    """Рисует список в file, перенося строки на новые страницы."""
+    p = canvas.Canvas(file, pagesize=PDF_PAGE_SIZE)
+    p.drawString(PDF_TITLE_X, PDF_TITLE_Y, SHOPPING_LIST_TITLE)
+
+    y_position = PDF_ITEM_START_Y
+    for item in items:
+        if y_position < PDF_BOTTOM_MARGIN:
+            p.showPage()
+            y_position = PDF_TITLE_Y
+        p.drawString(PDF_LEFT_MARGIN, y_position, format_item(item))
+        y_position -= PDF_ITEM_OFFSET
+
+    p.showPage()
+    p.save()
+
+
+def iter_pdf(items):
+    with SpooledTemporaryFile(max_size=PDF_SPOOL_MAX_SIZE) as file:
+        render_pdf(items, file)
+        file.seek(0)
+        while chunk := file.read(PDF_STREAM_CHUNK):
+            yield chunk
+
+
+SHOPPING_LIST_RENDERERS = {
+    'pdf': iter_pdf,
+    'txt': iter_txt,
+    'csv': iter_csv,
+}
+
+
+def _cache_while_iterating(iterable, key, max_size, size):
+    """Отдаёт значения дальше и кладёт их в кэш целиком, если
+    суммарный размер не превысил max_size."""
+    collected = []
+    total = 0
+    for value in iterable:
+        if collected is not None:
+            collected.append(value)
+            total += size(value)
+            if total > max_size:
+                collected = None
+        yield value
+    if collected is not None:
+        cache.set(key, collected, SHOPPING_LIST_CACHE_TIMEOUT)
+
+
+def _cache_keys(user, file_format):
+    version = f'{get_cart_version(user.id)}:{get_catalog_version()}'
+    items_key = f'shopping-list:{user.id}:{version}'
+    return items_key, f'{items_key}:{file_format}'
+
+
+def iter_shopping_list(user, file_format):
+    """Список покупок в file_format. Агрегированные строки и готовый
+    документ кэшируются по версии корзины и справочника ингредиентов,
+    так что повторное скачивание неизменной корзины не обращается к БД."""
+    items_key, document_key = _cache_keys(user, file_format)
+
+    document = cache.get(document_key)
+    if document is not None:
+        return iter(document)
+
+    items = cache.get(items_key)
+    if items is None:
+        items = _cache_while_iterating(
+            get_shopping_list(user).iterator(chunk_size=SHOPPING_LIST_ITERATOR_CHUNK),
+            items_key, SHOPPING_LIST_CACHE_MAX_ITEMS, size=lambda item: 1
+        )
+    return _cache_while_iterating(
+        SHOPPING_LIST_RENDERERS[file_format](items),
+        document_key, SHOPPING_LIST_CACHE_MAX_BYTES, size=len
+    )
+
+
+def render_document(items, file_format):
+    """Готовый документ целиком. Выполняется в отдельном процессе,
+    поэтому работает только с переданными данными, без БД."""
+    if file_format == 'pdf':
+        buffer = io.BytesIO()
+        render_pdf(items, buffer)
+        return buffer.getvalue()
+    return ''.join(SHOPPING_LIST_RENDERERS[file_format](items)).encode()
+
+
+_render_pool = None
+_render_pool_lock = Lock()
+_jobs_swept_at = 0.0
+
+
+def _get_render_pool():
+    global _render_pool
+    with _render_pool_lock:
+        if _render_pool is None:
+            _render_pool = create_process_pool(SHOPPING_LIST_RENDER_WORKERS)
+        return _render_pool
+
+
+def _job_root():
+    return Path(settings.SHOPPING_LIST_JOB_ROOT)
+
+
+def _job_path(job_id):
+    return _job_root() / f'{job_id}.json'
+
+
+def _document_path(job_id):
+    return _job_root() / f'{job_id}.document'
+
+
+def _write_file(path, data):
+    # запись через временный файл: читатель видит файл целиком или никак
+    path.parent.mkdir(parents=True, exist_ok=True)
+    fd, temp_path = tempfile.mkstemp(dir=path.parent, prefix='.job-')
+    try:
+        with os.fdopen(fd, 'wb') as file:
+            file.write(data)
+        os.replace(temp_path, path)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.unlink(temp_path)
+        raise
+
+
+def _save_job(job_id, user_id, file_format, status, document=None):
+    # задачи лежат в файлах, а не в кэше: кэш может вытеснить
+    # незавершённую задачу, и клиент получит 404 на правильный id
+    if document is not None:
+        _write_file(_document_path(job_id), document)
+    _write_file(_job_path(job_id), json.dumps({
+        'user_id': user_id,
+        'file_format': file_format,
+        'status': status,
+    }).encode())
+
+
+def _sweep_jobs():
+    """Удаляет файлы задач старше SHOPPING_LIST_JOB_TIMEOUT, не чаще
+    раза в SHOPPING_LIST_JOB_SWEEP_INTERVAL секунд на процесс."""
+    global _jobs_swept_at
+    now = time()
+    if now - _jobs_swept_at < SHOPPING_LIST_JOB_SWEEP_INTERVAL:
+        return
+    _jobs_swept_at = now
+    try:
+        entries = list(os.scandir(_job_root()))
+    except FileNotFoundError:
+        return
+    for entry in entries:
+        try:
+            if entry.stat().st_mtime < now - SHOPPING_LIST_JOB_TIMEOUT:
+                os.unlink(entry.path)
+        except FileNotFoundError:
+            pass
+
+
+def _finish_job(job_id, user_id, file_format, document_key, future):
+    try:
+        document = future.result()
+    except Exception:
+        logger.exception('Shopping list job %s failed', job_id)
+        _save_job(job_id, user_id, file_format, JOB_FAILED)
+        return
+    _save_job(job_id, user_id, file_format, JOB_DONE, document)
+    if len(document) <= SHOPPING_LIST_CACHE_MAX_BYTES:
+        cache.set(document_key, [document], SHOPPING_LIST_CACHE_TIMEOUT)
+
+
+def start_shopping_list_job(user, file_format):
+    """Ставит построение документа в пул процессов и возвращает id задачи.
+    Строки списка читаются из БД здесь, в пул уходят готовые данные."""
+    _sweep_jobs()
+    job_id = uuid4().hex
+    items_key, document_key = _cache_keys(user, file_format)
+
+    document = cache.get(document_key)
+    if document is not None:
+        document = b''.join(
+            chunk.encode() if isinstance(chunk, str) else chunk
+            for chunk in document
+        )
+        _save_job(job_id, user.id, file_format, JOB_DONE, document)
+        return job_id
+
+    items = cache.get(items_key)
+    if items is None:
+        items = list(get_shopping_list(user))
+        if len(items) <= SHOPPING_LIST_CACHE_MAX_ITEMS:
+            cache.set(items_key, items, SHOPPING_LIST_CACHE_TIMEOUT)
+
+    _save_job(job_id, user.id, file_format, JOB_PENDING)
+    future = _get_render_pool().submit(render_document, items, file_format)
+    future.add_done_callback(
+        partial(_finish_job, job_id, user.id, file_format, document_key)
+    )
+    return job_id
+
+
+def get_shopping_list_job(job_id, user):
+    """Состояние задачи пользователя или None. У готовой задачи в
+    document_path лежит путь к документу."""
+    if not JOB_ID_PATTERN.fullmatch(job_id):
+        return None
+    path = _job_path(job_id)
+    try:
+        if path.stat().st_mtime < time() - SHOPPING_LIST_JOB_TIMEOUT:
+            return None
+        job = json.loads(path.read_bytes())
+    except FileNotFoundError:
+        return None
+    if job['user_id'] != user.id:
+        return None
+    if job['status'] == JOB_DONE:
+        job['document_path'] = _document_path(job_id)
+    return job
@@ -0,0 +1,118 @@
+import atexit
+import logging
+import string
+from collections import Counter
+from threading import Lock
+from time import monotonic
+
+from django.db import DatabaseError
+from django.db.models import Case, F, Value, When
+
+from .models import Recipe, ShortLink
+from .recipe_cache import LocalLRUCache
+
+logger = logging.getLogger(__name__)
+
+BASE62_ALPHABET = string.digits + string.ascii_lowercase + string.ascii_uppercase
+
+SHORT_LINK_CACHE_SIZE = 10_000
+SHORT_LINK_CACHE_TIMEOUT = 60 * 60
+# переходы пишутся в БД пачкой, когда их накопится столько
+# или пройдёт столько секунд с прошлой записи
+CLICKS_FLUSH_SIZE = 1000
+CLICKS_FLUSH_INTERVAL = 10.0
+
+# код -> id рецепта и id рецепта -> код; связь не меняется, пока жив рецепт
+short_link_cache = LocalLRUCache(SHORT_LINK_CACHE_SIZE, SHORT_LINK_CACHE_TIMEOUT)
+
+
+def encode_base62(number):
+    digits = []
+    while True:
+        number, digit = divmod(number, len(BASE62_ALPHABET))
+        digits.append(BASE62_ALPHABET[digit])
+        if not number:
+            return ''.join(reversed(digits))
+
+
+def get_short_code(recipe_id):
+    """Код короткой ссылки рецепта, создаёт её при первом запросе.
+    Возвращает None, если рецепта нет."""
+    key = f'recipe:{recipe_id}'
+    code = short_link_cache.get(key)
+    if code is not None:
+        return code
+    code = ShortLink.objects.filter(recipe_id=recipe_id).values_list('code', flat=True).first()
+    if code is None:
+        if not Recipe.objects.filter(pk=recipe_id).exists():
+            return None
+        # код выводится из id рецепта, поэтому одновременные запросы
+        # создают одну и ту же строку
+        code = encode_base62(recipe_id)
+        ShortLink.objects.bulk_create(
+            [ShortLink(recipe_id=recipe_id, code=code)], ignore_conflicts=True
+        )
+    short_link_cache.set(key, code)
+    short_link_cache.set(f'code:{code}', recipe_id)
+    return code
+
+
+def resolve_short_code(code):
+    """id рецепта по коду ссылки или None."""
+    key = f'code:{code}'
+    recipe_id = short_link_cache.get(key)
+    if recipe_id is None:
+        recipe_id = ShortLink.objects.filter(code=code).values_list('recipe_id', flat=True).first()
+        if recipe_id is None:
+            return None
+        short_link_cache.set(key, recipe_id)
+    return recipe_id
+
+
+def write_clicks(counts):
+    """Прибавляет переходы ко всем ссылкам одним UPDATE."""
+    ShortLink.objects.filter(code__in=counts).update(clicks=F('clicks') + Case(
+        *(When(code=code, then=Value(count)) for code, count in counts.items()),
+        default=Value(0)
+    ))
+
+
+class ClickBuffer:
+    """Счётчики переходов в памяти процесса. При аварийном завершении
+    воркера теряются переходы, накопленные с последней записи."""
+
+    def __init__(self, flush_size=CLICKS_FLUSH_SIZE, flush_interval=CLICKS_FLUSH_INTERVAL):
+        self.flush_size = flush_size
+        self.flush_interval = flush_interval
+        self._lock = Lock()
+        self._counts = Counter()
+        self._pending = 0
+        self._flushed_at = monotonic()
+
+    def add(self, code):
+        with self._lock:
+            self._counts[code] += 1
+            self._pending += 1
+            if (self._pending < self.flush_size
+                    and monotonic() - self._flushed_at < self.flush_interval):
+                return
+        self.flush()
+
+    def flush(self):
+        with self._lock:
+            counts, self._counts = self._counts, Counter()
+            self._pending = 0
+            self._flushed_at = monotonic()
+        if not counts:
+            return
+        try:
+            write_clicks(counts)
+        except DatabaseError:
+            logger.exception('Failed to write short link clicks')
+            with self._lock:
+                self._counts.update(counts)
+                self._pending += sum(counts.values())
+
+
+click_buffer = ClickBuffer()
+atexit.register(click_buffer.flush)
@@ -0,0 +1,134 @@
+from django.db.models.signals import post_delete, post_init, post_save
+from django.dispatch import receiver
+
+from django.db import transaction
+
+from rest_framework.authtoken.models import Token
+
+from .authentication import invalidate_tokens, invalidate_user_tokens
+from .catalog import ingredient_catalog
+from .images import acquire_blob, needs_variants, release_blob, schedule_image_variants
+from .ingredient_index import recipe_ingredient_index
+from .models import Ingredient, IngredientInRecipe, Recipe, User
+from .ranking import create_ranking
+from .recipe_cache import bump_recipe_versions, mark_recipe_deleted
+
+IMAGE_FIELDS = {Recipe: 'image', User: 'avatar'}
+
+
+@receiver([post_save, post_delete], sender=Ingredient)
+def invalidate_ingredient_catalog(sender, **kwargs):
+    # после коммита: иначе другой воркер увидит новую версию, загрузит
+    # ещё не закоммиченный справочник и оставит его до следующей смены
+    transaction.on_commit(ingredient_catalog.invalidate)
+
+
+@receiver(post_delete, sender=Ingredient)
+def invalidate_recipe_ingredient_index(sender, **kwargs):
+    # строки рецептов с этим ингредиентом удалены каскадом
+    transaction.on_commit(recipe_ingredient_index.invalidate)
+
+
+@receiver(post_delete, sender=Recipe)
+def remove_recipe_from_index(sender, instance, **kwargs):
+    recipe_id = instance.id
+    transaction.on_commit(lambda: recipe_ingredient_index.remove_recipe(recipe_id))
+
+
+@receiver(post_save, sender=Recipe)
+def create_recipe_ranking(sender, instance, created, raw=False, **kwargs):
+    # рецепты из админки тоже должны попадать в популярные и трендовые
+    if created and not raw:
+        create_ranking(instance)
+
+
+@receiver(post_save, sender=Recipe)
+def invalidate_cached_recipe(sender, instance, **kwargs):
+    # после коммита, чтобы новая версия не закэшировала старые строки
+    recipe_id = instance.id
+    transaction.on_commit(lambda: bump_recipe_versions([recipe_id]))
+
+
+@receiver(post_delete, sender=Recipe)
+def forget_deleted_recipe(sender, instance, **kwargs):
+    # строки рецепта удаляются каскадом раньше самого рецепта, поэтому
+    # отметка об удалении записывается после их версий
+    recipe_id = instance.id
+    transaction.on_commit(lambda: mark_recipe_deleted(recipe_id))
+
+
+@receiver([post_save, post_delete], sender=IngredientInRecipe)
+def invalidate_cached_recipe_ingredients(sender, instance, **kwargs):
+    recipe_id = instance.recipe_id
+    transaction.on_commit(lambda: bump_recipe_versions([recipe_id]))
+
+
+@receiver(post_save, sender=User)
+def invalidate_cached_author_recipes(sender, instance, update_fields=None, **kwargs):
+    if update_fields is not None and set(update_fields) <= {'last_login'}:
+        return
+    user_id = instance.id
+    transaction.on_commit(lambda: bump_recipe_versions(
+        Recipe.objects.filter(author_id=user_id).values_list('id', flat=True)
+    ))
+
+
+@receiver(post_save, sender=Recipe)
+@receiver(post_save, sender=User)
+def build_image_variants(sender, instance, **kwargs):
+    # любое сохранение с новым файлом — из API, djoser или админки
+    field = IMAGE_FIELDS[sender]
+    if needs_variants(instance, field):
+        schedule_image_variants(instance, field)
+
+
+@receiver(post_init, sender=Recipe)
+@receiver(post_init, sender=User)
+def remember_image_name(sender, instance, **kwargs):
+    # имя файла в БД; отложенное поле не читаем, чтобы не делать запрос
+    # на каждый объект, такие объекты счётчик ссылок пропускает
+    field = IMAGE_FIELDS[sender]
+    if field in instance.get_deferred_fields():
+        instance._stored_image_name = None
+        return
+    value = instance.__dict__[field]
+    instance._stored_image_name = getattr(value, 'name', value) or ''
+
+
+@receiver(post_save, sender=Recipe)
+@receiver(post_save, sender=User)
+def count_image_references(sender, instance, **kwargs):
+    if instance._stored_image_name is None:
+        return
+    name = getattr(instance, IMAGE_FIELDS[sender]).name or ''
+    if name == instance._stored_image_name:
+        return
+    if name:
+        acquire_blob(name)
+    if instance._stored_image_name:
+        release_blob(instance._stored_image_name)
+    instance._stored_image_name = name
+
+
+@receiver(post_delete, sender=Recipe)
+@receiver(post_delete, sender=User)
+def release_image(sender, instance, **kwargs):
+    if instance._stored_image_name:
+        release_blob(instance._stored_image_name)
+
+
+@receiver(post_delete, sender=Token)
+def invalidate_deleted_token(sender, instance, **kwargs):
+    # выход через djoser token/logout удаляет токены пользователя
+    key = instance.key
+    transaction.on_commit(lambda: invalidate_tokens([key]))
+
+
+@receiver(post_save, sender=User)
+def invalidate_user_auth(sender, instance, update_fields=None, **kwargs):
+    # снимок пользователя в кэше устарел, в том числе при деактивации;
+    # после коммита, чтобы параллельный запрос не закэшировал старую строку
+    if update_fields is not None and set(update_fields) <= {'last_login'}:
+        return
+    user_id = instance.id
+    transaction.on_commit(lambda: invalidate_user_tokens(user_id))
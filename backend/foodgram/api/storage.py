@@ -0,0 +1,69 @@
+import hashlib
+import os
+import posixpath
+import tempfile
+
+from django.core.files import File
+from django.core.files.storage import FileSystemStorage
+from django.utils.deconstruct import deconstructible
+
+HASH_CHUNK_SIZE = 64 * 1024
+BLOB_FILE_MODE = 0o644
+
+
+@deconstructible
+class ContentAddressedStorage(FileSystemStorage):
+    """Файлы именуются по SHA-256 содержимого внутри каталога upload_to:
+    recipes/images/ab/ab12...ef.jpeg. Одинаковые загрузки дают одно имя,
+    поэтому повторная запись пропускается, а файл можно отдавать
+    с бессрочным кэшированием. Удалять файлы нужно через release_blob."""
+
+    def save(self, name, content, max_length=None):
+        if name is None:
+            name = content.name
+        if not hasattr(content, 'chunks'):
+            content = File(content, name)
+        return super().save(self.content_name(name, content), content, max_length)
+
+    def content_name(self, name, content):
+        digest = hashlib.sha256()
+        for chunk in content.chunks(HASH_CHUNK_SIZE):
+            digest.update(chunk if isinstance(chunk, bytes) else chunk.encode())
+        digest = digest.hexdigest()
+        directory = posixpath.dirname(name)
+        extension = posixpath.splitext(name)[1].lower()
+        return posixpath.join(directory, digest[:2], digest + extension)
+
+    def save_derived(self, name, content):
+        """Сохраняет под точным именем файл, однозначно выведенный из
+        другого (например, уменьшенную копию): имя тоже задаёт содержимое."""
+        return self._save(self.generate_filename(name), content)
+
+    def get_available_name(self, name, max_length=None):
+        # имя определяется содержимым, переименовывать при совпадении нельзя
+        return name
+
+    def _save(self, name, content):
+        full_path = self.path(name)
+        if os.path.exists(full_path):
+            return name
+        directory = os.path.dirname(full_path)
+        os.makedirs(directory, exist_ok=True)
+        # запись во временный файл и атомарная замена: одновременная запись
+        # того же содержимого из другого процесса ничего не портит
+        fd, temp_path = tempfile.mkstemp(dir=directory, prefix='.upload-')
+        try:
+            with os.fdopen(fd, 'wb') as file:
+                for chunk in content.chunks():
+                    file.write(chunk if isinstance(chunk, bytes) else chunk.encode())
+            os.chmod(temp_path, self.file_permissions_mode or BLOB_FILE_MODE)
+            os.replace(temp_path, full_path)
+        except BaseException:
+            if os.path.exists(temp_path):
+                os.unlink(temp_path)
+            raise
+        return name
+
+
+content_storage = ContentAddressedStorage()
+
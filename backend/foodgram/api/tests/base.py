@@ -0,0 +1,94 @@
+import base64
+import io
+import shutil
+import tempfile
+
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from PIL import Image
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from api.authentication import local_token_cache
+from api.catalog import ingredient_catalog
+from api.counters import change_counter
+from api.ingredient_index import recipe_ingredient_index
+from api.models import Ingredient, IngredientInRecipe, Recipe, User
+from api.recipe_cache import local_recipe_cache
+from api.short_links import short_link_cache
+
+TEST_CACHES = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+TEST_PASSWORD = 'test-password'
+TEST_IMAGE = 'recipes/images/test.jpeg'
+
+
+def image_bytes(size=(8, 8), image_format='PNG'):
+    buffer = io.BytesIO()
+    Image.new('RGB', size, (200, 120, 60)).save(buffer, image_format)
+    return buffer.getvalue()
+
+
+def base64_image(data=None):
+    return 'data:image/png;base64,' + base64.b64encode(data or image_bytes()).decode()
+
+
+class ApiTestCase(TestCase):
+    """Общий кэш в памяти, пустые кэши процесса перед каждым тестом,
+    загруженные файлы и задачи списков покупок во временном каталоге."""
+
+    @classmethod
+    def setUpClass(cls):
+        media_root = tempfile.mkdtemp(prefix='foodgram-test-')
+        cls.addClassCleanup(shutil.rmtree, media_root, ignore_errors=True)
+        cls.enterClassContext(override_settings(
+            CACHES=TEST_CACHES,
+            MEDIA_ROOT=media_root,
+            SHOPPING_LIST_JOB_ROOT=f'{media_root}/jobs',
+        ))
+        super().setUpClass()
+
+    def setUp(self):
+        cache.clear()
+        local_recipe_cache.clear()
+        local_token_cache.clear()
+        short_link_cache.clear()
+        ingredient_catalog.invalidate()
+        recipe_ingredient_index.invalidate()
+        self.anonymous = APIClient()
+
+    @staticmethod
+    def create_user(username, **fields):
+        return User.objects.create_user(
+            username=username, email=f'{username}@example.com', password=TEST_PASSWORD,
+            first_name=fields.pop('first_name', 'Имя'), last_name=fields.pop('last_name', 'Фамилия'),
+            **fields
+        )
+
+    @staticmethod
+    def create_ingredients(count, prefix='ингредиент'):
+        return Ingredient.objects.bulk_create([
+            Ingredient(name=f'{prefix} {number}', measurement_unit='г')
+            for number in range(count)
+        ])
+
+    @staticmethod
+    def create_recipe(author, name='Рецепт', text='Описание', ingredients=(), amount=1):
+        # варианты изображения считаются готовыми, пул процессов не нужен
+        recipe = Recipe.objects.create(
+            author=author, name=name, text=text, cooking_time=10,
+            image=TEST_IMAGE, image_variants={'source': TEST_IMAGE}
+        )
+        IngredientInRecipe.objects.bulk_create([
+            IngredientInRecipe(recipe=recipe, ingredient=ingredient, amount=amount)
+            for ingredient in ingredients
+        ])
+        change_counter(User, author.pk, 'recipes_count', 1)
+        return recipe
+
+    @staticmethod
+    def token_client(user):
+        """Клиент с настоящим токеном: запросы идут через
+        CachedTokenAuthentication, а не force_authenticate."""
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f'Token {Token.objects.create(user=user).key}')
+        return client
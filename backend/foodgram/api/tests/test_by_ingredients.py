@@ -0,0 +1,44 @@
+from .base import ApiTestCase
+
+
+class RecipesByIngredientsTests(ApiTestCase):
+    """«Что приготовить»: рецепты по доле имеющихся ингредиентов."""
+    URL = '/api/recipes/by_ingredients/'
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = cls.create_user('author')
+        cls.salt, cls.flour, cls.milk, cls.eggs = cls.create_ingredients(4)
+        cls.bread = cls.create_recipe(cls.author, name='Хлеб', ingredients=[cls.salt, cls.flour])
+        cls.pancakes = cls.create_recipe(
+            cls.author, name='Блины', ingredients=[cls.flour, cls.milk, cls.eggs]
+        )
+
+    def search(self, *ingredients):
+        response = self.anonymous.get(self.URL, {'ingredients': ','.join(str(i.id) for i in ingredients)})
+        self.assertEqual(response.status_code, 200)
+        return [(recipe['id'], recipe['matched'], recipe['total']) for recipe in response.data]
+
+    def test_ranked_by_coverage(self):
+        self.assertEqual(self.search(self.flour, self.milk), [
+            (self.pancakes.id, 2, 3), (self.bread.id, 1, 2),
+        ])
+        self.assertEqual(self.search(self.salt), [(self.bread.id, 1, 2)])
+
+    def test_index_follows_changes(self):
+        self.search(self.salt)
+        client = self.token_client(self.author)
+        with self.captureOnCommitCallbacks(execute=True):
+            client.patch(
+                f'/api/recipes/{self.pancakes.id}/',
+                {'ingredients': [{'id': self.salt.id, 'amount': 1}]}, format='json'
+            )
+        self.assertEqual(self.search(self.salt), [(self.pancakes.id, 1, 1), (self.bread.id, 1, 2)])
+        with self.captureOnCommitCallbacks(execute=True):
+            client.delete(f'/api/recipes/{self.bread.id}/')
+        self.assertEqual(self.search(self.salt), [(self.pancakes.id, 1, 1)])
+
+    def test_invalid_parameter(self):
+        response = self.anonymous.get(self.URL, {'ingredients': 'соль'})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('error', response.data)
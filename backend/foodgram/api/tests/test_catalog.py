@@ -0,0 +1,32 @@
+from api.catalog import get_catalog_version
+from api.models import Ingredient
+
+from .base import ApiTestCase
+
+
+class IngredientCatalogTests(ApiTestCase):
+    """Справочник ингредиентов отдаётся из памяти процесса и меняет
+    версию только после коммита."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.create_ingredients(3, prefix='соль')
+        Ingredient.objects.create(name='морская соль', measurement_unit='г')
+
+    def test_search_from_memory(self):
+        self.anonymous.get('/api/ingredients/')
+        with self.assertNumQueries(0):
+            response = self.anonymous.get('/api/ingredients/?name=сол')
+        names = [row['name'] for row in response.data]
+        # сначала совпадения с начала названия, потом вхождения
+        self.assertEqual(names, ['соль 0', 'соль 1', 'соль 2', 'морская соль'])
+
+    def test_version_changes_after_commit(self):
+        self.anonymous.get('/api/ingredients/')
+        version = get_catalog_version()
+        with self.captureOnCommitCallbacks(execute=True):
+            Ingredient.objects.create(name='сольвей', measurement_unit='г')
+            self.assertEqual(get_catalog_version(), version)
+        self.assertNotEqual(get_catalog_version(), version)
+        names = [row['name'] for row in self.anonymous.get('/api/ingredients/?name=сольв').data]
+        self.assertEqual(names, ['сольвей'])
@@ -0,0 +1,99 @@
+import io
+import json
+import tempfile
+from pathlib import Path
+
+from django.core.management import CommandError, call_command
+from django.db.models import Count
+
+from api.catalog import ingredient_catalog
+from api.models import Favorite, Ingredient, Recipe, RecipeRanking, ShoppingCart, User
+
+from .base import ApiTestCase
+
+
+class CommandTestCase(ApiTestCase):
+
+    def setUp(self):
+        super().setUp()
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = Path(directory.name)
+
+    def write(self, name, content):
+        path = self.directory / name
+        path.write_text(content, encoding='utf-8')
+        return str(path)
+
+    def call(self, *args, **options):
+        call_command(*args, stdout=io.StringIO(), **options)
+
+
+class LoadIngredientsTests(CommandTestCase):
+    """Загрузка справочника: CSV и JSON, без дублей при повторе."""
+
+    def test_csv_and_json(self):
+        csv_path = self.write('ingredients.csv', 'соль,г\n\nмука,г\nсоль,г\n"сахар, песок",г\n')
+        json_path = self.write('ingredients.json', json.dumps([
+            {'name': 'мука', 'measurement_unit': 'г'},
+            {'model': 'api.ingredient', 'fields': {'name': 'молоко', 'measurement_unit': 'мл'}},
+        ], ensure_ascii=False))
+        self.call('load_ingredients', csv_path, json_path, batch_size=2)
+        self.call('load_ingredients', csv_path, json_path)
+        self.assertEqual(
+            sorted(Ingredient.objects.values_list('name', 'measurement_unit')),
+            [('молоко', 'мл'), ('мука', 'г'), ('сахар, песок', 'г'), ('соль', 'г')]
+        )
+        # каталог в памяти видит загруженные строки
+        self.assertEqual(len(ingredient_catalog.ids()), 4)
+
+    def test_invalid_files(self):
+        with self.assertRaises(CommandError):
+            self.call('load_ingredients', self.write('bad.csv', 'соль,г,лишнее\n'))
+        with self.assertRaises(CommandError):
+            self.call('load_ingredients', self.write('bad.json', '{"name": "соль"}'))
+        with self.assertRaises(CommandError):
+            self.call('load_ingredients', self.write('ingredients.xml', ''))
+        self.assertFalse(Ingredient.objects.exists())
+
+
+class GenerateDataTests(CommandTestCase):
+    """Синтетические данные: воспроизводимы по зерну, счётчики и
+    рейтинги согласованы со связями."""
+
+    def generate(self, prefix, seed=1):
+        ingredients = self.write('ingredients.csv', ''.join(f'ингредиент {i},г\n' for i in range(30)))
+        self.call(
+            'generate_data', users=6, recipes=12, favorites=3, carts=2, follows=2,
+            seed=seed, prefix=prefix, ingredients_file=ingredients
+        )
+
+    def snapshot(self, prefix):
+        users = User.objects.filter(username__startswith=f'{prefix}-')
+        return (
+            sorted(Recipe.objects.filter(author__in=users).values_list('author__username', 'name')),
+            sorted(Favorite.objects.filter(user__in=users).values_list('user__username', 'recipe__name')),
+        )
+
+    def test_generate(self):
+        self.generate('first')
+        self.assertEqual(User.objects.filter(username__startswith='first-').count(), 6)
+        self.assertEqual(Recipe.objects.count(), 12)
+        self.assertEqual(RecipeRanking.objects.count(), 12)
+        for recipe in Recipe.objects.annotate(
+                favorites=Count('favorited_by', distinct=True),
+                carts=Count('in_shopping_carts', distinct=True)):
+            self.assertEqual(
+                (recipe.favorites_count, recipe.in_carts_count), (recipe.favorites, recipe.carts)
+            )
+        self.assertTrue(ShoppingCart.objects.exists())
+        with self.assertRaises(CommandError):
+            self.generate('first')
+
+    def test_same_seed_same_data(self):
+        self.generate('first')
+        first = self.snapshot('first')
+        Recipe.objects.all().delete()
+        User.objects.all().delete()
+        self.generate('first')
+        self.assertEqual(self.snapshot('first'), first)
@@ -0,0 +1,49 @@
+from .base import ApiTestCase
+
+
+class ConditionalListTests(ApiTestCase):
+    """ETag списков, пользователей и ингредиентов: 304 при неизменных
+    данных и новый ETag после изменения, видного в ответе."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = cls.create_user('author')
+        cls.user = cls.create_user('user')
+        cls.recipe = cls.create_recipe(cls.author)
+        cls.create_ingredients(2)
+
+    def setUp(self):
+        super().setUp()
+        self.client = self.token_client(self.user)
+
+    def assertNotModified(self, url, client=None):
+        client = client or self.client
+        response = client.get(url)
+        self.assertEqual(response.status_code, 200)
+        etag = response['ETag']
+        response = client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertFalse(response.content)
+        return etag
+
+    def test_recipe_list(self):
+        etag = self.assertNotModified('/api/recipes/')
+        self.assertTrue(etag.startswith('W/'))
+        self.client.post(f'/api/recipes/{self.recipe.id}/favorite/')
+        response = self.client.get('/api/recipes/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.data['results'][0]['is_favorited'])
+        self.assertNotModified('/api/recipes/', self.anonymous)
+
+    def test_user_detail(self):
+        url = f'/api/users/{self.author.id}/'
+        etag = self.assertNotModified(url)
+        self.client.post(f'/api/users/{self.author.id}/subscribe/')
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.data['is_subscribed'])
+
+    def test_ingredients(self):
+        etag = self.assertNotModified('/api/ingredients/', self.anonymous)
+        ingredient_etag = self.assertNotModified('/api/ingredients/1/', self.anonymous)
+        self.assertEqual(ingredient_etag, etag)
@@ -0,0 +1,92 @@
+from api.models import Favorite, Recipe, RecipeRanking, ShoppingCart
+
+from .base import ApiTestCase
+
+# погрешность вычислений с плавающей точкой в БД
+SCORE_TOLERANCE = 1e-9
+
+
+class EngagementTests(ApiTestCase):
+    """Избранное и корзина: счётчики рецепта и рейтинги меняются только
+    при реальном изменении связи, отмена события вычитается из рейтинга."""
+    LOOPS = 5
+
+    @classmethod
+    def setUpTestData(cls):
+        author = cls.create_user('author')
+        cls.user = cls.create_user('user')
+        cls.recipes = [cls.create_recipe(author, name=f'Рецепт {number}') for number in range(3)]
+
+    def setUp(self):
+        super().setUp()
+        self.client = self.token_client(self.user)
+        self.recipe = self.recipes[0]
+
+    def scores(self, recipe):
+        ranking = RecipeRanking.objects.get(recipe=recipe)
+        return ranking.popular_score, ranking.trending_score
+
+    def counters(self, recipe):
+        return Recipe.objects.values_list('favorites_count', 'in_carts_count').get(pk=recipe.pk)
+
+    def assertScoresNotAbove(self, scores, limit):
+        for score, bound in zip(scores, limit):
+            self.assertLessEqual(score, bound + SCORE_TOLERANCE)
+
+    def test_favorite(self):
+        url = f'/api/recipes/{self.recipe.id}/favorite/'
+        initial = self.scores(self.recipe)
+        self.assertEqual(self.client.post(url).status_code, 201)
+        self.assertEqual(self.client.post(url).status_code, 400)
+        self.assertEqual(self.counters(self.recipe), (1, 0))
+        popular, trending = self.scores(self.recipe)
+        self.assertGreater(popular, initial[0])
+        self.assertGreater(trending, initial[1])
+
+        self.assertEqual(self.client.delete(url).status_code, 204)
+        self.assertEqual(self.client.delete(url).status_code, 400)
+        self.assertEqual(self.counters(self.recipe), (0, 0))
+        self.assertFalse(Favorite.objects.exists())
+        self.assertScoresNotAbove(self.scores(self.recipe), initial)
+
+    def test_missing_recipe(self):
+        self.assertEqual(self.client.post('/api/recipes/999999/favorite/').status_code, 404)
+        self.assertEqual(self.client.delete('/api/recipes/999999/shopping_cart/').status_code, 404)
+
+    def test_toggle_loop_does_not_inflate_ranking(self):
+        initial = self.scores(self.recipe)
+        for resource in ('favorite', 'shopping_cart'):
+            url = f'/api/recipes/{self.recipe.id}/{resource}/'
+            for _ in range(self.LOOPS):
+                self.client.post(url)
+                self.client.delete(url)
+        self.assertEqual(self.counters(self.recipe), (0, 0))
+        self.assertScoresNotAbove(self.scores(self.recipe), initial)
+
+    def test_batch(self):
+        ids = [recipe.id for recipe in self.recipes]
+        self.client.post(f'/api/recipes/{ids[0]}/shopping_cart/')
+        initial = {recipe.id: self.scores(recipe) for recipe in self.recipes}
+
+        response = self.client.post('/api/recipes/shopping_cart/', {'ids': [*ids, ids[1], 999999]}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            [(row['id'], row['status']) for row in response.data['results']],
+            [(ids[0], 'exists'), (ids[1], 'added'), (ids[2], 'added'), (999999, 'not_found')]
+        )
+        self.assertEqual([recipe['id'] for recipe in response.data['recipes']], ids)
+        self.assertEqual(ShoppingCart.objects.filter(user=self.user).count(), 3)
+        self.assertEqual([self.counters(recipe)[1] for recipe in self.recipes], [1, 1, 1])
+
+        response = self.client.delete('/api/recipes/shopping_cart/', {'ids': ids[1:]}, format='json')
+        self.assertEqual(
+            [row['status'] for row in response.data['results']], ['removed', 'removed']
+        )
+        self.assertEqual([self.counters(recipe)[1] for recipe in self.recipes], [1, 0, 0])
+        for recipe in self.recipes:
+            self.assertScoresNotAbove(self.scores(recipe), initial[recipe.id])
+
+    def test_batch_validation(self):
+        response = self.client.post('/api/recipes/favorite/', {'ids': 'one'}, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(Favorite.objects.exists())
@@ -0,0 +1,137 @@
+import base64
+import io
+from unittest import mock
+
+from PIL import Image
+
+from api.models import ImageBlob, Recipe
+from api.storage import content_storage
+
+from .base import ApiTestCase, base64_image, image_bytes
+
+
+def gradient_bytes(image_format):
+    # градиент плохо сжимается: данные пикселей занимают почти весь файл
+    buffer = io.BytesIO()
+    Image.linear_gradient('L').convert('RGB').save(buffer, image_format)
+    return buffer.getvalue()
+
+
+def data_uri(data, subtype):
+    return f'data:image/{subtype};base64,' + base64.b64encode(data).decode()
+
+
+class ImageValidationTests(ApiTestCase):
+    """Повреждённое изображение отклоняется в запросе, ничего не сохраняя."""
+
+    def setUp(self):
+        super().setUp()
+        self.user = self.create_user('user')
+        self.client = self.token_client(self.user)
+        self.ingredient, = self.create_ingredients(1)
+
+    def create_recipe_with(self, image):
+        return self.client.post('/api/recipes/', {
+            'name': 'Рецепт', 'text': 'Описание', 'cooking_time': 10, 'image': image,
+            'ingredients': [{'id': self.ingredient.id, 'amount': 1}],
+        }, format='json')
+
+    def test_valid_image(self):
+        response = self.create_recipe_with(base64_image())
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(ImageBlob.objects.get().references, 1)
+
+    def test_corrupted_images(self):
+        png = gradient_bytes('PNG')
+        jpeg = gradient_bytes('JPEG')
+        # последние байты данных PNG испорчены, заголовок и размер целы
+        broken_png = png[:-40] + bytes(byte ^ 0xFF for byte in png[-40:-12]) + png[-12:]
+        images = {
+            'truncated png': data_uri(png[:len(png) // 2], 'png'),
+            'broken png': data_uri(broken_png, 'png'),
+            'truncated jpeg': data_uri(jpeg[:len(jpeg) // 2], 'jpeg'),
+            'not an image': data_uri(b'plain text', 'png'),
+        }
+        for case, image in images.items():
+            with self.subTest(case):
+                response = self.create_recipe_with(image)
+                self.assertEqual(response.status_code, 400)
+                self.assertIn('image', response.data)
+        self.assertFalse(Recipe.objects.exists())
+        self.assertFalse(ImageBlob.objects.exists())
+
+    def test_truncated_avatar(self):
+        png = image_bytes(size=(64, 64))
+        response = self.client.put(
+            '/api/users/me/avatar/', {'avatar': base64_image(png[:len(png) - 20])}, format='json'
+        )
+        self.assertEqual(response.status_code, 400)
+        self.user.refresh_from_db()
+        self.assertFalse(self.user.avatar)
+
+
+class ImageBlobTests(ApiTestCase):
+    """Одинаковые загрузки хранятся одним файлом со счётчиком ссылок;
+    файл удаляется вместе с последней ссылкой после коммита."""
+
+    def setUp(self):
+        super().setUp()
+        # варианты не нужны, а процессы пула не видят MEDIA_ROOT теста
+        patcher = mock.patch('api.signals.schedule_image_variants')
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.user = self.create_user('user')
+        self.client = self.token_client(self.user)
+        self.ingredient, = self.create_ingredients(1)
+
+    def create_recipe_with(self, image):
+        response = self.client.post('/api/recipes/', {
+            'name': 'Рецепт', 'text': 'Описание', 'cooking_time': 10, 'image': image,
+            'ingredients': [{'id': self.ingredient.id, 'amount': 1}],
+        }, format='json')
+        self.assertEqual(response.status_code, 201)
+        return Recipe.objects.get(pk=response.data['id'])
+
+    def delete_recipe(self, recipe):
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.delete(f'/api/recipes/{recipe.id}/')
+        self.assertEqual(response.status_code, 204)
+
+    def test_shared_file(self):
+        first = self.create_recipe_with(base64_image())
+        second = self.create_recipe_with(base64_image())
+        name = first.image.name
+        self.assertEqual(second.image.name, name)
+        self.assertEqual(ImageBlob.objects.get(name=name).references, 2)
+
+        self.delete_recipe(first)
+        self.assertEqual(ImageBlob.objects.get(name=name).references, 1)
+        self.assertTrue(content_storage.exists(name))
+
+        self.delete_recipe(second)
+        self.assertFalse(ImageBlob.objects.exists())
+        self.assertFalse(content_storage.exists(name))
+
+    def avatar_name(self):
+        self.user.refresh_from_db()
+        return self.user.avatar.name
+
+    def test_replaced_avatar(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.put('/api/users/me/avatar/', {'avatar': base64_image()}, format='json')
+        old = self.avatar_name()
+        self.assertEqual(ImageBlob.objects.get(name=old).references, 1)
+
+        # новый аватар освобождает ссылку на старый файл
+        other = base64_image(image_bytes(size=(16, 16)))
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.put('/api/users/me/avatar/', {'avatar': other}, format='json')
+        new = self.avatar_name()
+        self.assertNotEqual(new, old)
+        self.assertEqual(list(ImageBlob.objects.values_list('name', flat=True)), [new])
+        self.assertFalse(content_storage.exists(old))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(self.client.delete('/api/users/me/avatar/').status_code, 204)
+        self.assertFalse(ImageBlob.objects.exists())
+        self.assertFalse(content_storage.exists(new))
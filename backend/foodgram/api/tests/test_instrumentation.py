@@ -0,0 +1,52 @@
+from unittest import mock
+
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+from api.instrumentation import RequestStats
+from api.models import ShoppingCart
+
+from .base import TEST_PASSWORD, ApiTestCase
+
+
+class RequestTimingTests(ApiTestCase):
+    """Статистика по маршрутам: метки без якорей регулярных выражений
+    и все SQL-запросы, включая выполненные при отдаче потокового тела."""
+
+    def setUp(self):
+        super().setUp()
+        self.stats = RequestStats()
+        patcher = mock.patch('api.instrumentation.request_stats', self.stats)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.user = self.create_user('user')
+        self.client = self.token_client(self.user)
+
+    def route_stats(self, route):
+        return self.stats._routes[route]
+
+    def test_router_route_label(self):
+        response = self.client.post(
+            '/api/users/set_password/',
+            {'current_password': TEST_PASSWORD, 'new_password': 'another-password-42'},
+            format='json'
+        )
+        self.assertEqual(response.status_code, 204)
+        self.assertEqual(list(self.stats._routes), ['POST /api/users/set_password/'])
+
+    def test_streaming_queries(self):
+        author = self.create_user('author')
+        ingredients = self.create_ingredients(3)
+        recipe = self.create_recipe(author, ingredients=ingredients)
+        ShoppingCart.objects.create(user=self.user, recipe=recipe)
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get('/api/recipes/download_shopping_cart/', {'file_format': 'csv'})
+            self.assertIn('before streaming', response['Server-Timing'])
+            # до отдачи тела статистика ещё не записана
+            self.assertEqual(self.stats._routes, {})
+            body = b''.join(response.streaming_content)
+        self.assertIn('ингредиент 0'.encode(), body)
+        stats = self.route_stats('GET /api/recipes/download_shopping_cart/')
+        self.assertEqual(stats['count'], 1)
+        self.assertEqual(stats['queries'], len(queries))
@@ -0,0 +1,40 @@
+from api.models import RecipeRanking
+
+from .base import ApiTestCase
+
+
+class CursorPaginationTests(ApiTestCase):
+    """Keyset-пагинация ленты: каждая запись ровно один раз даже при
+    равных значениях поля курсора."""
+    RECIPES = 7
+    PAGE_SIZE = 2
+
+    @classmethod
+    def setUpTestData(cls):
+        author = cls.create_user('author')
+        cls.recipe_ids = [
+            cls.create_recipe(author, name=f'Рецепт {number}').id
+            for number in range(cls.RECIPES)
+        ]
+
+    def collect_pages(self, url):
+        ids = []
+        while url:
+            response = self.anonymous.get(url)
+            self.assertEqual(response.status_code, 200)
+            ids.extend(recipe['id'] for recipe in response.data['results'])
+            url = response.data['next']
+        return ids
+
+    def test_default_ordering(self):
+        ids = self.collect_pages(f'/api/recipes/?pagination=cursor&limit={self.PAGE_SIZE}')
+        self.assertEqual(ids, sorted(self.recipe_ids, reverse=True))
+
+    def test_tied_ranking(self):
+        RecipeRanking.objects.update(popular_score=1.0, trending_score=1.0)
+        for ordering in ('popular', 'trending'):
+            with self.subTest(ordering=ordering):
+                ids = self.collect_pages(
+                    f'/api/recipes/?ordering={ordering}&pagination=cursor&limit={self.PAGE_SIZE}'
+                )
+                self.assertEqual(ids, sorted(self.recipe_ids, reverse=True))
@@ -0,0 +1,55 @@
+from rest_framework.test import APIClient
+
+from api.models import Favorite, Follow, ShoppingCart
+
+from .base import ApiTestCase
+
+PAGE_SIZES = (2, 6)
+RECIPES_PER_AUTHOR = 2
+AUTHORS = 6
+
+
+class QueryCountTests(ApiTestCase):
+    """Число SQL-запросов списков не зависит от размера страницы."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.reader = cls.create_user('reader')
+        ingredients = cls.create_ingredients(4)
+        for number in range(AUTHORS):
+            author = cls.create_user(f'author{number}')
+            Follow.objects.create(user=cls.reader, author=author)
+            for index in range(RECIPES_PER_AUTHOR):
+                recipe = cls.create_recipe(
+                    author, f'Рецепт {number}-{index}', ingredients=ingredients, amount=index + 1
+                )
+                Favorite.objects.create(user=cls.reader, recipe=recipe)
+                ShoppingCart.objects.create(user=cls.reader, recipe=recipe)
+
+    def setUp(self):
+        super().setUp()
+        self.client = APIClient()
+        self.client.force_authenticate(self.reader)
+        # справочник ингредиентов загружается один раз на процесс
+        self.anonymous.get('/api/ingredients/')
+
+    def assertConstantQueries(self, client, url, queries):
+        for limit in PAGE_SIZES:
+            with self.subTest(url=url, limit=limit), self.assertNumQueries(queries):
+                response = client.get(url.format(limit=limit))
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual(len(response.data['results']), limit)
+
+    def test_recipe_list(self):
+        self.assertConstantQueries(self.anonymous, '/api/recipes/?limit={limit}', 3)
+        self.assertConstantQueries(self.client, '/api/recipes/?limit={limit}', 3)
+
+    def test_recipe_feed(self):
+        self.assertConstantQueries(
+            self.client, '/api/recipes/?pagination=cursor&limit={limit}', 2
+        )
+
+    def test_subscriptions(self):
+        self.assertConstantQueries(
+            self.client, '/api/users/subscriptions/?limit={limit}&recipes_limit=3', 3
+        )
@@ -0,0 +1,57 @@
+from django.core.cache import cache
+
+from api.recipe_cache import recipe_version_key
+
+from .base import ApiTestCase
+
+MISSING_PK = 999_999
+
+
+class RecipeDetailConditionalTests(ApiTestCase):
+    """ETag и 304 у карточки рецепта."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = cls.create_user('author')
+        cls.reader = cls.create_user('reader')
+        cls.recipe = cls.create_recipe(cls.author, ingredients=cls.create_ingredients(2))
+
+    def setUp(self):
+        super().setUp()
+        self.url = f'/api/recipes/{self.recipe.pk}/'
+
+    def test_not_modified_without_queries(self):
+        response = self.anonymous.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        with self.assertNumQueries(0):
+            response = self.anonymous.get(self.url, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, 304)
+
+    def test_etag_changes_after_update(self):
+        etag = self.anonymous.get(self.url)['ETag']
+        with self.captureOnCommitCallbacks(execute=True):
+            self.recipe.name = 'Новое название'
+            self.recipe.save()
+        response = self.anonymous.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['name'], 'Новое название')
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_missing_recipe(self):
+        etag = self.anonymous.get(self.url)['ETag']
+        clients = (self.anonymous, self.token_client(self.reader))
+        for client in clients:
+            for headers in ({}, {'HTTP_IF_NONE_MATCH': '*'}, {'HTTP_IF_NONE_MATCH': etag}):
+                with self.subTest(client=client, headers=headers):
+                    response = client.get(f'/api/recipes/{MISSING_PK}/', **headers)
+                    self.assertEqual(response.status_code, 404)
+        self.assertIsNone(cache.get(recipe_version_key(MISSING_PK)))
+
+    def test_deleted_recipe(self):
+        etag = self.anonymous.get(self.url)['ETag']
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.token_client(self.author).delete(self.url)
+        self.assertEqual(response.status_code, 204)
+        for headers in ({}, {'HTTP_IF_NONE_MATCH': '*'}, {'HTTP_IF_NONE_MATCH': etag}):
+            with self.subTest(headers=headers), self.assertNumQueries(0):
+                self.assertEqual(self.anonymous.get(self.url, **headers).status_code, 404)
@@ -0,0 +1,66 @@
+from api.models import IngredientInRecipe
+
+from .base import ApiTestCase, base64_image
+
+
+class RecipeWriteTests(ApiTestCase):
+    """Проверка ингредиентов по справочнику в памяти и обновление строк
+    рецепта по разнице с присланным составом."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = cls.create_user('author')
+        cls.ingredients = cls.create_ingredients(4)
+
+    def setUp(self):
+        super().setUp()
+        self.client = self.token_client(self.author)
+
+    def test_invalid_ingredients(self):
+        first, second, *_ = self.ingredients
+        response = self.client.post('/api/recipes/', {
+            'name': 'Рецепт', 'text': 'Описание', 'cooking_time': 10, 'image': base64_image(),
+            'ingredients': [
+                {'id': first.id, 'amount': 1},
+                {'id': 999_999, 'amount': 1},
+                {'id': second.id, 'amount': 1},
+                {'id': first.id, 'amount': 2},
+            ],
+        }, format='json')
+        self.assertEqual(response.status_code, 400)
+        errors = response.data['ingredients']
+        self.assertEqual(errors[0], {})
+        self.assertIn('999999', str(errors[1]['id'][0]))
+        self.assertEqual(errors[2], {})
+        self.assertIn('несколько раз', str(errors[3]['id'][0]))
+
+    def test_update_by_diff(self):
+        kept, changed, removed, added = self.ingredients
+        recipe = self.create_recipe(self.author, ingredients=[kept, changed, removed])
+        rows = dict(IngredientInRecipe.objects.filter(recipe=recipe).values_list('ingredient_id', 'id'))
+
+        response = self.client.patch(f'/api/recipes/{recipe.id}/', {'ingredients': [
+            {'id': kept.id, 'amount': 1},
+            {'id': changed.id, 'amount': 5},
+            {'id': added.id, 'amount': 2},
+        ]}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            {(item['id'], item['amount']) for item in response.data['ingredients']},
+            {(kept.id, 1), (changed.id, 5), (added.id, 2)}
+        )
+        stored = {
+            ingredient_id: row_id
+            for ingredient_id, row_id in IngredientInRecipe.objects.filter(recipe=recipe)
+            .values_list('ingredient_id', 'id')
+        }
+        # неизменные и изменённые строки остаются на месте
+        self.assertEqual(stored[kept.id], rows[kept.id])
+        self.assertEqual(stored[changed.id], rows[changed.id])
+        self.assertNotIn(removed.id, stored)
+
+    def test_update_requires_ingredients(self):
+        recipe = self.create_recipe(self.author, ingredients=self.ingredients[:1])
+        response = self.client.patch(f'/api/recipes/{recipe.id}/', {'name': 'Другое'}, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('ingredients', response.data)
@@ -0,0 +1,50 @@
+from .base import ApiTestCase
+
+
+class RecipeSearchTests(ApiTestCase):
+    """Полнотекстовый поиск по названию и описанию рецептов."""
+    TIED_RECIPES = 5
+    PAGE_SIZE = 2
+
+    @classmethod
+    def setUpTestData(cls):
+        author = cls.create_user('author')
+        cls.tied_ids = [
+            cls.create_recipe(author, name='Борщ', text='Свекла и капуста').id
+            for _ in range(cls.TIED_RECIPES)
+        ]
+        cls.text_match = cls.create_recipe(author, name='Щи', text='Почти борщ, только без свеклы')
+        cls.create_recipe(author, name='Оладьи', text='Мука и кефир')
+
+    def search(self, query):
+        response = self.anonymous.get('/api/recipes/', {'search': query})
+        self.assertEqual(response.status_code, 200)
+        return [recipe['id'] for recipe in response.data['results']]
+
+    def test_name_ranks_above_text(self):
+        ids = self.search('борщ')
+        self.assertEqual(set(ids), {*self.tied_ids, self.text_match.id})
+        self.assertEqual(ids[-1], self.text_match.id)
+
+    def test_all_words_must_match(self):
+        self.assertEqual(self.search('борщ кефир'), [])
+        self.assertEqual(self.search('"'), [])
+
+    def test_search_is_updated_on_save(self):
+        self.text_match.name = 'Кефирные щи'
+        self.text_match.save()
+        self.assertIn(self.text_match.id, self.search('кефирные'))
+
+    def test_cursor_over_tied_ranks(self):
+        ids = []
+        response = self.anonymous.get('/api/recipes/', {
+            'search': 'свекла капуста', 'pagination': 'cursor', 'limit': self.PAGE_SIZE
+        })
+        while True:
+            self.assertEqual(response.status_code, 200)
+            ids.extend(recipe['id'] for recipe in response.data['results'])
+            if response.data['next'] is None:
+                break
+            response = self.anonymous.get(response.data['next'])
+        # ранги равны, порядок задаёт -id, повторов и пропусков нет
+        self.assertEqual(ids, sorted(self.tied_ids, reverse=True))
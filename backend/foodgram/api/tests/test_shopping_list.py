@@ -0,0 +1,98 @@
+import csv
+import io
+import time
+
+from api.counters import change_counters
+from api.models import Recipe, ShoppingCart
+
+from .base import ApiTestCase
+
+# сколько ждать документ из пула процессов, в секундах
+JOB_WAIT_TIMEOUT = 60
+JOB_POLL_INTERVAL = 0.1
+
+
+class ShoppingListTests(ApiTestCase):
+    """Скачивание списка покупок: потоковые форматы, кэш по версии
+    корзины и фоновая сборка документа."""
+    URL = '/api/recipes/download_shopping_cart/'
+
+    @classmethod
+    def setUpTestData(cls):
+        author = cls.create_user('author')
+        cls.user = cls.create_user('user')
+        cls.salt, cls.flour, cls.milk = cls.create_ingredients(3)
+        cls.bread = cls.create_recipe(author, name='Хлеб', ingredients=[cls.salt, cls.flour], amount=2)
+        cls.pancakes = cls.create_recipe(author, name='Блины', ingredients=[cls.flour, cls.milk], amount=3)
+        ShoppingCart.objects.create(user=cls.user, recipe=cls.bread)
+        ShoppingCart.objects.create(user=cls.user, recipe=cls.pancakes)
+        change_counters(Recipe, [cls.bread.id, cls.pancakes.id], 'in_carts_count', 1)
+
+    def setUp(self):
+        super().setUp()
+        self.client = self.token_client(self.user)
+
+    def download(self, file_format, client=None):
+        response = (client or self.client).get(self.URL, {'file_format': file_format})
+        self.assertEqual(response.status_code, 200)
+        return b''.join(response.streaming_content)
+
+    def rows(self):
+        return list(csv.reader(io.StringIO(self.download('csv').decode())))
+
+    def test_formats(self):
+        self.assertEqual(self.rows(), [
+            ['Ингредиент', 'Количество', 'Единица измерения'],
+            ['ингредиент 0', '2', 'г'],
+            ['ингредиент 1', '5', 'г'],
+            ['ингредиент 2', '3', 'г'],
+        ])
+        self.assertIn('ингредиент 1: 5 г', self.download('txt').decode())
+        self.assertTrue(self.download('pdf').startswith(b'%PDF'))
+        response = self.client.get(self.URL, {'file_format': 'docx'})
+        self.assertEqual(response.status_code, 400)
+
+    def test_cached_until_cart_changes(self):
+        self.download('csv')
+        # остаётся только проверка токена
+        with self.assertNumQueries(0):
+            self.download('csv')
+        self.client.delete(f'/api/recipes/{self.pancakes.id}/shopping_cart/')
+        self.assertEqual(self.rows()[1:], [['ингредиент 0', '2', 'г'], ['ингредиент 1', '2', 'г']])
+
+    def test_cached_until_recipe_changes(self):
+        self.download('csv')
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.token_client(self.bread.author).patch(
+                f'/api/recipes/{self.bread.id}/',
+                {'ingredients': [{'id': self.salt.id, 'amount': 7}]}, format='json'
+            )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.rows()[1:], [
+            ['ингредиент 0', '7', 'г'], ['ингредиент 1', '3', 'г'], ['ингредиент 2', '3', 'г'],
+        ])
+
+    def wait_for_job(self, url):
+        deadline = time.monotonic() + JOB_WAIT_TIMEOUT
+        while time.monotonic() < deadline:
+            response = self.client.get(url)
+            if response.status_code != 202:
+                return response
+            time.sleep(JOB_POLL_INTERVAL)
+        self.fail(f'Job {url} was not finished in {JOB_WAIT_TIMEOUT} s')
+
+    def test_async_job(self):
+        response = self.client.get(self.URL, {'file_format': 'txt', 'mode': 'async'})
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual(response['Location'], response.data['url'])
+        url = response.data['url']
+
+        response = self.wait_for_job(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('ингредиент 1: 5 г', b''.join(response.streaming_content).decode())
+
+        # чужая задача и неверный id неотличимы от несуществующей
+        other = self.token_client(self.create_user('other'))
+        self.assertEqual(other.get(url).status_code, 404)
+        self.assertEqual(self.client.get(f'{self.URL}{"0" * 32}/').status_code, 404)
+        self.assertEqual(self.client.get(f'{self.URL}..%2Fsecret/').status_code, 404)
@@ -0,0 +1,37 @@
+from api.models import ShortLink
+from api.short_links import click_buffer
+
+from .base import ApiTestCase
+
+
+class ShortLinkTests(ApiTestCase):
+    """Короткая ссылка создаётся один раз, переход ведёт на рецепт,
+    переходы пишутся в БД пачкой."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.recipe = cls.create_recipe(cls.create_user('author'))
+
+    def get_link(self, recipe_id):
+        return self.anonymous.get(f'/api/recipes/{recipe_id}/get-link/')
+
+    def test_link_and_redirect(self):
+        link = self.get_link(self.recipe.id).data['short-link']
+        self.assertEqual(self.get_link(self.recipe.id).data['short-link'], link)
+        self.assertEqual(ShortLink.objects.count(), 1)
+
+        code = link.rsplit('/', 1)[1]
+        # переход только увеличивает счётчик в памяти
+        click_buffer.flush()
+        with self.assertNumQueries(0):
+            response = self.anonymous.get(f'/s/{code}')
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(response['Location'], f'/recipes/{self.recipe.id}')
+
+        click_buffer.flush()
+        self.assertEqual(ShortLink.objects.get().clicks, 1)
+
+    def test_missing(self):
+        self.assertEqual(self.get_link(999_999).status_code, 404)
+        self.assertFalse(ShortLink.objects.exists())
+        self.assertEqual(self.anonymous.get('/s/zzzz').status_code, 404)
@@ -0,0 +1,73 @@
+from django.core.cache import cache
+
+from api.authentication import local_token_cache, token_cache_key
+from api.models import User
+
+from .base import TEST_PASSWORD, ApiTestCase, base64_image
+
+
+class CachedUserWriteTests(ApiTestCase):
+    """request.user — снимок из кэша токенов; запись пользователя не должна
+    возвращать в БД счётчики из этого снимка."""
+
+    def setUp(self):
+        super().setUp()
+        self.user = self.create_user('writer')
+        self.client = self.token_client(self.user)
+        # снимок пользователя попадает в кэш токенов
+        self.assertEqual(self.client.get('/api/users/me/').status_code, 200)
+        User.objects.filter(pk=self.user.pk).update(recipes_count=7, subscribers_count=42)
+
+    def assertCountersKept(self):
+        self.assertEqual(
+            User.objects.values_list('recipes_count', 'subscribers_count').get(pk=self.user.pk),
+            (7, 42)
+        )
+
+    def test_set_password(self):
+        response = self.client.post('/api/users/set_password/', {
+            'current_password': TEST_PASSWORD, 'new_password': 'another-password-1',
+        }, format='json')
+        self.assertEqual(response.status_code, 204)
+        self.assertCountersKept()
+        self.assertTrue(User.objects.get(pk=self.user.pk).check_password('another-password-1'))
+
+    def test_avatar(self):
+        response = self.client.put('/api/users/me/avatar/', {'avatar': base64_image()}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertCountersKept()
+        self.assertEqual(self.client.delete('/api/users/me/avatar/').status_code, 204)
+        self.assertCountersKept()
+        self.assertFalse(User.objects.get(pk=self.user.pk).avatar)
+
+
+class TokenCacheTests(ApiTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.user = self.create_user('reader')
+        self.client = self.token_client(self.user)
+
+    def test_cached_user_needs_no_query(self):
+        self.client.get('/api/users/me/')
+        with self.assertNumQueries(0):
+            self.assertEqual(self.client.get('/api/users/me/').status_code, 200)
+
+    def test_deleted_token_is_rejected(self):
+        self.client.get('/api/users/me/')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.auth_token.delete()
+        self.assertEqual(self.client.get('/api/users/me/').status_code, 401)
+
+    def test_deactivated_user_is_rejected(self):
+        self.client.get('/api/users/me/')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.is_active = False
+            self.user.save()
+        self.assertEqual(self.client.get('/api/users/me/').status_code, 401)
+
+    def test_invalid_token_stays_local(self):
+        self.anonymous.credentials(HTTP_AUTHORIZATION='Token unknown-token')
+        self.assertEqual(self.anonymous.get('/api/users/me/').status_code, 401)
+        self.assertIsNone(cache.get(token_cache_key('unknown-token')))
+        self.assertEqual(local_token_cache.get(token_cache_key('unknown-token')), 'invalid')
@@ -0,0 +1,61 @@
+from django.db import connection
+
+
+def relation_columns(model, target_field):
+    meta = model._meta
+    target = meta.get_field(target_field)
+    return meta, meta.get_field('user').column, target.column, target.related_model._meta
+
+
+def insert_relations(model, user, target_field, target_ids):
+    """Добавляет связи пользователя с целями (рецептами или авторами) одним
+    INSERT ... SELECT ... ON CONFLICT DO NOTHING RETURNING и возвращает
+    множество id целей, для которых строка действительно добавлена.
+
+    Связи, которые уже были, и несуществующие цели пропускаются: строки
+    целей выбираются в том же запросе, поэтому ни ошибки внешнего ключа,
+    ни IntegrityError при одновременных запросах не бывает.
+    """
+    if not target_ids:
+        return set()
+    quote = connection.ops.quote_name
+    meta, user_column, target_column, target_meta = relation_columns(model, target_field)
+    target_pk = quote(target_meta.pk.column)
+    placeholders = ', '.join(['%s'] * len(target_ids))
+    sql = (
+        f'INSERT INTO {quote(meta.db_table)} ({quote(user_column)}, {quote(target_column)}) '
+        f'SELECT %s, {target_pk} FROM {quote(target_meta.db_table)} '
+        f'WHERE {target_pk} IN ({placeholders}) '
+        f'ON CONFLICT DO NOTHING RETURNING {quote(target_column)}'
+    )
+    with connection.cursor() as cursor:
+        cursor.execute(sql, [user.id, *target_ids])
+        return {row[0] for row in cursor.fetchall()}
+
+
+def delete_relations(model, user, target_field, target_ids):
+    """Удаляет связи одним DELETE ... RETURNING и возвращает множество id
+    целей, для которых строка действительно была."""
+    if not target_ids:
+        return set()
+    quote = connection.ops.quote_name
+    meta, user_column, target_column, _ = relation_columns(model, target_field)
+    placeholders = ', '.join(['%s'] * len(target_ids))
+    sql = (
+        f'DELETE FROM {quote(meta.db_table)} '
+        f'WHERE {quote(user_column)} = %s AND {quote(target_column)} IN ({placeholders}) '
+        f'RETURNING {quote(target_column)}'
+    )
+    with connection.cursor() as cursor:
+        cursor.execute(sql, [user.id, *target_ids])
+        return {row[0] for row in cursor.fetchall()}
+
+
+def insert_relation(model, user, target_field, target_id):
+    """True, если связь добавлена; False — она уже была или цели нет."""
+    return bool(insert_relations(model, user, target_field, [target_id]))
+
+
+def delete_relation(model, user, target_field, target_id):
+    """True, если связь была и удалена."""
+    return bool(delete_relations(model, user, target_field, [target_id]))
@@ -1,17 +1,33 @@
 from django.urls import path
+from rest_framework.routers import DefaultRouter
+
 from . import views
 
+# остальные действия djoser (set_password, set_username, activation...)
+# тоже идут через api.views.UserViewSet, а не через исходный класс
+router = DefaultRouter()
+router.register('users', views.UserViewSet)
+
 urlpatterns = [
     path('users/me/', views.MeView.as_view(), name='me'),
     path('users/me/avatar/', views.SetAvatarView.as_view(), name='set-avatar'),
     path('users/subscriptions/', views.SubscriptionsView.as_view(), name='subscriptions'),
+    path('users/', views.UserViewSet.as_view({'get': 'list', 'post': 'create'}), name='user-list'),
+    path('users/<int:id>/', views.UserViewSet.as_view({
+        'get': 'retrieve', 'put': 'update', 'patch': 'partial_update', 'delete': 'destroy'
+    }), name='user-detail'),
     path('users/<int:id>/subscribe/', views.SubscribeView.as_view(), name='subscribe'),
     path('recipes/', views.RecipeListCreateView.as_view(), name='recipe-list-create'),
+    path('recipes/favorite/', views.FavoriteBatchView.as_view(), name='favorite-batch'),
+    path('recipes/shopping_cart/', views.ShoppingCartBatchView.as_view(), name='shopping-cart-batch'),
+    path('recipes/by_ingredients/', views.RecipesByIngredientsView.as_view(), name='recipes-by-ingredients'),
     path('recipes/<int:pk>/', views.RecipeDetailView.as_view(), name='recipe-detail'),
     path('recipes/<int:id>/get-link/', views.RecipeShortLinkView.as_view(), name='recipe-short-link'),
     path('recipes/<int:id>/favorite/', views.FavoriteView.as_view(), name='favorite'),
     path('recipes/<int:id>/shopping_cart/', views.ShoppingCartView.as_view(), name='shopping-cart'),
     path('recipes/download_shopping_cart/', views.DownloadShoppingCartView.as_view(), name='download-shopping-cart'),
+    path('recipes/download_shopping_cart/<str:job_id>/', views.DownloadShoppingCartJobView.as_view(), name='download-shopping-cart-job'),
     path('ingredients/', views.IngredientListView.as_view(), name='ingredient-list'),
     path('ingredients/<int:pk>/', views.IngredientDetailView.as_view(), name='ingredient-detail'),
-]
\ No newline at end of file
+    path('stats/requests/', views.RequestStatsView.as_view(), name='request-stats'),
+] + router.urls
@@ -1,6 +1,9 @@
 from django.contrib.auth import authenticate, get_user_model
-from django.shortcuts import get_object_or_404
-from django.db.models import Sum
+from django.contrib.auth.models import AnonymousUser
+from django.db import transaction
+from django.db.models import Exists, OuterRef, Prefetch, Value, BooleanField, F, Window
+from djoser.views import UserViewSet as DjoserUserViewSet
+from django.db.models.functions import RowNumber
 from rest_framework import generics, status, views, permissions
 from rest_framework.response import Response
 from rest_framework.pagination import PageNumberPagination
@@ -11,40 +14,54 @@ from .models import Recipe, Ingredient, Favorite, ShoppingCart, Follow, Ingredie
 from .serializers import (
     RecipeSerializer, RecipeCreateSerializer,
     IngredientSerializer, UserWithRecipesSerializer, SetAvatarSerializer,
-    RecipeMinifiedSerializer, CustomUserSerializer
+    RecipeMinifiedSerializer, CustomUserSerializer, RecipeCoverageSerializer,
+    RecipeIdsSerializer
 )
-from rest_framework.permissions import IsAuthenticated, IsAuthenticatedOrReadOnly, AllowAny
-from django.http import HttpResponse
-from reportlab.lib.pagesizes import A4
-from reportlab.pdfgen import canvas
-import io
+from rest_framework.permissions import IsAdminUser, IsAuthenticated, IsAuthenticatedOrReadOnly, AllowAny
+from django.http import FileResponse, HttpResponseRedirect, StreamingHttpResponse
 from django_filters.rest_framework import DjangoFilterBackend
 from .permissions import IsAuthorOrReadOnly
+from .counters import change_counter, change_counter_returning, change_counters
+from .toggles import delete_relation, delete_relations, insert_relation, insert_relations
+from .ranking import RANKING_ORDERINGS, order_by_ranking, record_engagement, revoke_engagement
+from .search import search_recipes
+from .authentication import fresh_user
+from .short_links import click_buffer, get_short_code, resolve_short_code
+from .recipe_cache import get_cached_recipe, get_recipe_versions
+from .conditional import ConditionalListMixin, conditional_response, make_etag
+from .instrumentation import format_request_stats, request_stats, set_timing_enabled, timing_enabled
+from .ingredient_index import recipe_ingredient_index, COOK_SEARCH_LIMIT, COOK_SEARCH_MAX_LIMIT
+from .pagination import FeedPagination, SubscriptionsPagination
+from .shopping_list import (
+    iter_shopping_list, bump_cart_version, bump_recipe_carts_version,
+    start_shopping_list_job, get_shopping_list_job, JOB_DONE, JOB_FAILED,
+    SHOPPING_LIST_CONTENT_TYPES, SHOPPING_LIST_FILENAME
+)
+from .catalog import ingredient_catalog, INGREDIENT_SEARCH_LIMIT, INGREDIENT_SEARCH_MAX_LIMIT
+from django.http import Http404
 from django.urls import reverse
 
 User = get_user_model()
 
-PDF_TITLE_X = 100
-PDF_TITLE_Y = 750
-PDF_ITEM_START_Y = 700
-PDF_ITEM_OFFSET = 20
-PDF_PAGE_SIZE = A4
-PDF_LEFT_MARGIN = 100
+USER_WRITE_ACTIONS = ('set_password', 'set_username')
 
 
 class SetAvatarView(views.APIView):
     permission_classes = [IsAuthenticated]
 
     def put(self, request):
-        serializer = SetAvatarSerializer(data=request.data, instance=request.user)
+        serializer = SetAvatarSerializer(data=request.data, instance=fresh_user(request.user))
         if serializer.is_valid():
             serializer.save()
             return Response(serializer.data, status=status.HTTP_200_OK)
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
     def delete(self, request):
-        request.user.avatar.delete()
-        request.user.save()
+        # файл удаляется по счётчику ссылок, он может быть общим
+        user = fresh_user(request.user)
+        user.avatar = None
+        user.avatar_variants = {}
+        user.save(update_fields=['avatar', 'avatar_variants', 'updated_at'])
         return Response(status=status.HTTP_204_NO_CONTENT)
 
 
@@ -52,14 +69,85 @@ class MeView(views.APIView):
     permission_classes = [IsAuthenticated]
 
     def get(self, request):
-        serializer = CustomUserSerializer(request.user)
-        return Response(serializer.data)
+        user = request.user
+        return conditional_response(
+            request, make_etag(user.id, user.updated_at),
+            lambda: Response(CustomUserSerializer(user).data), personal=True
+        )
+
+
+class UserViewSet(ConditionalListMixin, DjoserUserViewSet):
+    """Пользователи djoser с ETag по updated_at и флагом подписки
+    из аннотации вместо запроса на каждого пользователя."""
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        # эти действия djoser сохраняют request.user целиком
+        if self.action in USER_WRITE_ACTIONS and request.user.is_authenticated:
+            request.user = fresh_user(request.user)
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        user = self.request.user
+        if self.action not in ('list', 'retrieve'):
+            return queryset
+        if not user.is_authenticated:
+            return queryset.annotate(is_subscribed=Value(False, output_field=BooleanField()))
+        return queryset.annotate(is_subscribed=Exists(
+            Follow.objects.filter(user=user, author=OuterRef('pk'))
+        ))
+
+    def get_list_versions(self, users):
+        return [(user.id, user.updated_at, user.is_subscribed) for user in users]
+
+    def retrieve(self, request, *args, **kwargs):
+        user = self.get_object()
+        etag = make_etag(request.build_absolute_uri('/'), *self.get_list_versions([user]))
+        return conditional_response(
+            request, etag, lambda: Response(self.get_serializer(user).data), personal=True
+        )
 
 
-class RecipeListCreateView(generics.ListCreateAPIView):
+def annotate_recipe_flags(queryset, user):
+    """Флаги избранного, корзины и подписки на автора для пользователя."""
+    if user.is_authenticated:
+        return queryset.annotate(
+            is_favorited=Exists(
+                Favorite.objects.filter(user=user, recipe=OuterRef('pk'))
+            ),
+            is_in_shopping_cart=Exists(
+                ShoppingCart.objects.filter(user=user, recipe=OuterRef('pk'))
+            ),
+            is_author_subscribed=Exists(
+                Follow.objects.filter(user=user, author=OuterRef('author'))
+            ),
+        )
+    return queryset.annotate(
+        is_favorited=Value(False, output_field=BooleanField()),
+        is_in_shopping_cart=Value(False, output_field=BooleanField()),
+        is_author_subscribed=Value(False, output_field=BooleanField()),
+    )
+
+
+class RecipeQuerysetMixin:
+    """Аннотирует рецепты флагами текущего пользователя и подгружает связи,
+    чтобы страница любого размера стоила постоянного числа запросов."""
+
+    def get_recipe_queryset(self, user=None):
+        queryset = Recipe.objects.select_related('author').prefetch_related(
+            Prefetch(
+                'ingredient_amounts',
+                queryset=IngredientInRecipe.objects.select_related('ingredient')
+            )
+        )
+        return annotate_recipe_flags(queryset, user or self.request.user)
+
+
+class RecipeListCreateView(RecipeQuerysetMixin, ConditionalListMixin, generics.ListCreateAPIView):
     queryset = Recipe.objects.all()
     serializer_class = RecipeSerializer
     permission_classes = [IsAuthenticatedOrReadOnly]
+    pagination_class = FeedPagination
     filter_backends = [DjangoFilterBackend]
     filterset_fields = ['author']
 
@@ -70,70 +158,206 @@ class RecipeListCreateView(generics.ListCreateAPIView):
 
     def perform_create(self, serializer):
         serializer.save()
-    
+
+    def get_serializer_context(self):
+        # в ленте фото меньше, чем на странице рецепта
+        return {**super().get_serializer_context(), 'recipe_image_variant': 'medium'}
+
+    def get_list_versions(self, recipes):
+        # автор входит в ответ, поэтому версия записи — старшая из двух
+        updated_at = max(
+            (max(recipe.updated_at, recipe.author.updated_at) for recipe in recipes),
+            default=None
+        )
+        flags = [
+            (recipe.id, recipe.is_favorited, recipe.is_in_shopping_cart, recipe.is_author_subscribed)
+            for recipe in recipes
+        ]
+        return ingredient_catalog.version, updated_at, flags
+
     def get_queryset(self):
-        queryset = Recipe.objects.all()
+        queryset = self.get_recipe_queryset()
         user = self.request.user
 
         is_favorited = self.request.query_params.get('is_favorited')
         is_in_shopping_cart = self.request.query_params.get('is_in_shopping_cart')
 
         if is_favorited == '1' and user.is_authenticated:
-            queryset = queryset.filter(favorited_by__user=user)
+            queryset = queryset.filter(is_favorited=True)
 
         if is_in_shopping_cart == '1' and user.is_authenticated:
-            queryset = queryset.filter(in_shopping_carts__user=user)
+            queryset = queryset.filter(is_in_shopping_cart=True)
 
         author = self.request.query_params.get('author')
         if author is not None:
             queryset = queryset.filter(author__id=author)
 
+        search = self.request.query_params.get('search')
+        if search:
+            queryset = search_recipes(queryset, search)
+            self.cursor_ordering = '-search_rank'
+
+        ordering = self.request.query_params.get('ordering')
+        if ordering in RANKING_ORDERINGS:
+            queryset = order_by_ranking(queryset, ordering)
+            self.cursor_ordering = '-rank_score'
+
         return queryset
 
 
-class RecipeDetailView(generics.RetrieveUpdateDestroyAPIView):
+class RecipeDetailView(RecipeQuerysetMixin, generics.RetrieveUpdateDestroyAPIView):
     queryset = Recipe.objects.all()
     serializer_class = RecipeSerializer
     permission_classes = [IsAuthenticatedOrReadOnly, IsAuthorOrReadOnly]
 
+    def get_queryset(self):
+        if self.request.method == 'GET':
+            return self.get_recipe_queryset()
+        return Recipe.objects.all()
+
     def get_serializer_class(self):
         if self.request.method in ['PATCH', 'PUT']:
             return RecipeCreateSerializer
         return RecipeSerializer
 
+    def retrieve(self, request, *args, **kwargs):
+        """Общая для всех часть ответа берётся из кэша, флаги текущего
+        пользователя дочитываются отдельным запросом. ETag строится из
+        версий рецепта и справочника до чтения самого рецепта; если версии
+        в кэше нет, рецепт сначала проверяется в БД."""
+        pk = kwargs['pk']
+        base_url = request.build_absolute_uri('/')
+        flags = None
+        if request.user.is_authenticated:
+            flags = (
+                annotate_recipe_flags(Recipe.objects.filter(pk=pk), request.user)
+                .values('is_favorited', 'is_in_shopping_cart', 'is_author_subscribed')
+                .first()
+            )
+            if flags is None:
+                raise Http404
+        versions = get_recipe_versions(
+            pk, lambda: flags is not None or Recipe.objects.filter(pk=pk).exists()
+        )
+        if versions is None:
+            raise Http404
+        etag = make_etag(pk, *versions, base_url, flags)
+
+        def build():
+            data = get_cached_recipe(
+                pk, base_url, lambda: self.build_cached_recipe(pk), versions
+            )
+            if data is None:
+                raise Http404
+            if flags is None:
+                return Response(data)
+            data = dict(data)
+            data['is_favorited'] = flags['is_favorited']
+            data['is_in_shopping_cart'] = flags['is_in_shopping_cart']
+            data['author'] = dict(data['author'], is_subscribed=flags['is_author_subscribed'])
+            return Response(data)
+
+        return conditional_response(request, etag, build, personal=True)
+
+    def build_cached_recipe(self, pk):
+        recipe = self.get_recipe_queryset(AnonymousUser()).filter(pk=pk).first()
+        if recipe is None:
+            return None
+        data = RecipeSerializer(recipe, context=self.get_serializer_context()).data
+        data['author'] = dict(data['author'])
+        return dict(data)
+
     def perform_update(self, serializer):
         serializer.save()
 
+    @transaction.atomic
     def perform_destroy(self, instance):
+        bump_recipe_carts_version(instance)
         instance.delete()
+        change_counter(User, instance.author_id, 'recipes_count', -1)
 
 
 class RecipeShortLinkView(views.APIView):
     def get(self, request, id):
-        recipe = get_object_or_404(Recipe, id=id)
+        code = get_short_code(id)
+        if code is None:
+            raise Http404
         short_link = request.build_absolute_uri(
-            reverse('recipe-detail', kwargs={'pk': recipe.id})
+            reverse('short-link-redirect', kwargs={'code': code})
         )
         return Response({"short-link": short_link}, status=status.HTTP_200_OK)
 
 
+class ShortLinkRedirectView(views.APIView):
+    """Переход по короткой ссылке на страницу рецепта во фронтенде."""
+    permission_classes = [AllowAny]
+    authentication_classes = []
+
+    def get(self, request, code):
+        recipe_id = resolve_short_code(code)
+        if recipe_id is None:
+            raise Http404
+        click_buffer.add(code)
+        return HttpResponseRedirect(f'/recipes/{recipe_id}')
+
+
+class RecipesByIngredientsView(views.APIView):
+    """Рецепты, которые можно приготовить из указанных ингредиентов,
+    по убыванию доли имеющихся ингредиентов."""
+    permission_classes = [AllowAny]
+
+    def get(self, request):
+        raw_ids = request.query_params.get('ingredients', '')
+        ingredient_ids = [int(pk) for pk in raw_ids.split(',') if pk.strip().isdigit()]
+        if not ingredient_ids:
+            return Response(
+                {"error": "Parameter ingredients must be a comma-separated list of ids"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        limit = request.query_params.get('limit', '')
+        limit = int(limit) if limit.isdigit() else COOK_SEARCH_LIMIT
+        limit = min(max(limit, 1), COOK_SEARCH_MAX_LIMIT)
+
+        ranked = recipe_ingredient_index.rank(ingredient_ids, limit)
+        recipes = Recipe.objects.in_bulk([recipe_id for recipe_id, *_ in ranked])
+        result = []
+        for recipe_id, matched, total in ranked:
+            recipe = recipes.get(recipe_id)
+            if recipe is None:
+                continue
+            recipe.matched = matched
+            recipe.total = total
+            recipe.coverage = matched / total
+            result.append(recipe)
+        return Response(RecipeCoverageSerializer(result, many=True, context={'request': request}).data)
+
+
+def relation_conflict(model, pk, message):
+    """Ответ, когда переключатель не изменил ни одной строки: цели нет
+    или связь уже в нужном состоянии. Запрос только на этой ветке."""
+    if not model.objects.filter(pk=pk).exists():
+        raise Http404
+    return Response({"error": message}, status=status.HTTP_400_BAD_REQUEST)
+
+
 class FavoriteView(views.APIView):
     permission_classes = [IsAuthenticated]
 
     def post(self, request, id):
-        recipe = get_object_or_404(Recipe, id=id)
-        if request.user.favorites.filter(recipe=recipe).exists():
-            return Response({"error": "Recipe already in favorites"}, status=status.HTTP_400_BAD_REQUEST)
-        Favorite.objects.create(user=request.user, recipe=recipe)
+        with transaction.atomic():
+            if not insert_relation(Favorite, request.user, 'recipe', id):
+                return relation_conflict(Recipe, id, "Recipe already in favorites")
+            recipe = change_counter_returning(Recipe, id, 'favorites_count', 1)
+            record_engagement([id], 'favorite')
         serializer = RecipeMinifiedSerializer(recipe)
         return Response(serializer.data, status=status.HTTP_201_CREATED)
 
     def delete(self, request, id):
-        recipe = get_object_or_404(Recipe, id=id)
-        favorite = request.user.favorites.filter(recipe=recipe)
-        if not favorite.exists():
-            return Response({"error": "Recipe not in favorites"}, status=status.HTTP_400_BAD_REQUEST)
-        favorite.delete()
+        with transaction.atomic():
+            if not delete_relation(Favorite, request.user, 'recipe', id):
+                return relation_conflict(Recipe, id, "Recipe not in favorites")
+            change_counter(Recipe, id, 'favorites_count', -1)
+            revoke_engagement([id], 'favorite')
         return Response(status=status.HTTP_204_NO_CONTENT)
 
 
@@ -141,84 +365,205 @@ class ShoppingCartView(views.APIView):
     permission_classes = [IsAuthenticated]
 
     def post(self, request, id):
-        recipe = get_object_or_404(Recipe, id=id)
-        if recipe.in_shopping_carts.filter(user=request.user).exists():
-            return Response({"error": "Recipe already in shopping cart"}, status=status.HTTP_400_BAD_REQUEST)
-        ShoppingCart.objects.create(user=request.user, recipe=recipe)
+        with transaction.atomic():
+            if not insert_relation(ShoppingCart, request.user, 'recipe', id):
+                return relation_conflict(Recipe, id, "Recipe already in shopping cart")
+            recipe = change_counter_returning(Recipe, id, 'in_carts_count', 1)
+            record_engagement([id], 'shopping_cart')
+        bump_cart_version([request.user.id])
         serializer = RecipeMinifiedSerializer(recipe)
         return Response(serializer.data, status=status.HTTP_201_CREATED)
 
     def delete(self, request, id):
-        recipe = get_object_or_404(Recipe, id=id)
-        cart = request.user.shopping_carts.filter(recipe=recipe)
-        if not cart.exists():
-            return Response({"error": "Recipe not in shopping cart"}, status=status.HTTP_400_BAD_REQUEST)
-        cart.delete()
+        with transaction.atomic():
+            if not delete_relation(ShoppingCart, request.user, 'recipe', id):
+                return relation_conflict(Recipe, id, "Recipe not in shopping cart")
+            change_counter(Recipe, id, 'in_carts_count', -1)
+            revoke_engagement([id], 'shopping_cart')
+        bump_cart_version([request.user.id])
         return Response(status=status.HTTP_204_NO_CONTENT)
 
 
+class RecipeBatchView(views.APIView):
+    """Добавление (POST) и удаление (DELETE) многих рецептов одним запросом
+    с телом {"ids": [...]}: все изменения в одной транзакции, в ответе
+    итог по каждому id и краткие данные найденных рецептов."""
+    permission_classes = [IsAuthenticated]
+    model = None
+    counter_field = None
+    engagement_event = None
+
+    def get_recipe_ids(self, request):
+        serializer = RecipeIdsSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        return list(dict.fromkeys(serializer.validated_data['ids']))
+
+    def changed(self, request, recipe_ids):
+        pass
+
+    def batch_response(self, request, recipe_ids, changed, status_changed, status_unchanged):
+        recipes = Recipe.objects.in_bulk(recipe_ids)
+        results = [
+            {
+                'id': recipe_id,
+                'status': (
+                    status_changed if recipe_id in changed
+                    else status_unchanged if recipe_id in recipes
+                    else 'not_found'
+                )
+            }
+            for recipe_id in recipe_ids
+        ]
+        found = [recipes[recipe_id] for recipe_id in recipe_ids if recipe_id in recipes]
+        serializer = RecipeMinifiedSerializer(found, many=True, context={'request': request})
+        return Response({'results': results, 'recipes': serializer.data})
+
+    def post(self, request):
+        recipe_ids = self.get_recipe_ids(request)
+        with transaction.atomic():
+            added = insert_relations(self.model, request.user, 'recipe', recipe_ids)
+            if added:
+                change_counters(Recipe, added, self.counter_field, 1)
+                record_engagement(added, self.engagement_event)
+        if added:
+            self.changed(request, added)
+        return self.batch_response(request, recipe_ids, added, 'added', 'exists')
+
+    def delete(self, request):
+        recipe_ids = self.get_recipe_ids(request)
+        with transaction.atomic():
+            removed = delete_relations(self.model, request.user, 'recipe', recipe_ids)
+            if removed:
+                change_counters(Recipe, removed, self.counter_field, -1)
+                revoke_engagement(removed, self.engagement_event)
+        if removed:
+            self.changed(request, removed)
+        return self.batch_response(request, recipe_ids, removed, 'removed', 'absent')
+
+
+class FavoriteBatchView(RecipeBatchView):
+    model = Favorite
+    counter_field = 'favorites_count'
+    engagement_event = 'favorite'
+
+
+class ShoppingCartBatchView(RecipeBatchView):
+    model = ShoppingCart
+    counter_field = 'in_carts_count'
+    engagement_event = 'shopping_cart'
+
+    def changed(self, request, recipe_ids):
+        bump_cart_version([request.user.id])
+
+
 class DownloadShoppingCartView(views.APIView):
     permission_classes = [IsAuthenticated]
 
     def get(self, request):
-        ingredients = (
-            IngredientInRecipe.objects
-            .filter(recipe__in_shopping_carts__user=request.user)
-            .values(
-                'ingredient__name',
-                'ingredient__measurement_unit'
+        file_format = request.query_params.get('file_format', 'pdf')
+        if file_format not in SHOPPING_LIST_CONTENT_TYPES:
+            return Response(
+                {"error": f"Unsupported file format: {file_format}"},
+                status=status.HTTP_400_BAD_REQUEST
             )
-            .annotate(total_amount=Sum('amount'))
-            .order_by('ingredient__name')
+        if request.query_params.get('mode') == 'async':
+            job_id = start_shopping_list_job(request.user, file_format)
+            location = request.build_absolute_uri(
+                reverse('download-shopping-cart-job', kwargs={'job_id': job_id})
+            )
+            return Response(
+                {"job_id": job_id, "url": location},
+                status=status.HTTP_202_ACCEPTED,
+                headers={'Location': location}
+            )
+        response = StreamingHttpResponse(
+            iter_shopping_list(request.user, file_format),
+            content_type=SHOPPING_LIST_CONTENT_TYPES[file_format]
         )
+        response['Content-Disposition'] = (
+            f'attachment; filename="{SHOPPING_LIST_FILENAME}.{file_format}"'
+        )
+        return response
+
 
-        buffer = io.BytesIO()
-        p = canvas.Canvas(buffer, pagesize=PDF_PAGE_SIZE)
-        
-        p.drawString(PDF_TITLE_X, PDF_TITLE_Y, "Список покупок")
-        
-        y_position = PDF_ITEM_START_Y
-        for item in ingredients:
-            p.drawString(
-                PDF_LEFT_MARGIN, 
-                y_position, 
-                f"{item['ingredient__name']}: {item['total_amount']} {item['ingredient__measurement_unit']}"
+class DownloadShoppingCartJobView(views.APIView):
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request, job_id):
+        job = get_shopping_list_job(job_id, request.user)
+        if job is None:
+            return Response({"error": "Job not found"}, status=status.HTTP_404_NOT_FOUND)
+        if job['status'] == JOB_FAILED:
+            return Response(
+                {"error": "Shopping list rendering failed"},
+                status=status.HTTP_500_INTERNAL_SERVER_ERROR
             )
-            y_position -= PDF_ITEM_OFFSET
-        
-        p.showPage()
-        p.save()
-        buffer.seek(0)
-        return HttpResponse(buffer, content_type='application/pdf')
+        if job['status'] != JOB_DONE:
+            return Response({"status": job['status']}, status=status.HTTP_202_ACCEPTED)
+        file_format = job['file_format']
+        try:
+            document = open(job['document_path'], 'rb')
+        except FileNotFoundError:
+            return Response({"error": "Job not found"}, status=status.HTTP_404_NOT_FOUND)
+        response = FileResponse(
+            document,
+            content_type=SHOPPING_LIST_CONTENT_TYPES[file_format]
+        )
+        response['Content-Disposition'] = (
+            f'attachment; filename="{SHOPPING_LIST_FILENAME}.{file_format}"'
+        )
+        return response
 
 
 class SubscriptionsView(ListAPIView):
     serializer_class = UserWithRecipesSerializer
     permission_classes = [IsAuthenticated]
+    pagination_class = SubscriptionsPagination
 
     def get_queryset(self):
-        return User.objects.filter(subscribers__user=self.request.user)
+        recipes = Recipe.objects.all()
+        recipes_limit = self.request.query_params.get('recipes_limit')
+        if recipes_limit and recipes_limit.isdigit():
+            # первые N рецептов каждого автора одним запросом через ROW_NUMBER
+            recipes = recipes.annotate(
+                row_number=Window(
+                    expression=RowNumber(),
+                    partition_by=F('author'),
+                    order_by=F('id').desc()
+                )
+            ).filter(row_number__lte=int(recipes_limit))
+        return (
+            User.objects
+            .filter(subscribers__user=self.request.user)
+            .annotate(
+                follow_id=F('subscribers__id'),
+                is_subscribed=Value(True, output_field=BooleanField())
+            )
+            .prefetch_related(
+                Prefetch('recipes', queryset=recipes, to_attr='limited_recipes')
+            )
+        )
 
 
 class SubscribeView(views.APIView):
     permission_classes = [IsAuthenticated]
 
     def post(self, request, id):
-        author = get_object_or_404(User, id=id)
-        if author == request.user:
+        if id == request.user.id:
             return Response({"error": "Cannot subscribe to yourself"}, status=status.HTTP_400_BAD_REQUEST)
-        if request.user.subscriptions.filter(author=author).exists():
-            return Response({"error": "Already subscribed"}, status=status.HTTP_400_BAD_REQUEST)
-        Follow.objects.create(user=request.user, author=author)
+        with transaction.atomic():
+            if not insert_relation(Follow, request.user, 'author', id):
+                return relation_conflict(User, id, "Already subscribed")
+            author = change_counter_returning(User, id, 'subscribers_count', 1)
+        author.is_subscribed = True
         serializer = UserWithRecipesSerializer(author, context={'request': request})
         return Response(serializer.data, status=status.HTTP_201_CREATED)
 
     def delete(self, request, id):
-        author = get_object_or_404(User, id=id)
-        follow = request.user.subscriptions.filter(author=author)
-        if not follow.exists():
-            return Response({"error": "Not subscribed"}, status=status.HTTP_400_BAD_REQUEST)
-        follow.delete()
+        with transaction.atomic():
+            if not delete_relation(Follow, request.user, 'author', id):
+                return relation_conflict(User, id, "Not subscribed")
+            change_counter(User, id, 'subscribers_count', -1)
         return Response(status=status.HTTP_204_NO_CONTENT)
 
 
@@ -226,12 +571,51 @@ class IngredientListView(generics.ListAPIView):
     permission_classes = [AllowAny]
     queryset = Ingredient.objects.all()
     serializer_class = IngredientSerializer
-    filter_backends = [DjangoFilterBackend]
-    filterset_fields = ['name']
     pagination_class = None
 
+    def list(self, request, *args, **kwargs):
+        etag = make_etag(ingredient_catalog.version)
+        name = request.query_params.get('name')
+        if not name:
+            return conditional_response(
+                request, etag, lambda: Response(ingredient_catalog.all())
+            )
+        limit = request.query_params.get('limit', '')
+        limit = int(limit) if limit.isdigit() else INGREDIENT_SEARCH_LIMIT
+        limit = min(max(limit, 1), INGREDIENT_SEARCH_MAX_LIMIT)
+        return conditional_response(
+            request, etag, lambda: Response(ingredient_catalog.search(name, limit))
+        )
+
 
 class IngredientDetailView(generics.RetrieveAPIView):
     permission_classes = [AllowAny]
     queryset = Ingredient.objects.all()
     serializer_class = IngredientSerializer
+
+    def retrieve(self, request, *args, **kwargs):
+        ingredient = ingredient_catalog.get(kwargs['pk'])
+        if ingredient is None:
+            raise Http404
+        return conditional_response(
+            request, make_etag(ingredient_catalog.version), lambda: Response(ingredient)
+        )
+
+
+class RequestStatsView(views.APIView):
+    permission_classes = [IsAdminUser]
+
+    def get(self, request):
+        workers, routes = request_stats.collect()
+        return Response({
+            'enabled': timing_enabled(),
+            'workers': workers,
+            'routes': format_request_stats(routes),
+        })
+
+    def patch(self, request):
+        enabled = request.data.get('enabled')
+        if not isinstance(enabled, bool):
+            return Response({"error": "Field enabled must be a boolean"}, status=status.HTTP_400_BAD_REQUEST)
+        set_timing_enabled(enabled)
+        return Response({'enabled': enabled})
@@ -0,0 +1,90 @@
+import os
+import statistics
+import sys
+import time
+
+import django
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'foodgram.settings')
+django.setup()
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
+
+from api.images import delete_unused_blob_files
+from api.models import Ingredient, Recipe, User
+
+# 1x1 png
+IMAGE = (
+    'data:image/png;base64,iVBORw0KGgoAAAANSUhEUgAAAAEAAAABCAYAAAAfFcSJAAAA'
+    'DUlEQVR42mNk+M9QDwADhgGAWjR9awAAAABJRU5ErkJggg=='
+)
+INGREDIENT_COUNTS = [1, 5, 10, 20, 40, 80]
+REPEATS = 20
+
+
+def measure(client, method, url, data):
+    with CaptureQueriesContext(connection) as queries:
+        start = time.perf_counter()
+        response = getattr(client, method)(url, data, format='json')
+        elapsed = (time.perf_counter() - start) * 1000
+    assert response.status_code in (200, 201), response.data
+    return response, elapsed, len(queries)
+
+
+def run():
+    """Задержка создания и обновления рецепта в зависимости от числа
+    ингредиентов. Все изменения откатываются после замеров."""
+    settings.ALLOWED_HOSTS = ['*']
+    with transaction.atomic():
+        user = User.objects.create_user(
+            username='bench', email='bench@example.com', password='bench',
+            first_name='bench', last_name='bench'
+        )
+        missing = max(INGREDIENT_COUNTS) * 2 - Ingredient.objects.count()
+        Ingredient.objects.bulk_create(
+            Ingredient(name=f'bench-{i}', measurement_unit='г')
+            for i in range(max(missing, 0))
+        )
+        ingredient_ids = list(Ingredient.objects.values_list('id', flat=True))
+        client = APIClient()
+        client.force_authenticate(user)
+
+        print(f"{'ingredients':>11} {'create ms':>10} {'queries':>7} {'update ms':>10} {'queries':>7}")
+        for count in INGREDIENT_COUNTS:
+            create_times, update_times = [], []
+            for _ in range(REPEATS):
+                data = {
+                    'name': 'bench', 'text': 'bench', 'cooking_time': 1, 'image': IMAGE,
+                    'ingredients': [{'id': pk, 'amount': 1} for pk in ingredient_ids[:count]],
+                }
+                response, elapsed, create_queries = measure(client, 'post', '/api/recipes/', data)
+                create_times.append(elapsed)
+                # половина строк меняет количество, половина заменяется другими
+                half = count // 2
+                data = {
+                    'ingredients': [{'id': pk, 'amount': 2} for pk in ingredient_ids[:half]]
+                    + [{'id': pk, 'amount': 1} for pk in ingredient_ids[count:2 * count - half]],
+                }
+                _, elapsed, update_queries = measure(
+                    client, 'patch', f"/api/recipes/{response.data['id']}/", data
+                )
+                update_times.append(elapsed)
+            print(
+                f'{count:>11} {statistics.median(create_times):>10.2f} {create_queries:>7}'
+                f' {statistics.median(update_times):>10.2f} {update_queries:>7}'
+            )
+
+        image_names = set(Recipe.objects.filter(author=user).values_list('image', flat=True))
+        transaction.set_rollback(True)
+
+    # откат вернул счётчики ImageBlob, но не файлы: удаляются только те,
+    # на которые не ссылается ни один рецепт или пользователь вне замеров
+    for name in image_names:
+        delete_unused_blob_files(name)
+
+
+if __name__ == "__main__":
+    sys.exit(run())
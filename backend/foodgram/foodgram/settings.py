@@ -49,7 +49,7 @@ AUTH_USER_MODEL = 'api.User'
 
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework.authentication.TokenAuthentication',
+        'api.authentication.CachedTokenAuthentication',
     ],
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.AllowAny',
@@ -78,10 +78,24 @@ DJOSER = {
     'PASSWORD_VALIDATORS': [],
 }
 
+# Заголовок Server-Timing, журнал медленных запросов и статистика по
+# маршрутам (/api/stats/requests/). ENABLED переключается и на ходу
+# через PATCH этого адреса
+REQUEST_TIMING = {
+    'ENABLED': True,
+    'SLOW_REQUEST_MS': 500,
+    'SLOW_QUERY_COUNT': 50,
+    'REPEATED_QUERY_COUNT': 10,
+}
+
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
+# готовые документы асинхронных списков покупок; каталог не раздаётся nginx
+SHOPPING_LIST_JOB_ROOT = os.path.join(BASE_DIR, 'shopping_list_jobs')
+
 MIDDLEWARE = [
+    'api.instrumentation.RequestTimingMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -134,6 +148,28 @@ DATABASES = {
 #     }
 # }
 
+# Общий для всех воркеров gunicorn кэш: версии справочников и кэшированные
+# ответы должны быть видны каждому процессу. Redis запущен с политикой
+# volatile-lru: при нехватке памяти вытесняются только ключи со сроком
+# жизни, а версии справочников (timeout=None) не пропадают. Версии рецептов
+# живут RECIPE_VERSION_TIMEOUT: их столько же, сколько рецептов
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': 'redis://redis:6379/1',
+    }
+}
+
+# файловый кэш для запуска без Redis: при переполнении он удаляет
+# случайные записи, включая версии, поэтому MAX_ENTRIES с запасом
+# CACHES = {
+#     'default': {
+#         'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+#         'LOCATION': '/var/tmp/foodgram_cache',
+#         'OPTIONS': {'MAX_ENTRIES': 100_000},
+#     }
+# }
+
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
 
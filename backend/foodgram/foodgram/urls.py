@@ -3,9 +3,11 @@ from django.urls import path, include
 from django.conf import settings
 from django.conf.urls.static import static
 
+from api.views import ShortLinkRedirectView
+
 urlpatterns = [
     path('admin/', admin.site.urls),
+    path('s/<str:code>', ShortLinkRedirectView.as_view(), name='short-link-redirect'),
     path('api/', include('api.urls')),
-    path('api/', include('djoser.urls')),
     path('api/auth/', include('djoser.urls.authtoken')),
 ] + static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
\ No newline at end of file